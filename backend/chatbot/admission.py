@@ -0,0 +1,469 @@
+# backend/chatbot/admission.py
+"""
+Admission control for chat turns (Gemini stream + optional TTS).
+
+Every message first takes a token from its user's bucket (``RATE`` per second,
+up to ``BURST``); an empty bucket is rejected immediately. An admitted message
+then needs a slot under both ``USER_CONCURRENCY`` and ``GLOBAL_CONCURRENCY``.
+Without one it waits in a FIFO queue, receiving its position as it moves, for
+at most ``QUEUE_TIMEOUT`` seconds. When ``QUEUE_SIZE`` messages (or
+``USER_QUEUE_SIZE`` from the same user) are already waiting, it is rejected
+straight away instead of adding to everyone's latency.
+
+Free slots go to waiters in arrival order, skipping waiters whose user is
+already at ``USER_CONCURRENCY``, so one busy user can't hold up the queue.
+
+The "redis" backend shares limits across worker processes through the channel
+layer's Redis. Slots and queue entries are leases, so a crashed worker cannot
+hold them forever; a held slot's lease is renewed while its turn runs. The
+"local" backend applies the same rules per process and also takes over
+whenever Redis errors.
+"""
+import asyncio
+import contextlib
+import logging
+import threading
+import time
+import uuid
+from dataclasses import dataclass, field
+
+from cachetools import TTLCache
+from django.conf import settings
+
+from .metrics import counter, histogram
+
+try:
+    import redis
+    import redis.asyncio as aioredis
+except ImportError:  # the local backend needs no client
+    redis = aioredis = None
+
+DEFAULT_ADMISSION = {
+    "ENABLED": True,
+    "BACKEND": "local",
+    "REDIS_URL": "redis://127.0.0.1:6379/0",
+    "KEY_PREFIX": "admission",
+    "GLOBAL_CONCURRENCY": 32,
+    "USER_CONCURRENCY": 2,
+    "RATE": 0.5,
+    "BURST": 5,
+    "QUEUE_SIZE": 200,
+    "USER_QUEUE_SIZE": 2,
+    "QUEUE_TIMEOUT": 20.0,
+    "LEASE_SECONDS": 300,
+    "POLL_INTERVAL": 0.05,
+    # Peers whose X-Forwarded-For is believed when keying guests by address.
+    "TRUSTED_PROXIES": [],
+}
+
+REJECT_MESSAGES = {
+    "rate_limited": "You're sending messages too quickly, please wait a moment.",
+    "queue_full": "Server is busy, please try again shortly.",
+    "queue_timeout": "Server is busy, please try again shortly.",
+}
+
+_admitted = counter("admission_admitted_total", "Chat turns granted a concurrency slot")
+_queued = counter("admission_queued_total", "Chat turns that had to wait for a slot")
+_rejected = {reason: counter(f"admission_rejected_{reason}_total", f"Chat turns rejected: {reason}")
+             for reason in REJECT_MESSAGES}
+admission_wait_seconds = histogram("admission_wait_seconds", description="Time chat turns spent queued for a slot")
+
+
+class AdmissionRejected(Exception):
+    """A chat turn was turned away; ``reason`` is a key of ``REJECT_MESSAGES``."""
+
+    def __init__(self, reason: str, retry_after: float = None):
+        super().__init__(reason)
+        self.reason = reason
+        self.retry_after = retry_after
+
+    @property
+    def message(self) -> str:
+        return REJECT_MESSAGES[self.reason]
+
+
+def admission_config() -> dict:
+    config = dict(DEFAULT_ADMISSION)
+    config.update(getattr(settings, "ADMISSION", {}))
+    return config
+
+
+def client_address(scope) -> str:
+    """The caller's IP: the peer, or the client it forwarded for when the peer is a trusted proxy."""
+    peer = (scope.get("client") or ("",))[0] or ""
+    trusted = set(admission_config()["TRUSTED_PROXIES"])
+    if peer in trusted:
+        forwarded = dict(scope.get("headers") or ()).get(b"x-forwarded-for", b"").decode("latin-1")
+        # The nearest hop we don't run ourselves is the client; anything further left is client-supplied.
+        for hop in reversed([h.strip() for h in forwarded.split(",") if h.strip()]):
+            if hop not in trusted:
+                return hop
+    return peer
+
+
+def _reject(reason: str, retry_after: float = None):
+    _rejected[reason].inc()
+    return AdmissionRejected(reason, retry_after)
+
+
+@dataclass(eq=False)
+class _Waiter:
+    key: str
+    changed: asyncio.Event = field(default_factory=asyncio.Event)
+    granted: bool = False
+
+
+class LocalAdmission:
+    """Per-process token buckets, semaphores and wait queue."""
+
+    def __init__(self, config: dict):
+        self.config = config
+        self._buckets = TTLCache(maxsize=100_000, ttl=max(60, config["BURST"] / config["RATE"]))
+        self._bucket_lock = threading.Lock()
+        self._active = 0
+        self._active_by_key = {}
+        self._waiters = []
+
+    async def take_token(self, key: str):
+        rate, burst = self.config["RATE"], self.config["BURST"]
+        now = time.monotonic()
+        with self._bucket_lock:
+            tokens, stamp = self._buckets.get(key, (burst, now))
+            tokens = min(burst, tokens + (now - stamp) * rate)
+            allowed = tokens >= 1
+            self._buckets[key] = (tokens - 1 if allowed else tokens, now)
+        if not allowed:
+            raise _reject("rate_limited", round((1 - tokens) / rate, 2))
+
+    def _has_slot(self, key: str) -> bool:
+        return (self._active < self.config["GLOBAL_CONCURRENCY"]
+                and self._active_by_key.get(key, 0) < self.config["USER_CONCURRENCY"])
+
+    def _grant(self, key: str):
+        self._active += 1
+        self._active_by_key[key] = self._active_by_key.get(key, 0) + 1
+
+    def _dispatch(self):
+        """Hand free slots to waiters in arrival order, skipping users already at their limit."""
+        waiters = list(self._waiters)
+        for waiter in waiters:
+            if self._active >= self.config["GLOBAL_CONCURRENCY"]:
+                break
+            if self._has_slot(waiter.key):
+                self._grant(waiter.key)
+                waiter.granted = True
+                self._waiters.remove(waiter)
+        for waiter in waiters:
+            waiter.changed.set()
+
+    async def acquire(self, key: str, on_position=None):
+        """Wait for a slot; returns an async ``release()``."""
+        if not self._waiters and self._has_slot(key):
+            self._grant(key)
+            return self._releaser(key)
+        if (len(self._waiters) >= self.config["QUEUE_SIZE"]
+                or sum(w.key == key for w in self._waiters) >= self.config["USER_QUEUE_SIZE"]):
+            raise _reject("queue_full")
+
+        waiter = _Waiter(key)
+        self._waiters.append(waiter)
+        self._dispatch()  # a free slot may be usable by this user even with others waiting
+        if waiter.granted:
+            return self._releaser(key)
+        _queued.inc()
+        deadline = time.monotonic() + self.config["QUEUE_TIMEOUT"]
+        reported = None
+        try:
+            while not waiter.granted:
+                position = self._waiters.index(waiter) + 1
+                if on_position and position != reported:
+                    reported = position
+                    await on_position(position)
+                remaining = deadline - time.monotonic()
+                if waiter.granted:
+                    break
+                if remaining <= 0:
+                    raise _reject("queue_timeout")
+                waiter.changed.clear()
+                with contextlib.suppress(asyncio.TimeoutError):
+                    await asyncio.wait_for(waiter.changed.wait(), remaining)
+        except BaseException:
+            if waiter.granted:
+                self._release(key)
+            else:
+                self._waiters.remove(waiter)
+                self._dispatch()
+            raise
+        return self._releaser(key)
+
+    def _release(self, key: str):
+        self._active -= 1
+        remaining = self._active_by_key.get(key, 1) - 1
+        if remaining:
+            self._active_by_key[key] = remaining
+        else:
+            self._active_by_key.pop(key, None)
+        self._dispatch()
+
+    def _releaser(self, key: str):
+        async def release():
+            self._release(key)
+        return release
+
+
+# Token bucket in Redis time: returns {allowed, retry_after}.
+_TAKE_TOKEN = """
+local rate, burst = tonumber(ARGV[1]), tonumber(ARGV[2])
+local t = redis.call('TIME')
+local now = tonumber(t[1]) + tonumber(t[2]) / 1000000
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+local tokens = tonumber(state[1]) or burst
+local stamp = tonumber(state[2]) or now
+tokens = math.min(burst, tokens + (now - stamp) * rate)
+local allowed, retry = 0, 0
+if tokens >= 1 then
+  tokens = tokens - 1
+  allowed = 1
+else
+  retry = (1 - tokens) / rate
+end
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'ts', tostring(now))
+redis.call('EXPIRE', KEYS[1], math.ceil(burst / rate) + 1)
+return {allowed, tostring(retry)}
+"""
+
+# One poll of a waiting ticket: {1, 0} granted, {0, position} still queued,
+# {-1, 0} queue full. Expired slot and queue leases are dropped first. Like
+# LocalAdmission._dispatch, a ticket is admitted when the free global slots
+# outnumber the tickets ahead of it that could use one: tickets whose user is
+# at USER_CONCURRENCY don't hold up the queue behind them.
+# KEYS: active, user active, queue (by arrival), queue leases, user queue, sequence,
+# queue owners (ticket -> user key). ARGV[9] prefixes a user key to its active set.
+_ACQUIRE = """
+local ticket, user = ARGV[1], ARGV[8]
+local global_limit, user_limit = tonumber(ARGV[2]), tonumber(ARGV[3])
+local lease_ms, wait_ms = tonumber(ARGV[4]), tonumber(ARGV[5])
+local queue_size, user_queue_size = tonumber(ARGV[6]), tonumber(ARGV[7])
+local t = redis.call('TIME')
+local now = tonumber(t[1]) * 1000 + math.floor(tonumber(t[2]) / 1000)
+redis.call('ZREMRANGEBYSCORE', KEYS[1], '-inf', now)
+redis.call('ZREMRANGEBYSCORE', KEYS[2], '-inf', now)
+redis.call('ZREMRANGEBYSCORE', KEYS[5], '-inf', now)
+for _, stale in ipairs(redis.call('ZRANGEBYSCORE', KEYS[4], '-inf', now)) do
+  redis.call('ZREM', KEYS[3], stale)
+  redis.call('HDEL', KEYS[7], stale)
+end
+redis.call('ZREMRANGEBYSCORE', KEYS[4], '-inf', now)
+local rank = redis.call('ZRANK', KEYS[3], ticket)
+if not rank then
+  if redis.call('ZCARD', KEYS[3]) >= queue_size or redis.call('ZCARD', KEYS[5]) >= user_queue_size then
+    return {-1, 0}
+  end
+  redis.call('ZADD', KEYS[3], redis.call('INCR', KEYS[6]), ticket)
+  redis.call('HSET', KEYS[7], ticket, user)
+  rank = redis.call('ZRANK', KEYS[3], ticket)
+end
+local free = global_limit - redis.call('ZCARD', KEYS[1])
+local room = {[user] = user_limit - redis.call('ZCARD', KEYS[2])}
+if free > 0 and room[user] > 0 and rank > 0 then
+  local ahead = 0
+  for _, other in ipairs(redis.call('ZRANGE', KEYS[3], 0, rank - 1)) do
+    local owner = redis.call('HGET', KEYS[7], other)
+    if not owner then
+      ahead = ahead + 1
+    else
+      if room[owner] == nil then
+        room[owner] = user_limit - redis.call('ZCOUNT', ARGV[9] .. owner, now, '+inf')
+      end
+      if room[owner] > 0 then
+        room[owner] = room[owner] - 1
+        ahead = ahead + 1
+      end
+    end
+    if ahead >= free then
+      break
+    end
+  end
+  free = free - ahead
+end
+if free > 0 and room[user] > 0 then
+  redis.call('ZREM', KEYS[3], ticket)
+  redis.call('ZREM', KEYS[4], ticket)
+  redis.call('ZREM', KEYS[5], ticket)
+  redis.call('HDEL', KEYS[7], ticket)
+  redis.call('ZADD', KEYS[1], now + lease_ms, ticket)
+  redis.call('ZADD', KEYS[2], now + lease_ms, ticket)
+  redis.call('PEXPIRE', KEYS[2], lease_ms)
+  return {1, 0}
+end
+redis.call('ZADD', KEYS[4], now + wait_ms, ticket)
+redis.call('ZADD', KEYS[5], now + wait_ms, ticket)
+redis.call('PEXPIRE', KEYS[5], wait_ms)
+return {0, rank + 1}
+"""
+
+# Extends a held slot's lease, so streams longer than LEASE_SECONDS keep it.
+# KEYS: active, user active. Returns 0 when the slot had already expired.
+_RENEW = """
+if not redis.call('ZSCORE', KEYS[1], ARGV[1]) then
+  return 0
+end
+local t = redis.call('TIME')
+local until_ms = tonumber(t[1]) * 1000 + math.floor(tonumber(t[2]) / 1000) + tonumber(ARGV[2])
+redis.call('ZADD', KEYS[1], until_ms, ARGV[1])
+redis.call('ZADD', KEYS[2], until_ms, ARGV[1])
+redis.call('PEXPIRE', KEYS[2], ARGV[2])
+return 1
+"""
+
+
+class RedisAdmission:
+    """Limits shared by every worker through Redis, falling back to ``LocalAdmission`` on errors."""
+
+    def __init__(self, config: dict, fallback: LocalAdmission):
+        self.config = config
+        self.fallback = fallback
+        self._loop = None
+        self._client = None
+
+    def _redis(self):
+        # redis.asyncio connections belong to the loop that opened them.
+        loop = asyncio.get_running_loop()
+        if self._client is None or self._loop is not loop:
+            self._loop = loop
+            self._client = aioredis.from_url(self.config["REDIS_URL"])
+            self._take_token = self._client.register_script(_TAKE_TOKEN)
+            self._acquire = self._client.register_script(_ACQUIRE)
+            self._renew = self._client.register_script(_RENEW)
+        return self._client
+
+    def _key(self, *parts) -> str:
+        return ":".join((self.config["KEY_PREFIX"], *map(str, parts)))
+
+    async def take_token(self, key: str):
+        try:
+            self._redis()
+            allowed, retry = await self._take_token(
+                keys=[self._key("bucket", key)], args=[self.config["RATE"], self.config["BURST"]]
+            )
+        except (redis.RedisError, OSError) as e:
+            logging.warning(f"⚠️ Admission Redis unavailable, limiting locally: {e}")
+            return await self.fallback.take_token(key)
+        if not int(allowed):
+            raise _reject("rate_limited", round(float(retry), 2))
+
+    async def acquire(self, key: str, on_position=None):
+        config = self.config
+        ticket = uuid.uuid4().hex
+        keys = [self._key("active"), self._key("active", key), self._key("queue"),
+                self._key("queue", "leases"), self._key("queue", key), self._key("queue", "seq"),
+                self._key("queue", "owners")]
+        wait_ms = int(max(1.0, config["POLL_INTERVAL"] * 20) * 1000)
+        args = [ticket, config["GLOBAL_CONCURRENCY"], config["USER_CONCURRENCY"],
+                int(config["LEASE_SECONDS"] * 1000), wait_ms, config["QUEUE_SIZE"], config["USER_QUEUE_SIZE"],
+                key, self._key("active") + ":"]
+        deadline = time.monotonic() + config["QUEUE_TIMEOUT"]
+        reported, queued = None, False
+        try:
+            while True:
+                try:
+                    self._redis()
+                    status, position = await self._acquire(keys=keys, args=args)
+                except (redis.RedisError, OSError) as e:
+                    logging.warning(f"⚠️ Admission Redis unavailable, limiting locally: {e}")
+                    await self._leave(keys, ticket)
+                    return await self.fallback.acquire(key, on_position)
+                status, position = int(status), int(position)
+                if status == 1:
+                    return self._releaser(keys, ticket)
+                if status == -1:
+                    raise _reject("queue_full")
+                if not queued:
+                    queued = True
+                    _queued.inc()
+                if on_position and position != reported:
+                    reported = position
+                    await on_position(position)
+                if time.monotonic() >= deadline:
+                    raise _reject("queue_timeout")
+                await asyncio.sleep(config["POLL_INTERVAL"])
+        except BaseException:
+            await self._leave(keys, ticket)
+            raise
+
+    async def _leave(self, keys, ticket):
+        """Drop ``ticket`` from every slot and queue set (best effort)."""
+        try:
+            pipe = self._redis().pipeline(transaction=False)
+            for k in keys[:5]:
+                pipe.zrem(k, ticket)
+            pipe.hdel(keys[6], ticket)
+            await pipe.execute()
+        except Exception as e:
+            logging.warning(f"⚠️ Could not release admission ticket {ticket}: {e}")
+
+    async def _keep_alive(self, keys, ticket):
+        """Renew the slot lease every third of ``LEASE_SECONDS`` while the turn runs."""
+        lease = self.config["LEASE_SECONDS"]
+        while True:
+            await asyncio.sleep(lease / 3)
+            try:
+                self._redis()
+                if not int(await self._renew(keys=keys[:2], args=[ticket, int(lease * 1000)])):
+                    logging.warning(f"⚠️ Admission lease {ticket} expired before it was renewed")
+                    return
+            except (redis.RedisError, OSError) as e:
+                logging.warning(f"⚠️ Could not renew admission lease {ticket}: {e}")
+
+    def _releaser(self, keys, ticket):
+        renewal = asyncio.ensure_future(self._keep_alive(keys, ticket))
+
+        async def release():
+            renewal.cancel()
+            await self._leave(keys, ticket)
+        return release
+
+
+ADMISSION_BACKENDS = {
+    "local": lambda config: LocalAdmission(config),
+    "redis": lambda config: RedisAdmission(config, LocalAdmission(config)),
+}
+
+_admission = None
+_admission_lock = threading.Lock()
+
+
+def get_admission():
+    global _admission
+    if _admission is None:
+        with _admission_lock:
+            if _admission is None:
+                config = admission_config()
+                backend = config["BACKEND"]
+                if backend == "redis" and aioredis is None:
+                    logging.warning("⚠️ redis client not installed, using local admission control.")
+                    backend = "local"
+                _admission = ADMISSION_BACKENDS[backend](config)
+    return _admission
+
+
+async def check_rate(key: str):
+    """Take one token from ``key``'s bucket or raise ``AdmissionRejected``."""
+    if admission_config()["ENABLED"]:
+        await get_admission().take_token(key)
+
+
+@contextlib.asynccontextmanager
+async def admit(key: str, on_position=None):
+    """Hold a per-user and global slot for the body; ``on_position(n)`` is awaited while queued."""
+    if not admission_config()["ENABLED"]:
+        yield
+        return
+    started = time.monotonic()
+    release = await get_admission().acquire(key, on_position)
+    admission_wait_seconds.observe(time.monotonic() - started)
+    _admitted.inc()
+    try:
+        yield
+    finally:
+        await release()
@@ -0,0 +1,138 @@
+# backend/chatbot/answer_cache.py
+"""
+Semantic answer cache in front of Gemini.
+
+Answers are stored with their query embedding in the ``answer_cache``
+collection. Each entry has a scope: ``global`` when the prompt used only
+global resources (no student documents, no chat history), otherwise
+``student:<id>`` so personal answers are only ever replayed to their owner.
+Entries older than ``TTL`` are filtered out in the query itself and deleted
+by the ``purge_answer_cache`` Celery task.
+"""
+import logging
+import time
+import uuid
+
+from django.conf import settings
+
+from .metrics import counter, gauge, histogram, hit_ratio
+from .vector_store import get_answer_cache_collection
+
+DEFAULT_ANSWER_CACHE = {"ENABLED": True, "SIMILARITY": 0.95, "TTL": 24 * 3600}
+
+GLOBAL_SCOPE = "global"
+
+_hits = counter("answer_cache_hits_total", "Questions answered from the semantic cache")
+_misses = counter("answer_cache_misses_total", "Questions that went to Gemini")
+gauge("answer_cache_hit_ratio", "Share of questions answered from the semantic cache", hit_ratio([_hits], [_misses]))
+_saved_seconds = counter("answer_cache_saved_seconds_total", "Generation time avoided by cache hits")
+_lookup_seconds = histogram("answer_cache_lookup_seconds", description="Semantic cache lookup latency")
+
+
+def answer_cache_config() -> dict:
+    config = dict(DEFAULT_ANSWER_CACHE)
+    config.update(getattr(settings, "ANSWER_CACHE", {}))
+    return config
+
+
+def student_scope(student_id: str) -> str:
+    return f"student:{student_id}"
+
+
+def lookup_answer(student_id: str, query_embedding, authenticated: bool = True):
+    """Return the closest cached answer dict within the similarity threshold, or None."""
+    config = answer_cache_config()
+    if not config["ENABLED"]:
+        return None
+
+    started = time.monotonic()
+    scopes = [GLOBAL_SCOPE]
+    if authenticated:
+        scopes.append(student_scope(student_id))
+    oldest = time.time() - config["TTL"]
+    try:
+        results = get_answer_cache_collection().query(
+            query_embeddings=[query_embedding],
+            n_results=3,
+            where={"$and": [{"scope": {"$in": scopes}}, {"created_at": {"$gte": oldest}}]},
+            include=["documents", "metadatas", "distances"],
+        )
+    except Exception as e:
+        logging.warning(f"⚠️ Answer cache lookup failed: {e}")
+        return None
+    finally:
+        _lookup_seconds.observe(time.monotonic() - started)
+
+    max_distance = 1.0 - config["SIMILARITY"]
+    documents = (results.get("documents") or [[]])[0]
+    metadatas = (results.get("metadatas") or [[]])[0]
+    distances = (results.get("distances") or [[]])[0]
+    for answer, meta, distance in zip(documents, metadatas, distances):
+        if distance <= max_distance:
+            _hits.inc()
+            _saved_seconds.inc(meta.get("generation_seconds", 0.0))
+            return {"answer": answer, "scope": meta.get("scope"), "similarity": round(1.0 - distance, 4)}
+
+    _misses.inc()
+    return None
+
+
+def store_answer(student_id: str, query: str, query_embedding, answer: str,
+                 personal: bool, generation_seconds: float, authenticated: bool = True):
+    """Cache a freshly generated answer under the appropriate scope."""
+    config = answer_cache_config()
+    if not config["ENABLED"] or not answer.strip():
+        return
+    if personal and not authenticated:
+        # Guests share one student collection, so their personal answers are never cached.
+        return
+    scope = student_scope(student_id) if personal else GLOBAL_SCOPE
+    try:
+        get_answer_cache_collection().add(
+            ids=[f"answer_{uuid.uuid4().hex}"],
+            documents=[answer],
+            embeddings=[query_embedding],
+            metadatas=[{
+                "scope": scope,
+                "query": query[:500],
+                "generation_seconds": float(generation_seconds),
+                "created_at": time.time(),
+            }],
+        )
+    except Exception as e:
+        logging.warning(f"⚠️ Could not store answer in cache: {e}")
+
+
+def invalidate_answers(owner_id=None):
+    """Drop cached answers that new resources could change: all global ones and the owner's."""
+    scopes = [GLOBAL_SCOPE]
+    if owner_id:
+        scopes.append(student_scope(str(owner_id)))
+    try:
+        get_answer_cache_collection().delete(where={"scope": {"$in": scopes}})
+    except Exception as e:
+        logging.warning(f"⚠️ Could not invalidate answer cache: {e}")
+
+
+def purge_expired_answers() -> int:
+    """Delete entries past ``TTL``; returns how many were removed."""
+    oldest = time.time() - answer_cache_config()["TTL"]
+    collection = get_answer_cache_collection()
+    expired = collection.get(where={"created_at": {"$lt": oldest}}, include=[])["ids"]
+    if expired:
+        collection.delete(ids=expired)
+        logging.info(f"♻️ Purged {len(expired)} expired cached answers")
+    return len(expired)
+
+
+def replay_chunks(answer: str, size: int = 200):
+    """Split a cached answer into partial-frame sized pieces on word boundaries."""
+    start = 0
+    while start < len(answer):
+        end = min(len(answer), start + size)
+        if end < len(answer):
+            space = answer.rfind(" ", start, end)
+            if space > start:
+                end = space + 1
+        yield answer[start:end]
+        start = end
@@ -4,3 +4,12 @@ from django.apps import AppConfig
 class ChatbotConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'chatbot'
+
+    def ready(self):
+        from . import signals  # noqa: F401
+        from .fake_providers import fakes_config, install_fake_providers
+        from .tracing import configure_tracing
+
+        configure_tracing()
+        if fakes_config()["ENABLED"]:
+            install_fake_providers()
@@ -0,0 +1,114 @@
+# backend/chatbot/archival.py
+"""
+Retention for ChatHistory: rows older than ``CHAT_ARCHIVE['RETENTION_DAYS']``
+are moved, oldest first and ``BATCH_SIZE`` at a time, into gzip-compressed
+JSON-lines files under ``CHAT_ARCHIVE['DIR']``. Each batch is recorded as a
+``ChatHistoryArchive`` row and its rows are deleted in the same transaction.
+
+File names are derived from the batch's first and last row id, so a batch
+interrupted after writing its file is simply rewritten on the next run.
+"""
+import gzip
+import hashlib
+import json
+import logging
+import os
+import tempfile
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from .metrics import counter
+
+DEFAULT_ARCHIVE = {
+    "DIR": os.path.join(os.path.dirname(__file__), "archive"),
+    "RETENTION_DAYS": 365,
+    "BATCH_SIZE": 5000,
+}
+
+_archived = counter("chat_history_archived_rows_total", "ChatHistory rows moved to compressed archives")
+
+
+def archive_config() -> dict:
+    config = dict(DEFAULT_ARCHIVE)
+    config.update(getattr(settings, "CHAT_ARCHIVE", {}))
+    return config
+
+
+def _write_batch(directory: str, rows) -> tuple:
+    """Write ``rows`` as gzip JSON lines; return ``(relative path, sha256)``."""
+    first, last = rows[0], rows[-1]
+    subdir = first["created_at"].strftime("%Y/%m")
+    relative = os.path.join(subdir, f"chat_history_{first['id']}_{last['id']}.jsonl.gz")
+    path = os.path.join(directory, relative)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+
+    digest = hashlib.sha256()
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+    with os.fdopen(fd, "wb") as raw, gzip.GzipFile(fileobj=raw, mode="wb") as f:
+        for row in rows:
+            line = json.dumps({**row, "created_at": row["created_at"].isoformat()}).encode("utf-8") + b"\n"
+            digest.update(line)
+            f.write(line)
+    os.replace(tmp, path)
+    return relative, digest.hexdigest()
+
+
+def archive_batch(cutoff, batch_size: int, directory: str) -> int:
+    """Archive and delete up to ``batch_size`` of the oldest rows created before ``cutoff``."""
+    from .models import ChatHistory, ChatHistoryArchive
+
+    rows = list(
+        ChatHistory.objects.filter(created_at__lt=cutoff)
+        .order_by("created_at", "id")
+        .values("id", "user_id", "question", "answer", "created_at")[:batch_size]
+    )
+    if not rows:
+        return 0
+
+    relative, sha256 = _write_batch(directory, rows)
+    with transaction.atomic():
+        ChatHistoryArchive.objects.update_or_create(
+            path=relative,
+            defaults={
+                "row_count": len(rows),
+                "first_id": rows[0]["id"],
+                "last_id": rows[-1]["id"],
+                "oldest": rows[0]["created_at"],
+                "newest": rows[-1]["created_at"],
+                "sha256": sha256,
+            },
+        )
+        ChatHistory.objects.filter(id__in=[row["id"] for row in rows]).delete()
+    _archived.inc(len(rows))
+    return len(rows)
+
+
+def archive_old_history(retention_days: int = None, batch_size: int = None, max_batches: int = None, progress=None) -> int:
+    """Archive everything past retention in batches; returns the number of rows moved."""
+    config = archive_config()
+    retention_days = config["RETENTION_DAYS"] if retention_days is None else retention_days
+    batch_size = batch_size or config["BATCH_SIZE"]
+    cutoff = timezone.now() - timedelta(days=retention_days)
+
+    total, batches = 0, 0
+    while max_batches is None or batches < max_batches:
+        moved = archive_batch(cutoff, batch_size, config["DIR"])
+        if not moved:
+            break
+        total += moved
+        batches += 1
+        if progress:
+            progress(total)
+    if total:
+        logging.info(f"🗄️ Archived {total} chat history rows older than {retention_days} days in {batches} batches")
+    return total
+
+
+def read_archive(path: str):
+    """Yield the rows stored in one archive file (path relative to ``CHAT_ARCHIVE['DIR']``)."""
+    with gzip.open(os.path.join(archive_config()["DIR"], path), "rt", encoding="utf-8") as f:
+        for line in f:
+            yield json.loads(line)
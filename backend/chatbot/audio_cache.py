@@ -0,0 +1,192 @@
+# backend/chatbot/audio_cache.py
+"""
+Content-addressed on-disk cache for synthesized audio.
+
+Keys are a SHA-256 of (voice, encoding, normalized text). Files live under
+``TTS_AUDIO_CACHE['DIR']``; a file's mtime is its last use, and the least
+recently used files are evicted once the store exceeds ``MAX_BYTES``. The
+directory can be shared by every worker on a host: each process only sees
+its own writes, so it re-stats the directory after writing ``RESCAN_FRACTION``
+of the budget, and eviction runs under a lock file so one process does it at
+a time.
+"""
+import contextlib
+import hashlib
+import logging
+import os
+import re
+import tempfile
+import threading
+
+from django.conf import settings
+
+try:
+    import fcntl
+except ImportError:  # no cross-process lock; eviction still works per process
+    fcntl = None
+
+from .metrics import counter, gauge, hit_ratio
+
+DEFAULT_AUDIO_CACHE = {
+    "ENABLED": True,
+    "DIR": os.path.join(os.path.dirname(__file__), "tts_cache"),
+    "MAX_BYTES": 512 * 1024 * 1024,
+    "RESCAN_FRACTION": 0.05,
+}
+
+_WHITESPACE = re.compile(r"\s+")
+
+_hits = counter("tts_cache_hits_total", "Audio served from the TTS cache")
+_misses = counter("tts_cache_misses_total", "Audio that had to be synthesized")
+gauge("tts_cache_hit_ratio", "Share of TTS requests served from the audio cache", hit_ratio([_hits], [_misses]))
+_bytes_saved = counter("tts_cache_bytes_saved_total", "Audio bytes served from cache instead of Google TTS")
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def audio_cache_config() -> dict:
+    config = dict(DEFAULT_AUDIO_CACHE)
+    config.update(getattr(settings, "TTS_AUDIO_CACHE", {}))
+    return config
+
+
+def audio_key(text: str, voice: str, encoding: str) -> str:
+    normalized = _WHITESPACE.sub(" ", text or "").strip()
+    return hashlib.sha256(f"{voice}\0{encoding}\0{normalized}".encode("utf-8")).hexdigest()
+
+
+class AudioCache:
+    def __init__(self, directory: str, max_bytes: int, rescan_fraction: float = 0.05):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.rescan_bytes = max_bytes * rescan_fraction
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+        self._size = sum(size for _, size, _ in self._entries())
+        self._unscanned = 0
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, key[:2], f"{key}.audio")
+
+    def _entries(self):
+        for root, _dirs, files in os.walk(self.directory):
+            for name in files:
+                if name.endswith(".audio"):
+                    path = os.path.join(root, name)
+                    try:
+                        st = os.stat(path)
+                    except FileNotFoundError:
+                        continue
+                    yield path, st.st_size, st.st_mtime
+
+    def get(self, key: str):
+        path = self._path(key)
+        try:
+            with open(path, "rb") as f:
+                audio = f.read()
+            os.utime(path)  # mark as recently used
+        except FileNotFoundError:
+            return None
+        return audio
+
+    def put(self, key: str, audio: bytes):
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(audio)
+            os.replace(tmp, path)  # atomic, so concurrent readers never see partial files
+        finally:
+            with contextlib.suppress(FileNotFoundError):
+                os.remove(tmp)
+        with self._lock:
+            self._size += len(audio)
+            self._unscanned += len(audio)
+            # Other workers write here too: re-stat before trusting our estimate for long.
+            if self._size > self.max_bytes or self._unscanned >= self.rescan_bytes:
+                self._evict()
+
+    @contextlib.contextmanager
+    def _directory_lock(self):
+        """Hold an exclusive lock file across processes; yields False if another one holds it."""
+        if fcntl is None:
+            yield True
+            return
+        with open(os.path.join(self.directory, ".lock"), "a") as f:
+            try:
+                fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                yield False
+                return
+            try:
+                yield True
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+    def _evict(self):
+        self._unscanned = 0
+        with self._directory_lock() as locked:
+            if not locked:
+                return  # another worker is rescanning or evicting right now
+            # Drop least recently used files until 90% of the budget is free again.
+            entries = sorted(self._entries(), key=lambda e: e[2])
+            total = sum(size for _, size, _ in entries)
+            if total > self.max_bytes:
+                target = int(self.max_bytes * 0.9)
+                for path, size, _ in entries:
+                    if total <= target:
+                        break
+                    try:
+                        os.remove(path)
+                        total -= size
+                    except FileNotFoundError:
+                        pass
+            self._size = total
+
+
+def get_audio_cache():
+    """Return the process-wide audio cache, or None when disabled."""
+    global _cache
+    config = audio_cache_config()
+    if not config["ENABLED"]:
+        return None
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = AudioCache(config["DIR"], config["MAX_BYTES"], config["RESCAN_FRACTION"])
+    return _cache
+
+
+def cached_audio(text: str, voice: str, encoding: str, synthesize):
+    """Return cached audio for (text, voice, encoding), calling ``synthesize()`` on a miss."""
+    cache = get_audio_cache()
+    if cache is None:
+        return synthesize()
+
+    key = audio_key(text, voice, encoding)
+    audio = cache.get(key)
+    if audio is not None:
+        _hits.inc()
+        _bytes_saved.inc(len(audio))
+        return audio
+
+    _misses.inc()
+    audio = synthesize()
+    try:
+        cache.put(key, audio)
+    except OSError as e:
+        logging.warning(f"⚠️ Could not write TTS cache entry: {e}")
+    return audio
+
+
+def audio_cache_stats() -> dict:
+    hits, misses = _hits.value, _misses.value
+    total = hits + misses
+    return {
+        "hits": hits,
+        "misses": misses,
+        "hit_ratio": round(hits / total, 4) if total else 0.0,
+        "bytes_saved": _bytes_saved.value,
+    }
@@ -0,0 +1,106 @@
+# backend/chatbot/audio_stream.py
+"""
+Sentence-level streaming TTS for the chat socket.
+
+Text is fed in as Gemini streams it; each complete sentence is synthesized
+concurrently on the network pool and sent, in order, as a binary WebSocket
+frame::
+
+    +------+----------------+------------------+
+    | kind |  seq (uint32)  |   audio bytes    |
+    | 0x01 |  big-endian    |  (e.g. OGG/Opus) |
+    +------+----------------+------------------+
+
+The JSON frames ``audio_start`` (content type, encoding) and ``audio_end``
+(segment count) bracket the binary frames. They go through
+``consumer.send_frame``, so pending partial text is flushed first; kind 0x02
+is taken by deflated JSON frames (wire.py).
+"""
+import asyncio
+import logging
+import struct
+
+from .executors import run_network
+from .tts import SentenceSegmenter, content_type_for, synthesize_speech
+
+FRAME_AUDIO = 0x01
+AUDIO_HEADER = struct.Struct(">BI")
+
+
+def pack_audio_frame(seq: int, audio: bytes) -> bytes:
+    return AUDIO_HEADER.pack(FRAME_AUDIO, seq) + audio
+
+
+class AudioStreamer:
+    """Turns a stream of answer text into ordered binary audio frames on ``consumer``."""
+
+    def __init__(self, consumer, encoding: str = "OGG_OPUS", max_concurrency: int = 4):
+        self.consumer = consumer
+        self.encoding = encoding
+        self.segmenter = SentenceSegmenter()
+        self._limit = asyncio.Semaphore(max_concurrency)
+        self._pending = asyncio.Queue()
+        self._tasks = []
+        self._seq = 0
+        self._sent = 0
+        self._sender = None
+        self.errors = []
+
+    async def _synthesize(self, text: str) -> bytes:
+        async with self._limit:
+            return await run_network(synthesize_speech, text, self.encoding)
+
+    async def _send_in_order(self):
+        # Segments finish out of order; frames go out strictly by sequence number.
+        while True:
+            item = await self._pending.get()
+            if item is None:
+                return
+            seq, task = item
+            try:
+                audio = await task
+            except Exception as e:
+                logging.error(f"🎤 TTS segment {seq} failed: {e}")
+                self.errors.append(str(e))
+                continue
+            await self.consumer.send(bytes_data=pack_audio_frame(seq, audio))
+            self._sent += 1
+
+    async def _start(self):
+        if self._sender is None:
+            await self.consumer.send_frame({
+                "type": "audio_start",
+                "encoding": self.encoding,
+                "content_type": content_type_for(self.encoding),
+            })
+            self._sender = asyncio.create_task(self._send_in_order())
+
+    async def _enqueue(self, segments):
+        for text in segments:
+            await self._start()
+            task = asyncio.create_task(self._synthesize(text))
+            self._tasks.append(task)
+            await self._pending.put((self._seq, task))
+            self._seq += 1
+
+    async def feed(self, text: str):
+        """Feed streamed answer text; complete sentences start synthesizing immediately."""
+        await self._enqueue(self.segmenter.feed(text))
+
+    async def finish(self):
+        """Synthesize the remaining text, wait for every frame, then send ``audio_end``."""
+        await self._enqueue(self.segmenter.flush())
+        if self._sender is None:
+            return
+        await self._pending.put(None)
+        await self._sender
+        payload = {"type": "audio_end", "segments": self._sent}
+        if self.errors:
+            payload["tts_error"] = self.errors[0]
+        await self.consumer.send_frame(payload)
+
+    def cancel(self):
+        for task in self._tasks:
+            task.cancel()
+        if self._sender is not None:
+            self._sender.cancel()
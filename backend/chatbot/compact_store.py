@@ -0,0 +1,596 @@
+# backend/chatbot/compact_store.py
+"""
+Compact on-disk vector engine (``VECTOR_STORE['BACKEND'] = "compact"``).
+
+Only per-student collections (``student_*``) are stored compactly; the
+global, answer-cache and shared-layout collections go straight to Chroma HNSW.
+
+A compact collection is a directory of immutable segments. Each segment holds
+a write's vectors as one NumPy array (float16, or int8 with a float32 scale
+per row) plus a JSON file of its ids, documents and metadata. A small manifest
+lists the segments and the tombstones of deleted ids:
+
+* writes append a segment and rewrite only the manifest, so a write costs
+  O(batch); a later copy of an id supersedes earlier ones;
+* deletes only add tombstones;
+* the newest segments are merged while they outweigh the one before them or
+  there are more than ``MAX_SEGMENTS``, so each row is rewritten O(log N)
+  times; once dead rows outnumber live ones, everything is compacted.
+
+Arrays are memory-mapped, so idle tenants cost little beyond the page cache.
+Search is an exact vectorized scan over a float32 view that is built once per
+collection version and kept for the ``HOT_COLLECTIONS`` most recently queried
+collections. A collection that grows past ``PROMOTE_AT`` vectors is moved into
+a Chroma HNSW collection and served from there.
+
+Implements the subset of the Chroma client/collection API that vector_store.py
+and the management commands use, so it slots in as another client backend.
+Writers in different processes are serialized with a per-collection file lock;
+readers notice new versions by the manifest's stat and load only new segments.
+"""
+import json
+import logging
+import operator
+import os
+import shutil
+import tempfile
+import threading
+import uuid
+from collections import OrderedDict
+from contextlib import contextmanager
+
+import numpy as np
+
+try:
+    import fcntl
+except ImportError:  # no cross-process lock; writers are still serialized within the process
+    fcntl = None
+
+RECORDS_FILE = "records.json"  # the manifest
+LOCK_FILE = ".lock"
+ANN_DIR = "_ann"
+COMPACT_PREFIX = "student_"
+
+_OPERATORS = {
+    "$eq": operator.eq,
+    "$ne": operator.ne,
+    "$in": lambda value, arg: value in arg,
+    "$nin": lambda value, arg: value not in arg,
+    "$gt": lambda value, arg: value is not None and value > arg,
+    "$gte": lambda value, arg: value is not None and value >= arg,
+    "$lt": lambda value, arg: value is not None and value < arg,
+    "$lte": lambda value, arg: value is not None and value <= arg,
+}
+
+
+def matches(metadata, where) -> bool:
+    """Evaluate a Chroma-style ``where`` filter against one metadata dict."""
+    metadata = metadata or {}
+    for key, condition in where.items():
+        if key == "$and":
+            if not all(matches(metadata, clause) for clause in condition):
+                return False
+        elif key == "$or":
+            if not any(matches(metadata, clause) for clause in condition):
+                return False
+        elif isinstance(condition, dict):
+            value = metadata.get(key)
+            if not all(_OPERATORS[op](value, arg) for op, arg in condition.items()):
+                return False
+        elif metadata.get(key) != condition:
+            return False
+    return True
+
+
+def quantize(vectors: np.ndarray, dtype: str):
+    """Return ``(stored, scales)``; int8 keeps one float32 scale per row."""
+    if dtype == "int8":
+        scales = np.abs(vectors).max(axis=1) / 127.0
+        scales[scales == 0] = 1.0
+        return np.round(vectors / scales[:, None]).astype(np.int8), scales.astype(np.float32)
+    return vectors.astype(np.float16), None
+
+
+def _distances(matrix: np.ndarray, query: np.ndarray, space: str) -> np.ndarray:
+    dots = matrix @ query
+    if space == "cosine":
+        norms = np.linalg.norm(matrix, axis=1) * (np.linalg.norm(query) or 1.0)
+        return 1.0 - dots / np.where(norms == 0, 1.0, norms)
+    if space == "ip":
+        return 1.0 - dots
+    # Squared L2, as Chroma reports it.
+    return np.einsum("ij,ij->i", matrix, matrix) - 2.0 * dots + float(query @ query)
+
+
+class _Segment:
+    """One immutable write: ids, documents and metadata plus their (quantized) vectors."""
+    __slots__ = ("name", "seq", "ids", "documents", "metadatas", "vectors", "scales")
+
+    def __init__(self, name, seq, records, vectors=None, scales=None):
+        self.name = name
+        self.seq = seq
+        self.ids = records["ids"]
+        self.documents = records["documents"]
+        self.metadatas = records["metadatas"]
+        self.vectors = vectors
+        self.scales = scales
+
+    def matrix(self, rows) -> np.ndarray:
+        """Dequantized float32 vectors of ``rows``."""
+        matrix = np.asarray(self.vectors[rows], dtype=np.float32)
+        if self.scales is not None:
+            matrix = matrix * np.asarray(self.scales[rows])[:, None]
+        return matrix
+
+
+class _State:
+    """The live view of a collection: the latest copy of every id not hidden by a tombstone."""
+
+    def __init__(self, stamp=None, manifest=None, segments=()):
+        self.stamp = stamp
+        self.manifest = manifest or {"segments": [], "deleted": {}, "next_seq": 1}
+        self.segments = list(segments)
+        deleted = self.manifest.get("deleted", {})
+        latest = {}
+        for s, segment in enumerate(self.segments):
+            for r, doc_id in enumerate(segment.ids):
+                # A tombstone hides copies written up to the segment current at delete time.
+                if deleted.get(doc_id, -1) < segment.seq:
+                    latest.pop(doc_id, None)
+                    latest[doc_id] = (s, r)
+        self.ids = list(latest)
+        self.locations = list(latest.values())
+        self.documents = [self.segments[s].documents[r] for s, r in self.locations]
+        self.metadatas = [self.segments[s].metadatas[r] for s, r in self.locations]
+        self.total_rows = sum(len(segment.ids) for segment in self.segments)
+        self._matrix = None
+
+    @property
+    def promoted(self) -> bool:
+        return bool(self.manifest.get("promoted"))
+
+    def matrix(self, rows=None) -> np.ndarray:
+        """Float32 vectors of the live rows (optionally just ``rows``), dequantized once per state."""
+        if not self.ids:
+            return np.zeros((0, 0), dtype=np.float32)
+        if self._matrix is None:
+            dim = self.segments[self.locations[0][0]].vectors.shape[1]
+            matrix = np.empty((len(self.ids), dim), dtype=np.float32)
+            by_segment = {}
+            for position, (s, r) in enumerate(self.locations):
+                by_segment.setdefault(s, ([], []))
+                by_segment[s][0].append(position)
+                by_segment[s][1].append(r)
+            for s, (positions, segment_rows) in by_segment.items():
+                matrix[positions] = self.segments[s].matrix(segment_rows)
+            self._matrix = matrix
+        return self._matrix if rows is None else self._matrix[rows]
+
+
+class CompactCollection:
+    def __init__(self, client, name: str, space: str = "l2"):
+        self._client = client
+        self.name = name
+        self.space = space
+        self.path = os.path.join(client.path, name)
+        self._lock = threading.RLock()
+        self._state = None
+        self._segments = {}  # segment name -> _Segment, reused across manifest versions
+
+    @property
+    def configuration(self):
+        ann = self._ann()
+        return ann.configuration if ann is not None else {"hnsw": {"space": self.space}}
+
+    # ─── storage ──────────────────────────────────────────────────────
+
+    def _records_path(self):
+        return os.path.join(self.path, RECORDS_FILE)
+
+    def _load_segment(self, entry) -> _Segment:
+        segment = self._segments.get(entry["records"])
+        if segment is None:
+            with open(os.path.join(self.path, entry["records"])) as f:
+                records = json.load(f)
+            vectors = np.load(os.path.join(self.path, entry["vectors"]), mmap_mode="r")
+            scales = np.load(os.path.join(self.path, entry["scales"]), mmap_mode="r") if entry.get("scales") else None
+            segment = _Segment(entry["records"], entry["seq"], records, vectors, scales)
+        return segment
+
+    def _load_legacy(self, records) -> _Segment:
+        # Collections written before segments existed: one array with the records inline.
+        vectors = np.load(os.path.join(self.path, records["vectors"]), mmap_mode="r")
+        scales = np.load(os.path.join(self.path, records["scales"]), mmap_mode="r") if records.get("scales") else None
+        return _Segment(records["vectors"], 0, records, vectors, scales)
+
+    def _load(self) -> _State:
+        with self._lock:
+            for _attempt in range(5):
+                try:
+                    st = os.stat(self._records_path())
+                except FileNotFoundError:
+                    self._state = _State()
+                    return self._state
+                stamp = (st.st_mtime_ns, st.st_size, st.st_ino)
+                if self._state is not None and self._state.stamp == stamp:
+                    return self._state
+                try:
+                    with open(self._records_path()) as f:
+                        manifest = json.load(f)
+                    if manifest.get("ids"):
+                        segments = [self._load_legacy(manifest)]
+                    else:
+                        segments = [self._load_segment(entry) for entry in manifest.get("segments", ())]
+                except (FileNotFoundError, ValueError):
+                    continue  # a compaction replaced the files underneath us; read again
+                self.space = manifest.get("space", self.space)
+                self._segments = {segment.name: segment for segment in segments}
+                self._state = _State(stamp, manifest, segments)
+                return self._state
+            raise RuntimeError(f"Could not read compact collection {self.name}")
+
+    @contextmanager
+    def _writing(self):
+        """Exclusive (cross-process) access; yields the freshly loaded state."""
+        os.makedirs(self.path, exist_ok=True)
+        with self._lock, open(os.path.join(self.path, LOCK_FILE), "a") as lock:
+            if fcntl is not None:
+                fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                self._state = None
+                state = self._load()
+                if state.manifest.get("ids"):
+                    self._merge(state, 0)  # rewrite a legacy collection as a segment first
+                    state = self._load()
+                yield state
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(lock, fcntl.LOCK_UN)
+
+    def _write_file(self, prefix: str, suffix: str, write) -> str:
+        name = f"{prefix}.{uuid.uuid4().hex[:12]}{suffix}"
+        fd, tmp = tempfile.mkstemp(dir=self.path, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                write(f)
+            os.replace(tmp, os.path.join(self.path, name))
+        finally:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+        return name
+
+    def _write_segment(self, seq, ids, documents, metadatas, matrix) -> dict:
+        stored, scales = quantize(matrix, self._client.dtype)
+        records = json.dumps({"ids": ids, "documents": documents, "metadatas": metadatas}).encode("utf-8")
+        entry = {
+            "seq": seq,
+            "records": self._write_file(f"segment-{seq}", ".json", lambda f: f.write(records)),
+            "vectors": self._write_file(f"segment-{seq}", ".npy", lambda f: np.save(f, stored)),
+        }
+        if scales is not None:
+            entry["scales"] = self._write_file(f"scales-{seq}", ".npy", lambda f: np.save(f, scales))
+        return entry
+
+    def _write_manifest(self, manifest, prune=False):
+        manifest = {"space": self.space, "dtype": self._client.dtype, **manifest}
+        data = json.dumps(manifest).encode("utf-8")
+        fd, tmp = tempfile.mkstemp(dir=self.path, suffix=".tmp")
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        os.replace(tmp, self._records_path())  # readers switch over atomically
+        if prune:
+            keep = {RECORDS_FILE, LOCK_FILE}
+            for entry in manifest.get("segments", ()):
+                keep.update(v for k, v in entry.items() if k != "seq")
+            for name in os.listdir(self.path):
+                if name not in keep and not name.endswith(".tmp"):
+                    try:
+                        os.remove(os.path.join(self.path, name))
+                    except FileNotFoundError:
+                        pass
+        self._state = None
+
+    def _append(self, state, ids, documents, metadatas, matrix):
+        """Write one new segment, then compact or promote if that is now due."""
+        manifest = dict(state.manifest)
+        seq = manifest.get("next_seq", 1)
+        manifest["segments"] = list(manifest.get("segments", ())) + [
+            self._write_segment(seq, ids, documents, metadatas, matrix)
+        ]
+        manifest["next_seq"] = seq + 1
+        self._write_manifest(manifest)
+        self._maintain()
+
+    def _maintain(self):
+        state = self._load()
+        if len(state.ids) >= self._client.promote_at:
+            return self._promote(state)
+        if state.total_rows - len(state.ids) > len(state.ids):
+            return self._merge(state, 0)  # mostly dead rows: rewrite everything
+        # Size-tiered: fold the newest segments together while they outweigh the one before
+        # them (or there are too many), so every row is rewritten O(log N) times.
+        sizes = [len(segment.ids) for segment in state.segments]
+        start = len(sizes) - 1
+        tail = sizes[start] if sizes else 0
+        while start > 0 and (start + 1 > self._client.max_segments or sizes[start - 1] <= tail):
+            start -= 1
+            tail += sizes[start]
+        if start < len(sizes) - 1:
+            self._merge(state, start)
+
+    def _merge(self, state, start: int):
+        """Rewrite the live rows of ``segments[start:]`` as one segment."""
+        positions = [i for i, (s, _r) in enumerate(state.locations) if s >= start]
+        by_segment = {}
+        for i in positions:
+            s, r = state.locations[i]
+            by_segment.setdefault(s, []).append(r)
+        seq = state.manifest.get("next_seq", 1)
+        segments = list(state.manifest.get("segments", ()))[:start]
+        if positions:
+            matrix = np.vstack([state.segments[s].matrix(rows) for s, rows in by_segment.items()])
+            ids, documents, metadatas = [], [], []
+            for s, rows in by_segment.items():
+                segment = state.segments[s]
+                ids += [segment.ids[r] for r in rows]
+                documents += [segment.documents[r] for r in rows]
+                metadatas += [segment.metadatas[r] for r in rows]
+            segments.append(self._write_segment(seq, ids, documents, metadatas, matrix))
+        # Tombstones only matter for rows still in untouched segments.
+        kept = {doc_id for entry in state.segments[:start] for doc_id in entry.ids}
+        deleted = {k: v for k, v in state.manifest.get("deleted", {}).items() if k in kept}
+        self._write_manifest({"segments": segments, "deleted": deleted, "next_seq": seq + 1}, prune=True)
+        logging.debug(f"🗜️ Compacted {self.name}: {len(state.segments) - start} segments "
+                      f"-> {1 if positions else 0} ({len(positions)} rows)")
+
+    # ─── promotion to ANN ─────────────────────────────────────────────
+
+    def _ann(self):
+        state = self._load()
+        if not state.promoted:
+            return None
+        return self._client.ann_collection(self.name, self.space)
+
+    def _promote(self, state, batch_size=1000):
+        ann = self._client.ann_collection(self.name, self.space)
+        matrix = state.matrix()
+        for start in range(0, len(state.ids), batch_size):
+            end = start + batch_size
+            ann.upsert(
+                ids=state.ids[start:end], documents=state.documents[start:end],
+                embeddings=matrix[start:end].tolist(), metadatas=[m or None for m in state.metadatas[start:end]],
+            )
+        self._write_manifest({"promoted": True, "segments": [], "deleted": {}}, prune=True)
+        logging.info(f"🚀 Promoted compact collection {self.name} to HNSW ({len(state.ids)} vectors)")
+
+    # ─── Chroma collection API ────────────────────────────────────────
+
+    def count(self) -> int:
+        ann = self._ann()
+        return ann.count() if ann is not None else len(self._load().ids)
+
+    def _position(self, state):
+        return {doc_id: i for i, doc_id in enumerate(state.ids)}
+
+    def upsert(self, ids, embeddings=None, documents=None, metadatas=None):
+        ann = self._ann()
+        if ann is not None:
+            return ann.upsert(ids=ids, embeddings=embeddings, documents=documents, metadatas=metadatas)
+        with self._writing() as state:
+            if state.promoted:
+                return self._ann().upsert(ids=ids, embeddings=embeddings, documents=documents, metadatas=metadatas)
+            position = self._position(state)
+            latest = {}  # last occurrence wins within one call, as in Chroma
+            for i, doc_id in enumerate(ids):
+                latest.pop(doc_id, None)
+                latest[doc_id] = i
+            batch_ids, batch_docs, batch_metas, vectors = [], [], [], []
+            for doc_id, i in latest.items():
+                row = position.get(doc_id)
+                if embeddings is None and row is None:
+                    continue  # nothing to store without a vector
+                batch_ids.append(doc_id)
+                batch_docs.append(documents[i] if documents is not None
+                                  else (state.documents[row] if row is not None else None))
+                batch_metas.append(metadatas[i] if metadatas is not None
+                                   else (state.metadatas[row] if row is not None else None))
+                vectors.append(np.asarray(embeddings[i], dtype=np.float32) if embeddings is not None
+                               else state.matrix([row])[0])
+            if batch_ids:
+                self._append(state, batch_ids, batch_docs, batch_metas, np.vstack(vectors))
+
+    def add(self, ids, embeddings=None, documents=None, metadatas=None):
+        existing = set(self._load().ids)
+        keep = [i for i, doc_id in enumerate(ids) if doc_id not in existing]
+        if len(keep) == len(ids):
+            return self.upsert(ids=ids, embeddings=embeddings, documents=documents, metadatas=metadatas)
+        pick = lambda values: [values[i] for i in keep] if values is not None else None  # noqa: E731
+        if keep:
+            self.upsert(ids=pick(ids), embeddings=pick(embeddings), documents=pick(documents), metadatas=pick(metadatas))
+
+    def update(self, ids, embeddings=None, documents=None, metadatas=None):
+        ann = self._ann()
+        if ann is not None:
+            return ann.update(ids=ids, embeddings=embeddings, documents=documents, metadatas=metadatas)
+        with self._writing() as state:
+            position = self._position(state)
+            rows = [(i, position[doc_id]) for i, doc_id in enumerate(ids) if doc_id in position]
+            if not rows:
+                return
+            self._append(
+                state,
+                [state.ids[row] for _, row in rows],
+                [documents[i] if documents is not None else state.documents[row] for i, row in rows],
+                [{**(state.metadatas[row] or {}), **(metadatas[i] or {})} if metadatas is not None
+                 else state.metadatas[row] for i, row in rows],
+                np.vstack([np.asarray(embeddings[i], dtype=np.float32) if embeddings is not None
+                           else state.matrix([row])[0] for i, row in rows]),
+            )
+
+    def delete(self, ids=None, where=None):
+        ann = self._ann()
+        if ann is not None:
+            return ann.delete(ids=ids, where=where)
+        with self._writing() as state:
+            drop = set(ids or [])
+            doomed = [
+                doc_id for doc_id, metadata in zip(state.ids, state.metadatas)
+                if doc_id in drop or (where and matches(metadata, where))
+            ]
+            if not doomed:
+                return
+            manifest = dict(state.manifest)
+            current = manifest.get("next_seq", 1) - 1
+            manifest["deleted"] = {**manifest.get("deleted", {}), **{doc_id: current for doc_id in doomed}}
+            self._write_manifest(manifest)
+            self._maintain()
+
+    def _rows(self, state, ids=None, where=None):
+        if ids is not None:
+            position = self._position(state)
+            rows = [position[doc_id] for doc_id in ids if doc_id in position]
+        else:
+            rows = range(len(state.ids))
+        if where:
+            rows = [i for i in rows if matches(state.metadatas[i], where)]
+        return list(rows)
+
+    def get(self, ids=None, where=None, limit=None, offset=None, include=("metadatas", "documents")):
+        ann = self._ann()
+        if ann is not None:
+            return ann.get(ids=ids, where=where, limit=limit, offset=offset, include=list(include))
+        state = self._load()
+        rows = self._rows(state, ids, where)[offset or 0:]
+        rows = rows[:limit] if limit is not None else rows
+        embeddings = None
+        if "embeddings" in include:
+            embeddings = state.matrix(rows) if rows else np.zeros((0, 0), dtype=np.float32)
+        return {
+            "ids": [state.ids[i] for i in rows],
+            "documents": [state.documents[i] for i in rows] if "documents" in include else None,
+            "metadatas": [state.metadatas[i] for i in rows] if "metadatas" in include else None,
+            "embeddings": embeddings,
+        }
+
+    def peek(self, limit: int = 10):
+        return self.get(limit=limit, include=["embeddings", "documents", "metadatas"])
+
+    def query(self, query_embeddings, n_results: int = 10, where=None,
+              include=("metadatas", "documents", "distances")):
+        ann = self._ann()
+        if ann is not None:
+            return ann.query(query_embeddings=query_embeddings, n_results=n_results, where=where, include=list(include))
+        state = self._load()
+        rows = self._rows(state, where=where) if where else None
+        matrix = state.matrix(rows)
+        self._client.touch(self, state)
+        candidates = np.arange(len(state.ids)) if rows is None else np.asarray(rows, dtype=np.int64)
+
+        result = {key: [] for key in ("ids", "documents", "metadatas", "distances")}
+        for query in query_embeddings:
+            if not len(candidates):
+                top, distances = np.zeros(0, dtype=np.int64), np.zeros(0)
+            else:
+                distances = _distances(matrix, np.asarray(query, dtype=np.float32), self.space)
+                k = min(n_results, len(distances))
+                top = np.argpartition(distances, k - 1)[:k]
+                top = top[np.argsort(distances[top])]
+            picked = candidates[top]
+            result["ids"].append([state.ids[i] for i in picked])
+            result["documents"].append([state.documents[i] for i in picked])
+            result["metadatas"].append([state.metadatas[i] for i in picked])
+            result["distances"].append([float(d) for d in distances[top]])
+        for key in ("documents", "metadatas", "distances"):
+            if key not in include:
+                result[key] = None
+        return result
+
+    def modify(self, configuration=None, **kwargs):
+        ann = self._ann()
+        if ann is not None:
+            return ann.modify(configuration=configuration, **kwargs)
+        # Exact search has nothing to tune.
+
+
+class CompactClient:
+    """Chroma-client look-alike: ``student_*`` collections are compact, the rest are plain HNSW."""
+
+    def __init__(self, path: str, dtype: str = "float16", promote_at: int = 5000,
+                 max_segments: int = 8, hot_collections: int = 64):
+        self.path = path
+        self.dtype = dtype
+        self.promote_at = promote_at
+        self.max_segments = max_segments
+        self.hot_collections = hot_collections
+        self._collections = {}
+        self._hot = OrderedDict()  # collection name -> state whose float32 view is kept
+        self._lock = threading.Lock()
+        self._ann_client = None
+        os.makedirs(path, exist_ok=True)
+
+    def _ann(self):
+        if self._ann_client is None:
+            import chromadb
+            self._ann_client = chromadb.PersistentClient(path=os.path.join(self.path, ANN_DIR))
+        return self._ann_client
+
+    def ann_collection(self, name: str, space: str):
+        from .vector_store import hnsw_configuration
+        return self._ann().get_or_create_collection(
+            name=name, configuration=hnsw_configuration(space), embedding_function=None,
+        )
+
+    def touch(self, collection, state):
+        """Keep the float32 views of the most recently queried collections only."""
+        with self._lock:
+            self._hot.pop(collection.name, None)
+            self._hot[collection.name] = state
+            while len(self._hot) > self.hot_collections:
+                _name, cold = self._hot.popitem(last=False)
+                cold._matrix = None
+
+    def _exists(self, name: str) -> bool:
+        return os.path.exists(os.path.join(self.path, name, RECORDS_FILE))
+
+    def get_or_create_collection(self, name: str, configuration=None, embedding_function=None, **kwargs):
+        if not name.startswith(COMPACT_PREFIX):
+            return self._ann().get_or_create_collection(
+                name=name, configuration=configuration, embedding_function=embedding_function, **kwargs
+            )
+        space = ((configuration or {}).get("hnsw") or {}).get("space", "l2")
+        with self._lock:
+            collection = self._collections.get(name)
+            if collection is None:
+                collection = CompactCollection(self, name, space)
+                if not self._exists(name):
+                    with collection._writing():
+                        if not self._exists(name):
+                            collection._write_manifest({"segments": [], "deleted": {}, "next_seq": 1})
+                self._collections[name] = collection
+        return collection
+
+    def get_collection(self, name: str, **kwargs):
+        if not name.startswith(COMPACT_PREFIX):
+            return self._ann().get_collection(name=name, **kwargs)
+        if not self._exists(name):
+            raise ValueError(f"Collection {name} does not exist.")
+        return self.get_or_create_collection(name)
+
+    def list_collections(self):
+        names = sorted(n for n in os.listdir(self.path) if n != ANN_DIR and self._exists(n))
+        compact = [self.get_or_create_collection(n) for n in names]
+        if not os.path.isdir(os.path.join(self.path, ANN_DIR)):
+            return compact
+        # Promoted student collections live in both places; list them once.
+        ann = [c for c in self._ann().list_collections() if c.name not in set(names)]
+        return compact + ann
+
+    def delete_collection(self, name: str):
+        if not name.startswith(COMPACT_PREFIX):
+            return self._ann().delete_collection(name)
+        with self._lock:
+            collection = self._collections.pop(name, None) or CompactCollection(self, name)
+            self._hot.pop(name, None)
+        if collection._ann() is not None:
+            self._ann().delete_collection(name)
+        shutil.rmtree(collection.path, ignore_errors=True)
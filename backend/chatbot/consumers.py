@@ -1,30 +1,76 @@
-import json
+import time
 import asyncio
+import contextlib
 import logging
 logging.basicConfig(level=logging.INFO)
 from channels.generic.websocket import AsyncWebsocketConsumer
-from asgiref.sync import sync_to_async
-from .utils import generate_stream_with_context, get_embedding
-from .vector_store import get_student_collection
-from .models import ChatHistory
-from .tts import synthesize_text
-from django.contrib.auth import get_user_model
+from .utils import abuild_prompt, astream_prompt, get_embedding
+from .answer_cache import lookup_answer, replay_chunks, store_answer
+from .persistence import ChatTurn, submit_turn, write_turns
+from .tts import AUDIO_FORMATS, synthesize_text
+from .audio_stream import AudioStreamer
+from .executors import ExecutorSaturated, run_cpu, run_db, run_network, spawn
+from .admission import AdmissionRejected, admit, check_rate, client_address
+from .metrics import gauge, histogram
+from .tracing import stage, traced
+from .wire import PartialCoalescer, WireProtocol, loads
+from .inflight import shared_stream
+
+_active_sockets = gauge("chat_active_sockets", "Open chat WebSocket connections in this process")
+_first_partial_seconds = histogram(
+    "chat_first_partial_seconds", description="Time from admission to the first streamed partial of an answer"
+)
 
 class ChatConsumer(AsyncWebsocketConsumer):
     async def connect(self):
         try:
+            self.wire = WireProtocol.negotiate(self.scope)
+            # Protocol v2+ batches streamed partials into fewer frames (see wire.py).
+            self._coalescer = None
+            if self.wire.coalesce:
+                self._coalescer = PartialCoalescer(
+                    self._send_payload, self.wire.config["COALESCE_MS"], self.wire.config["COALESCE_BYTES"]
+                )
+            if self.scope.get("auth_error"):
+                # Expired or revoked token: accept so the client sees 4401 and can refresh.
+                await self.accept(subprotocol=self.scope.get("auth_subprotocol"))
+                await self.close(code=4401)
+                return
+            # Resolved once per connection (ws_auth.JWTAuthMiddleware); unwrap a LazyObject
+            # left by the session fallback.
             self.user = self.scope.get("user")
-            # Unwrap LazyObject if needed
             if hasattr(self.user, "_wrapped") and hasattr(self.user._wrapped, "id"):
                 self.user = self.user._wrapped
-            await self.accept()
+            self.authenticated = bool(self.user and getattr(self.user, "is_authenticated", False))
+            self.student_id = str(self.user.id) if self.authenticated else "guest"
+            # Answers run as tasks so a disconnect can cancel them mid-stream;
+            # the lock keeps turns on one socket in order.
+            self._answer_tasks = set()
+            self._turn_lock = asyncio.Lock()
+            # Rate limits and concurrency slots are per user; guests are limited per client IP,
+            # so opening more sockets doesn't buy more.
+            if self.authenticated:
+                self._admission_key = f"user:{self.user.id}"
+            else:
+                address = client_address(self.scope) or getattr(self, "channel_name", id(self))
+                self._admission_key = f"guest:{address}"
+            await self.accept(subprotocol=self.scope.get("auth_subprotocol"))
+            _active_sockets.inc()
+            self._counted = True
             logging.info(f"✅ WebSocket connected: {self.user}")
-            await self.send(text_data=json.dumps({"message": "Connected to AI Chatbot!"}))
+            await self.send_frame({"message": "Connected to AI Chatbot!", **self.wire.describe()})
         except Exception as e:
             logging.error(f"❌ Connection error: {e}", exc_info=True)
 
     async def disconnect(self, close_code):
         try:
+            for task in list(getattr(self, "_answer_tasks", ())):
+                task.cancel()
+            if getattr(self, "_coalescer", None) is not None:
+                self._coalescer.cancel()
+            if getattr(self, "_counted", False):
+                self._counted = False
+                _active_sockets.dec()
             logging.info(f"🔌 Disconnected user: {self.scope.get('user')} | Code: {close_code}")
         except Exception as e:
             logging.error(f"⚠️ Error during disconnect: {e}", exc_info=True)
@@ -32,57 +78,174 @@ class ChatConsumer(AsyncWebsocketConsumer):
     async def receive(self, text_data=None, bytes_data=None):
         try:
             if not text_data:
-                await self.send(text_data=json.dumps({"error": "Only JSON text messages are supported."}))
+                await self.send_frame({"error": "Only JSON text messages are supported."})
                 return
 
-            data = json.loads(text_data)
+            data = loads(text_data)
             query = data.get("message", "").strip()
-            want_tts = bool(data.get("tts") or data.get("voice"))
-            from django.contrib.auth import get_user_model
-            User = get_user_model()
+            tts = data.get("tts") or data.get("voice")
+            # "tts": "stream" sends sentence-by-sentence binary audio while the text streams;
+            # any other truthy value keeps the single base64 WAV in the final frame.
+            tts_mode = "stream" if tts == "stream" or data.get("tts_stream") else ("full" if tts else None)
+            audio_encoding = data.get("audio_encoding", "OGG_OPUS")
+            if audio_encoding not in AUDIO_FORMATS:
+                audio_encoding = "OGG_OPUS"
+            if not query:
+                await self.send_frame({"error": "Empty message."})
+                return
 
-            user = self.scope.get("user")
-            if hasattr(user, "_wrapped") and hasattr(user._wrapped, "id"):
-                user = user._wrapped  # unwrap LazyObject
+            try:
+                await check_rate(self._admission_key)
+            except AdmissionRejected as e:
+                await self.send_rejection(e)
+                return
 
-            student_id = str(user.id) if user and getattr(user, "is_authenticated", False) else "guest"
+            # Don't block the receive loop: disconnect must be able to cancel the stream.
+            task = asyncio.create_task(self.answer(query, tts_mode, self.user, self.student_id, audio_encoding))
+            self._answer_tasks.add(task)
+            task.add_done_callback(self._answer_tasks.discard)
 
-            if not query:
-                await self.send(text_data=json.dumps({"error": "Empty message."}))
-                return
+        except Exception as e:
+            logging.error(f"❌ WebSocket internal error: {e}", exc_info=True)
+            await self.send_frame({"error": f"Internal server error: {str(e)}"})
+
+    async def answer(self, query, tts_mode, user, student_id, audio_encoding="OGG_OPUS"):
+        """Wait for earlier turns on this socket and an admission slot (reporting queue position), then stream."""
+        if self._turn_lock.locked():
+            # Behind this socket's own earlier turn(s); admission only reports once we reach the front.
+            await self.send_queue_position(max(1, len(self._answer_tasks) - 1))
+        async with self._turn_lock:
+            try:
+                with stage("chat.turn", tts=tts_mode or "none"):
+                    async with admit(self._admission_key, on_position=self.send_queue_position):
+                        await self.stream_answer(query, tts_mode, user, student_id, audio_encoding)
+            except AdmissionRejected as e:
+                logging.warning(f"🚦 Rejecting message from {self._admission_key}: {e.reason}")
+                await self.send_rejection(e)
+
+    async def send_queue_position(self, position):
+        await self.send_frame({"type": "status", "value": "queued", "position": position})
 
-            await self.send(text_data=json.dumps({"type": "status", "value": "typing"}))
-            logging.info(f"🧠 Generating response for: {query}")
+    async def send_rejection(self, rejection):
+        payload = {"error": rejection.message, "code": rejection.reason}
+        if rejection.retry_after is not None:
+            payload["retry_after"] = rejection.retry_after
+        await self.send_frame(payload)
 
-            chunks, full_answer = await sync_to_async(generate_stream_with_context)(student_id, query, user)
-            for part in chunks:
-                if part.strip():
-                    await self.send(text_data=json.dumps({"type": "partial", "text": part}))
-                    await asyncio.sleep(0)
+    async def _send_payload(self, payload):
+        await self.send(**self.wire.encode(payload))
+
+    async def send_frame(self, payload):
+        """Send one JSON frame in the negotiated encoding, after any buffered partial text."""
+        if self._coalescer is not None:
+            await self._coalescer.flush()
+        await self._send_payload(payload)
+
+    async def send_partial(self, text):
+        if self._turn_started is not None:
+            _first_partial_seconds.observe(time.monotonic() - self._turn_started)
+            self._turn_started = None
+        if self._coalescer is not None:
+            await self._coalescer.add(text)
+        else:
+            await self._send_payload({"type": "partial", "text": text})
+
+    async def stream_answer(self, query, tts_mode, user, student_id, audio_encoding="OGG_OPUS"):
+        """Stream one answer to the socket chunk by chunk, then persist it."""
+        self._turn_started = time.monotonic()
+        if self._coalescer is not None:
+            self._coalescer.reset()
+        full_answer = ""
+        query_embedding = None
+        persisting = False  # set once the turn is handed to persist(); a cancel after that mustn't write it again
+        audio = AudioStreamer(self, audio_encoding) if tts_mode == "stream" else None
+        try:
+            await self.send_frame({"type": "status", "value": "typing"})
+            authenticated = bool(user and getattr(user, "is_authenticated", False))
+            query_embedding = await run_cpu(traced("chat.embed", get_embedding), query)
+            cached = await run_cpu(traced("chat.answer_cache", lookup_answer), student_id, query_embedding, authenticated)
+
+            if cached:
+                logging.info(f"♻️ Answer cache hit ({cached['scope']}, sim={cached['similarity']}) for: {query}")
+                for part in replay_chunks(cached["answer"]):
+                    full_answer += part
+                    await self.send_partial(part)
+                    if audio:
+                        await audio.feed(part)
+            else:
+                logging.info(f"🧠 Generating response for: {query}")
+                started = time.monotonic()
+                prompt, personal = await abuild_prompt(student_id, query, user, query_embedding)
+                # Identical global-context questions in flight share one Gemini stream (inflight.py).
+                stream = shared_stream(query, prompt, personal, astream_prompt)
+                with stage("chat.generate", joined=stream.joined):
+                    async with contextlib.aclosing(stream):
+                        async for part in stream:
+                            full_answer += part
+                            if part.strip():
+                                await self.send_partial(part)
+                            if audio:
+                                await audio.feed(part)
+                generation_seconds = time.monotonic() - started
 
             payload = {"type": "final", "reply": full_answer}
+            if cached:
+                payload["cached"] = True
 
-            if want_tts and full_answer.strip():
+            if tts_mode == "full" and full_answer.strip():
                 try:
-                    audio_b64 = await sync_to_async(synthesize_text)(full_answer)
+                    audio_b64 = await run_network(traced("chat.tts", synthesize_text), full_answer)
                     if audio_b64:
                         payload.update({"audio_b64": audio_b64, "content_type": "audio/wav"})
                 except Exception as e:
                     logging.error(f"🎤 TTS generation failed: {e}")
                     payload["tts_error"] = str(e)
 
-            await self.send(text_data=json.dumps(payload))
-
-            if user and getattr(user, "is_authenticated", False):
-                await sync_to_async(ChatHistory.objects.create)(user=user, question=query, answer=full_answer)
-            student_collection = await sync_to_async(get_student_collection)(student_id)
-            emb = await sync_to_async(get_embedding)(query)
-            await sync_to_async(student_collection.add)(
-                documents=[f"Q: {query}\nA: {full_answer}"],
-                embeddings=[emb],
-                ids=[f"chat_{student_id}"]
-            )
+            await self.send_frame(payload)
+            if audio:
+                await audio.finish()
+            if not cached and stream.should_store():
+                # Off the critical path: the next message on this socket doesn't wait for it.
+                spawn(run_cpu(
+                    store_answer, student_id, query, query_embedding, full_answer,
+                    personal, generation_seconds, authenticated,
+                ))
+            with stage("chat.persist"):
+                persisting = True
+                await self.persist(query, full_answer, user, student_id, query_embedding)
 
+        except asyncio.CancelledError:
+            if audio:
+                audio.cancel()
+            if self._coalescer is not None:
+                self._coalescer.cancel()
+            logging.info(f"🛑 Answer cancelled by disconnect after {len(full_answer)} chars")
+            if full_answer.strip() and not persisting:
+                await self.persist(query, full_answer, user, student_id, query_embedding)
+            raise
+        except ExecutorSaturated as e:
+            if audio:
+                audio.cancel()
+            logging.warning(f"🚦 Rejecting message, {e}")
+            await self.send_frame({"error": "Server is busy, please try again shortly."})
         except Exception as e:
+            if audio:
+                audio.cancel()
             logging.error(f"❌ WebSocket internal error: {e}", exc_info=True)
-            await self.send(text_data=json.dumps({"error": f"Internal server error: {str(e)}"}))
\ No newline at end of file
+            await self.send_frame({"error": f"Internal server error: {str(e)}"})
+
+    async def persist(self, query, full_answer, user, student_id, embedding=None):
+        """Queue the turn for ChatHistory + memory storage without waiting on the writes."""
+        try:
+            turn = ChatTurn(
+                student_id=student_id,
+                question=query,
+                answer=full_answer,
+                user_id=user.id if user and getattr(user, "is_authenticated", False) else None,
+                embedding=embedding,
+            )
+            if not submit_turn(turn):
+                # Queue full or shutting down: write this one directly.
+                await run_db(write_turns, [turn])
+        except Exception as e:
+            logging.error(f"💾 Failed to persist chat turn: {e}", exc_info=True)
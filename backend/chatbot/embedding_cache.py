@@ -0,0 +1,109 @@
+# backend/chatbot/embedding_cache.py
+"""
+Two-tier embedding cache.
+
+Tier 1 is an in-process LRU with a TTL; tier 2 is the ``shared`` Django cache
+(Redis, or on-disk when Redis is unavailable) so other workers and restarts
+benefit too. Keys are the model name plus a SHA-256 of the normalized text.
+"""
+import hashlib
+import logging
+import re
+import threading
+import unicodedata
+from array import array
+
+from cachetools import TTLCache
+from django.conf import settings
+from django.core.cache import caches
+
+from .metrics import counter, gauge, hit_ratio
+
+DEFAULT_CACHE = {
+    "ENABLED": True,
+    "LOCAL_MAXSIZE": 10000,
+    "LOCAL_TTL": 3600,
+    "SHARED_ALIAS": "shared",
+    "SHARED_TTL": 7 * 24 * 3600,
+}
+
+_WHITESPACE = re.compile(r"\s+")
+
+_local_hits = counter("embedding_cache_local_hits_total", "Embeddings served from the in-process cache")
+_shared_hits = counter("embedding_cache_shared_hits_total", "Embeddings served from the shared cache")
+_misses = counter("embedding_cache_misses_total", "Embeddings that had to be computed")
+gauge("embedding_cache_hit_ratio", "Share of embedding lookups served from either cache tier",
+      hit_ratio([_local_hits, _shared_hits], [_misses]))
+
+
+def cache_config() -> dict:
+    config = dict(DEFAULT_CACHE)
+    config.update(getattr(settings, "EMBEDDING_CACHE", {}))
+    return config
+
+
+def normalize_text(text: str) -> str:
+    """Canonical form used both for hashing and for embedding."""
+    return _WHITESPACE.sub(" ", unicodedata.normalize("NFC", text or "")).strip()
+
+
+def cache_key(model_name: str, text: str) -> str:
+    digest = hashlib.sha256(normalize_text(text).encode("utf-8")).hexdigest()
+    return f"emb:{model_name}:{digest}"
+
+
+class EmbeddingCache:
+    def __init__(self, model_name: str, config: dict = None):
+        config = config or cache_config()
+        self.model_name = model_name
+        self.shared_alias = config["SHARED_ALIAS"]
+        self.shared_ttl = config["SHARED_TTL"]
+        self._local = TTLCache(maxsize=config["LOCAL_MAXSIZE"], ttl=config["LOCAL_TTL"])
+        self._lock = threading.Lock()
+
+    def _shared(self):
+        return caches[self.shared_alias] if self.shared_alias else None
+
+    def get_many(self, texts) -> dict:
+        """Return ``{text: vector}`` for every text found in either tier."""
+        keys = {cache_key(self.model_name, t): t for t in texts}
+        found, missing = {}, []
+        with self._lock:
+            for key, text in keys.items():
+                vector = self._local.get(key)
+                if vector is None:
+                    missing.append(key)
+                else:
+                    found[text] = vector
+        _local_hits.inc(len(found))
+
+        shared = self._shared()
+        if missing and shared is not None:
+            try:
+                packed = shared.get_many(missing)
+            except Exception as e:
+                logging.warning(f"⚠️ Shared embedding cache unavailable: {e}")
+                packed = {}
+            with self._lock:
+                for key, blob in packed.items():
+                    vector = array("f", blob).tolist()
+                    self._local[key] = vector
+                    found[keys[key]] = vector
+            _shared_hits.inc(len(packed))
+
+        _misses.inc(len(keys) - len(found))
+        return found
+
+    def set_many(self, mapping: dict):
+        """Store ``{text: vector}`` in both tiers."""
+        if not mapping:
+            return
+        entries = {cache_key(self.model_name, t): v for t, v in mapping.items()}
+        with self._lock:
+            self._local.update(entries)
+        shared = self._shared()
+        if shared is not None:
+            try:
+                shared.set_many({k: array("f", v).tobytes() for k, v in entries.items()}, timeout=self.shared_ttl)
+            except Exception as e:
+                logging.warning(f"⚠️ Could not write shared embedding cache: {e}")
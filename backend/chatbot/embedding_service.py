@@ -0,0 +1,422 @@
+# backend/chatbot/embedding_service.py
+"""
+Micro-batching embedding service.
+
+Concurrent embedding requests are collected into batches (bounded by
+``MAX_BATCH_SIZE`` texts and ``MAX_WAIT_MS``) and the model runs once per
+batch. The batcher runs either in-process or as a sidecar that all workers
+share over a Unix socket (``python manage.py run_embedding_service``), so the
+model is loaded into RAM once per host instead of once per worker.
+
+The model runs on one of ``ENCODER_BACKENDS`` (``EMBEDDING_BACKEND['BACKEND']``):
+"torch" (SentenceTransformer, fp32), "onnx" (ONNX Runtime, fp32) or
+"onnx-int8" (dynamically quantized ONNX), or "fake" for benchmarks. The ONNX backends need neither torch
+nor sentence-transformers. Nothing is loaded until the first embedding or an
+explicit ``warm_up_model()``; ``model_ready()`` backs the readiness endpoint.
+"""
+import asyncio
+import json
+import logging
+import os
+import socket
+import struct
+import threading
+import time
+from concurrent.futures import Future
+
+from django.conf import settings
+
+from .metrics import histogram, metrics_snapshot
+
+EMBEDDING_MODEL_NAME = 'all-mpnet-base-v2'
+EMBEDDING_DIM = 768
+
+DEFAULT_SERVICE = {"SOCKET": "", "MAX_BATCH_SIZE": 32, "MAX_WAIT_MS": 5, "TIMEOUT": 30}
+
+DEFAULT_BACKEND = {
+    "BACKEND": "torch",
+    "REPO": f"sentence-transformers/{EMBEDDING_MODEL_NAME}",
+    "ONNX_FILE": "onnx/model.onnx",
+    "ONNX_INT8_FILE": "onnx/model_qint8_avx512.onnx",
+    "MAX_SEQ_LENGTH": 384,
+    "THREADS": 0,
+    "WARMUP": False,
+    "MIN_COSINE": 0.98,
+}
+
+BATCH_SIZE_BUCKETS = (1, 2, 4, 8, 16, 32, 64, 128)
+WAIT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1.0)
+
+_HEADER = struct.Struct(">I")
+
+_models = {}
+_model_lock = threading.Lock()
+_ready = threading.Event()
+_batcher = None
+_batcher_lock = threading.Lock()
+_client = None
+
+
+def service_config() -> dict:
+    config = dict(DEFAULT_SERVICE)
+    config.update(getattr(settings, "EMBEDDING_SERVICE", {}))
+    return config
+
+
+def backend_config() -> dict:
+    config = dict(DEFAULT_BACKEND)
+    config.update(getattr(settings, "EMBEDDING_BACKEND", {}))
+    return config
+
+
+def embedding_model_id(backend: str = None) -> str:
+    """Model identity for cache keys; int8 vectors differ slightly from fp32 ones."""
+    backend = backend or backend_config()["BACKEND"]
+    if backend == "fake":
+        return f"{EMBEDDING_MODEL_NAME}:fake"
+    return f"{EMBEDDING_MODEL_NAME}:int8" if backend.endswith("int8") else EMBEDDING_MODEL_NAME
+
+
+class TorchEncoder:
+    """SentenceTransformer on PyTorch, fp32."""
+
+    def __init__(self, config):
+        from sentence_transformers import SentenceTransformer
+        self.model = SentenceTransformer(EMBEDDING_MODEL_NAME)
+
+    def encode(self, texts):
+        return self.model.encode(list(texts), batch_size=max(len(texts), 1)).tolist()
+
+
+def _model_file(repo: str, filename: str) -> str:
+    """A local path as-is, otherwise the file from the Hugging Face Hub repo (cached)."""
+    if os.path.exists(filename):
+        return filename
+    from huggingface_hub import hf_hub_download
+    return hf_hub_download(repo_id=repo, filename=filename)
+
+
+class OnnxEncoder:
+    """The same model exported to ONNX: tokenizer + transformer + mean pooling + L2 norm."""
+
+    def __init__(self, config, model_file: str):
+        import onnxruntime
+        from tokenizers import Tokenizer
+
+        options = onnxruntime.SessionOptions()
+        options.graph_optimization_level = onnxruntime.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if config["THREADS"]:
+            options.intra_op_num_threads = int(config["THREADS"])
+        self.session = onnxruntime.InferenceSession(
+            _model_file(config["REPO"], model_file), options, providers=["CPUExecutionProvider"],
+        )
+        self.input_names = {i.name for i in self.session.get_inputs()}
+
+        self.tokenizer = Tokenizer.from_file(_model_file(config["REPO"], "tokenizer.json"))
+        self.tokenizer.enable_truncation(max_length=int(config["MAX_SEQ_LENGTH"]))
+        pad_token = next((t for t in ("<pad>", "[PAD]") if self.tokenizer.token_to_id(t) is not None), None)
+        self.tokenizer.enable_padding(
+            pad_id=self.tokenizer.token_to_id(pad_token) if pad_token else 0, pad_token=pad_token or "[PAD]",
+        )
+
+    def encode(self, texts):
+        import numpy as np
+
+        encodings = self.tokenizer.encode_batch(list(texts))
+        input_ids = np.array([e.ids for e in encodings], dtype=np.int64)
+        attention_mask = np.array([e.attention_mask for e in encodings], dtype=np.int64)
+        feeds = {"input_ids": input_ids, "attention_mask": attention_mask,
+                 "token_type_ids": np.zeros_like(input_ids)}
+        hidden = self.session.run(None, {k: v for k, v in feeds.items() if k in self.input_names})[0]
+
+        mask = attention_mask[..., None].astype(np.float32)
+        pooled = (hidden * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1e-9, None)
+        pooled /= np.clip(np.linalg.norm(pooled, axis=1, keepdims=True), 1e-12, None)
+        return pooled.tolist()
+
+
+# Backend name -> encoder factory; register more here.
+ENCODER_BACKENDS = {
+    "torch": TorchEncoder,
+    "onnx": lambda config: OnnxEncoder(config, config["ONNX_FILE"]),
+    "onnx-int8": lambda config: OnnxEncoder(config, config["ONNX_INT8_FILE"]),
+    "fake": lambda config: _fake_encoder(config),
+}
+
+
+def _fake_encoder(config):
+    """Benchmark stand-in (chatbot/fake_providers.py); not a real model."""
+    from .fake_providers import FakeEncoder
+    return FakeEncoder(config)
+
+
+def get_model(backend: str = None):
+    """Load the encoder for ``backend`` (default: the configured one) on first use."""
+    config = backend_config()
+    backend = backend or config["BACKEND"]
+    model = _models.get(backend)
+    if model is None:
+        with _model_lock:
+            model = _models.get(backend)
+            if model is None:
+                started = time.monotonic()
+                logging.info(f"📦 Loading embedding model {EMBEDDING_MODEL_NAME} ({backend})")
+                model = ENCODER_BACKENDS[backend](config)
+                _models[backend] = model
+                logging.info(f"📦 Embedding model ready in {time.monotonic() - started:.1f}s")
+    return model
+
+
+def encode_batch(texts):
+    """Run the model once over ``texts`` and return a list of vectors."""
+    vectors = get_model().encode(texts)
+    _ready.set()
+    return vectors
+
+
+def warm_up_model():
+    """Load the model and run one tiny batch so the first real request is fast."""
+    try:
+        encode_batch(["warm up"])
+    except Exception as e:
+        logging.error(f"❌ Embedding model warm-up failed: {e}", exc_info=True)
+
+
+def start_model_warmup():
+    """Warm the model on a background thread when EMBEDDING_BACKEND['WARMUP'] is set."""
+    if not backend_config()["WARMUP"] or service_config()["SOCKET"]:
+        return None
+    thread = threading.Thread(target=warm_up_model, name="embedding-warmup", daemon=True)
+    thread.start()
+    return thread
+
+
+def model_ready() -> bool:
+    """True once this process can embed without paying the model load.
+
+    With a sidecar configured, readiness is the sidecar answering.
+    """
+    client = get_client()
+    if client is not None:
+        try:
+            client.stats()
+            return True
+        except (OSError, ConnectionError):
+            return False
+    return _ready.is_set()
+
+
+class _Request:
+    __slots__ = ("texts", "future", "enqueued_at")
+
+    def __init__(self, texts):
+        self.texts = texts
+        self.future = Future()
+        self.enqueued_at = time.monotonic()
+
+
+class MicroBatcher:
+    """Collects concurrent requests and encodes them together on one worker thread."""
+
+    def __init__(self, encode_fn=encode_batch, max_batch_size: int = 32, max_wait_ms: float = 5):
+        self.encode_fn = encode_fn
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000.0
+        self._queue = []
+        self._cond = threading.Condition()
+        self._batch_sizes = histogram(
+            "embedding_batch_size", BATCH_SIZE_BUCKETS, "Texts encoded per model call"
+        )
+        self._queue_wait = histogram(
+            "embedding_queue_wait_seconds", WAIT_BUCKETS, "Time a request waited before its batch ran"
+        )
+        self._thread = threading.Thread(target=self._worker, name="embedding-batcher", daemon=True)
+        self._thread.start()
+
+    def submit(self, texts) -> Future:
+        """Queue ``texts`` for embedding; the future resolves to one vector per text."""
+        request = _Request(list(texts))
+        with self._cond:
+            self._queue.append(request)
+            self._cond.notify()
+        return request.future
+
+    def embed(self, texts, timeout=None):
+        return self.submit(texts).result(timeout=timeout)
+
+    def _take_batch(self):
+        with self._cond:
+            while not self._queue:
+                self._cond.wait()
+            deadline = self._queue[0].enqueued_at + self.max_wait
+            while sum(len(r.texts) for r in self._queue) < self.max_batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self._cond.wait(remaining)
+
+            batch, size = [], 0
+            while self._queue and (not batch or size + len(self._queue[0].texts) <= self.max_batch_size):
+                request = self._queue.pop(0)
+                batch.append(request)
+                size += len(request.texts)
+            return batch
+
+    def _worker(self):
+        while True:
+            # Requests whose caller gave up are dropped here; the rest can no longer be cancelled.
+            batch = [r for r in self._take_batch() if r.future.set_running_or_notify_cancel()]
+            if not batch:
+                continue
+            started = time.monotonic()
+            texts = [t for r in batch for t in r.texts]
+            for r in batch:
+                self._queue_wait.observe(started - r.enqueued_at)
+            self._batch_sizes.observe(len(texts))
+            try:
+                vectors = self.encode_fn(texts) if texts else []
+            except Exception as e:
+                for r in batch:
+                    r.future.set_exception(e)
+                continue
+            offset = 0
+            for r in batch:
+                r.future.set_result(vectors[offset:offset + len(r.texts)])
+                offset += len(r.texts)
+
+
+def get_batcher() -> MicroBatcher:
+    """Return the process-wide in-process batcher."""
+    global _batcher
+    if _batcher is None:
+        with _batcher_lock:
+            if _batcher is None:
+                config = service_config()
+                _batcher = MicroBatcher(
+                    max_batch_size=config["MAX_BATCH_SIZE"], max_wait_ms=config["MAX_WAIT_MS"]
+                )
+    return _batcher
+
+
+# ─── Unix socket sidecar ──────────────────────────────────────────────
+# Frames are a 4-byte big-endian length followed by a JSON body.
+#   request:  {"texts": [...]}  or  {"op": "stats"}
+#   response: {"embeddings": [[...], ...]}  or  {"stats": {...}}  or  {"error": "..."}
+
+async def _read_frame(reader):
+    header = await reader.readexactly(_HEADER.size)
+    (length,) = _HEADER.unpack(header)
+    return json.loads(await reader.readexactly(length))
+
+
+def _encode_frame(obj) -> bytes:
+    body = json.dumps(obj).encode("utf-8")
+    return _HEADER.pack(len(body)) + body
+
+
+async def _handle_connection(reader, writer, batcher):
+    try:
+        while True:
+            try:
+                request = await _read_frame(reader)
+            except asyncio.IncompleteReadError:
+                break
+            if request.get("op") == "stats":
+                response = {"stats": metrics_snapshot("embedding_")}
+            else:
+                try:
+                    vectors = await asyncio.wrap_future(batcher.submit(request.get("texts", [])))
+                    response = {"embeddings": vectors}
+                except Exception as e:
+                    logging.error(f"❌ Embedding batch failed: {e}", exc_info=True)
+                    response = {"error": str(e)}
+            writer.write(_encode_frame(response))
+            await writer.drain()
+    finally:
+        writer.close()
+
+
+async def serve(socket_path: str, batcher: MicroBatcher = None):
+    """Run the embedding sidecar on ``socket_path`` until cancelled."""
+    batcher = batcher or get_batcher()
+    if os.path.exists(socket_path):
+        os.unlink(socket_path)
+    server = await asyncio.start_unix_server(
+        lambda r, w: _handle_connection(r, w, batcher), path=socket_path
+    )
+    os.chmod(socket_path, 0o660)
+    logging.info(f"🧮 Embedding service listening on {socket_path}")
+    async with server:
+        await server.serve_forever()
+
+
+class EmbeddingClient:
+    """Blocking client for the sidecar; keeps one connection per calling thread."""
+
+    def __init__(self, socket_path: str, timeout: float = 30):
+        self.socket_path = socket_path
+        self.timeout = timeout
+        self._local = threading.local()
+
+    def _connection(self):
+        sock = getattr(self._local, "sock", None)
+        if sock is None:
+            sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            sock.settimeout(self.timeout)
+            sock.connect(self.socket_path)
+            self._local.sock = sock
+        return sock
+
+    def _recv_exactly(self, sock, n):
+        buf = bytearray()
+        while len(buf) < n:
+            part = sock.recv(n - len(buf))
+            if not part:
+                raise ConnectionError("embedding service closed the connection")
+            buf.extend(part)
+        return bytes(buf)
+
+    def _call(self, payload: dict) -> dict:
+        sock = self._connection()
+        try:
+            sock.sendall(_encode_frame(payload))
+            (length,) = _HEADER.unpack(self._recv_exactly(sock, _HEADER.size))
+            response = json.loads(self._recv_exactly(sock, length))
+        except Exception:
+            sock.close()
+            self._local.sock = None
+            raise
+        if "error" in response:
+            raise RuntimeError(f"embedding service error: {response['error']}")
+        return response
+
+    def embed(self, texts):
+        return self._call({"texts": list(texts)})["embeddings"]
+
+    def stats(self) -> dict:
+        return self._call({"op": "stats"})["stats"]
+
+
+def get_client():
+    """Return the sidecar client if ``EMBEDDING_SERVICE['SOCKET']`` is configured."""
+    global _client
+    config = service_config()
+    if not config["SOCKET"]:
+        return None
+    if _client is None:
+        _client = EmbeddingClient(config["SOCKET"], timeout=config["TIMEOUT"])
+    return _client
+
+
+def embed_texts(texts):
+    """Embed ``texts`` through the sidecar when configured, else the local batcher."""
+    texts = list(texts)
+    if not texts:
+        return []
+    client = get_client()
+    if client is not None:
+        try:
+            return client.embed(texts)
+        except (OSError, ConnectionError) as e:
+            logging.warning(f"⚠️ Embedding service unavailable, embedding in-process: {e}")
+    return get_batcher().embed(texts, timeout=service_config()["TIMEOUT"])
@@ -0,0 +1,152 @@
+# backend/chatbot/executors.py
+"""
+Bounded thread pools for the blocking parts of the chat pipeline.
+
+Work goes to a dedicated pool instead of the single thread_sensitive
+sync_to_async thread: ``network`` (Gemini, TTS), ``cpu`` (embedding, local
+vector store) and ``db`` (ORM). Sizes and queue limits come from
+``settings.CHAT_EXECUTORS``.
+"""
+import asyncio
+import contextvars
+import functools
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import close_old_connections
+
+from .metrics import gauge
+
+DEFAULT_EXECUTORS = {
+    "network": {"max_workers": 32, "max_queue": 256},
+    "cpu": {"max_workers": 4, "max_queue": 128},
+    "db": {"max_workers": 8, "max_queue": 256},
+}
+
+_executors = {}
+_executors_lock = threading.Lock()
+
+# Fire-and-forget tasks, referenced here so they aren't garbage collected mid-flight.
+_background_tasks = set()
+
+
+class ExecutorSaturated(Exception):
+    """Raised when a pool already holds its maximum number of queued jobs."""
+
+
+class BoundedExecutor:
+    """A ThreadPoolExecutor that rejects work beyond ``max_workers + max_queue``."""
+
+    def __init__(self, name: str, max_workers: int, max_queue: int):
+        self.name = name
+        self.max_workers = max_workers
+        self.max_queue = max_queue
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix=f"chat-{name}")
+        self._lock = threading.Lock()
+        self._pending = 0
+
+    @property
+    def pending(self) -> int:
+        """Jobs submitted and not yet finished (running + queued)."""
+        return self._pending
+
+    @property
+    def queue_depth(self) -> int:
+        """Jobs waiting for a free worker."""
+        return max(0, self._pending - self.max_workers)
+
+    def _release(self, _future):
+        with self._lock:
+            self._pending -= 1
+
+    async def run(self, func, *args, **kwargs):
+        """Run ``func`` on this pool and await its result."""
+        with self._lock:
+            if self._pending >= self.max_workers + self.max_queue:
+                raise ExecutorSaturated(f"{self.name} executor is saturated ({self._pending} pending)")
+            self._pending += 1
+
+        # Carry contextvars over like sync_to_async does.
+        ctx = contextvars.copy_context()
+        call = functools.partial(ctx.run, func, *args, **kwargs)
+        try:
+            future = self._executor.submit(call)
+        except Exception:
+            self._release(None)
+            raise
+        # Release on completion of the thread, not of the awaiting coroutine,
+        # so cancelled callers still count until their job actually stops.
+        future.add_done_callback(self._release)
+        return await asyncio.wrap_future(future)
+
+    def shutdown(self, wait: bool = True):
+        self._executor.shutdown(wait=wait)
+
+
+def _db_call(func, *args, **kwargs):
+    """Run a job that may touch the ORM with fresh connection handling, as Django does per request."""
+    close_old_connections()
+    try:
+        return func(*args, **kwargs)
+    finally:
+        close_old_connections()
+
+
+def get_executor(name: str) -> BoundedExecutor:
+    """Return (creating on first use) the named pool configured in settings."""
+    executor = _executors.get(name)
+    if executor is None:
+        with _executors_lock:
+            executor = _executors.get(name)
+            if executor is None:
+                config = dict(DEFAULT_EXECUTORS[name])
+                config.update(getattr(settings, "CHAT_EXECUTORS", {}).get(name, {}))
+                executor = BoundedExecutor(name, config["max_workers"], config["max_queue"])
+                _executors[name] = executor
+                logging.info(
+                    f"🧵 {name} executor: {executor.max_workers} workers, queue limit {executor.max_queue}"
+                )
+    return executor
+
+
+async def run_network(func, *args, **kwargs):
+    """Run a blocking remote call (Gemini, TTS) on the network pool."""
+    return await get_executor("network").run(func, *args, **kwargs)
+
+
+async def run_cpu(func, *args, **kwargs):
+    """Run embedding / vector-store work on the CPU pool.
+
+    Retrieval jobs here also read the ORM (index version, lexical refresh), so
+    connections get the same per-job cleanup as ``run_db``.
+    """
+    return await get_executor("cpu").run(_db_call, func, *args, **kwargs)
+
+
+async def run_db(func, *args, **kwargs):
+    """Run ORM work on the DB pool."""
+    return await get_executor("db").run(_db_call, func, *args, **kwargs)
+
+
+def _log_task_error(task):
+    _background_tasks.discard(task)
+    if not task.cancelled() and task.exception() is not None:
+        logging.error(f"⚠️ Background task failed: {task.exception()}")
+
+
+def spawn(coro):
+    """Run ``coro`` as a background task that is kept alive until it finishes."""
+    task = asyncio.ensure_future(coro)
+    _background_tasks.add(task)
+    task.add_done_callback(_log_task_error)
+    return task
+
+
+def _queue_depth(name):
+    return lambda: _executors[name].queue_depth if name in _executors else 0
+
+
+for _name in DEFAULT_EXECUTORS:
+    gauge(f"executor_{_name}_queue_depth", f"Jobs waiting for a {_name} worker", _queue_depth(_name))
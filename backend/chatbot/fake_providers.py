@@ -0,0 +1,168 @@
+# backend/chatbot/fake_providers.py
+"""
+Local stand-ins for Gemini, Google TTS and the embedding model, for offline
+benchmarks and load tests (``manage.py loadtest``).
+
+Latency is simulated with sleeps taken from ``settings.FAKE_PROVIDERS``:
+Gemini answers ``ANSWER_TOKENS`` tokens after ``FIRST_TOKEN_MS`` at
+``TOKENS_PER_SECOND``, in chunks of ``CHUNK_TOKENS``; TTS takes
+``TTS_LATENCY_MS`` plus ``TTS_MS_PER_CHAR``; the "fake" embedding backend takes
+``EMBEDDING_MS_PER_TEXT`` and returns deterministic unit vectors per text.
+
+``install_fake_providers()`` swaps them in for the whole process; it runs at
+start-up when ``FAKE_PROVIDERS['ENABLED']`` is set. Never enable it in production.
+"""
+import asyncio
+import hashlib
+import io
+import logging
+import time
+import types
+import wave
+
+from django.conf import settings
+
+DEFAULT_FAKES = {
+    "ENABLED": False,
+    "FIRST_TOKEN_MS": 400,
+    "TOKENS_PER_SECOND": 80,
+    "CHUNK_TOKENS": 8,
+    "ANSWER_TOKENS": 120,
+    "TTS_LATENCY_MS": 150,
+    "TTS_MS_PER_CHAR": 0.5,
+    "EMBEDDING_MS_PER_TEXT": 2,
+}
+
+_WORDS = (
+    "the derivative measures how a function changes as its input changes and "
+    "integration accumulates those changes over an interval so both ideas meet "
+    "in the fundamental theorem of calculus which links slopes to areas"
+).split()
+
+
+def fakes_config() -> dict:
+    config = dict(DEFAULT_FAKES)
+    config.update(getattr(settings, "FAKE_PROVIDERS", {}))
+    return config
+
+
+def _answer_chunks(prompt: str, config: dict):
+    """Deterministic answer text for ``prompt``, split into streamed chunks."""
+    offset = int(hashlib.sha256(prompt.encode("utf-8")).hexdigest()[:8], 16)
+    words = []
+    for i in range(int(config["ANSWER_TOKENS"])):
+        word = _WORDS[(offset + i) % len(_WORDS)]
+        words.append(word + ("." if i % 12 == 11 else ""))
+    size = max(1, int(config["CHUNK_TOKENS"]))
+    return [" ".join(words[i:i + size]) + " " for i in range(0, len(words), size)]
+
+
+def _prompt_text(contents) -> str:
+    if isinstance(contents, str):
+        return contents
+    return " ".join(part.get("text", "") for message in contents for part in message.get("parts", ()))
+
+
+def _delays(config: dict):
+    """(seconds before the first chunk, seconds between chunks)."""
+    return config["FIRST_TOKEN_MS"] / 1000, config["CHUNK_TOKENS"] / max(config["TOKENS_PER_SECOND"], 1e-9)
+
+
+class _FakeModels:
+    """Synchronous ``client.models``."""
+
+    def generate_content_stream(self, model, contents, config=None):
+        settings_ = fakes_config()
+        first, between = _delays(settings_)
+        for i, text in enumerate(_answer_chunks(_prompt_text(contents), settings_)):
+            time.sleep(first if i == 0 else between)
+            yield types.SimpleNamespace(text=text)
+
+    def generate_content(self, model, contents, config=None):
+        return types.SimpleNamespace(text="".join(self.generate_content_stream(model, contents, config)).strip())
+
+
+class _FakeStream:
+    def __init__(self, chunks, first, between):
+        self._chunks = iter(chunks)
+        self._first = True
+        self._delays = (first, between)
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        try:
+            text = next(self._chunks)
+        except StopIteration:
+            raise StopAsyncIteration
+        await asyncio.sleep(self._delays[0] if self._first else self._delays[1])
+        self._first = False
+        return types.SimpleNamespace(text=text)
+
+    async def aclose(self):
+        self._chunks = iter(())
+
+
+class _FakeAsyncModels:
+    """Asynchronous ``client.aio.models``."""
+
+    async def generate_content_stream(self, model, contents, config=None):
+        settings_ = fakes_config()
+        return _FakeStream(_answer_chunks(_prompt_text(contents), settings_), *_delays(settings_))
+
+    async def generate_content(self, model, contents, config=None):
+        text = "".join([chunk.text async for chunk in await self.generate_content_stream(model, contents, config)])
+        return types.SimpleNamespace(text=text.strip())
+
+
+class FakeGeminiClient:
+    """Drop-in for ``genai.Client`` covering the calls the chatbot makes."""
+
+    def __init__(self):
+        self.models = _FakeModels()
+        self.aio = types.SimpleNamespace(models=_FakeAsyncModels())
+
+
+def fake_synthesize(text: str, encoding: str) -> bytes:
+    """Stand-in for the Google TTS round trip: a short silent clip after a simulated delay."""
+    config = fakes_config()
+    time.sleep((config["TTS_LATENCY_MS"] + config["TTS_MS_PER_CHAR"] * len(text)) / 1000)
+    if encoding != "LINEAR16":
+        return b"FAKE" + hashlib.sha256(f"{encoding}:{text}".encode("utf-8")).digest()
+    buffer = io.BytesIO()
+    with wave.open(buffer, "wb") as wav:
+        wav.setnchannels(1)
+        wav.setsampwidth(2)
+        wav.setframerate(16000)
+        wav.writeframes(b"\x00\x00" * 1600)
+    return buffer.getvalue()
+
+
+class FakeEncoder:
+    """Deterministic pseudo-embeddings: same text, same unit vector."""
+
+    def __init__(self, config):
+        from .embedding_service import EMBEDDING_DIM
+        self.dim = EMBEDDING_DIM
+
+    def _vector(self, text: str):
+        import numpy as np
+
+        seed = int.from_bytes(hashlib.sha256(text.encode("utf-8")).digest()[:8], "big")
+        vector = np.random.default_rng(seed).standard_normal(self.dim)
+        return (vector / np.linalg.norm(vector)).tolist()
+
+    def encode(self, texts):
+        time.sleep(fakes_config()["EMBEDDING_MS_PER_TEXT"] * len(texts) / 1000)
+        return [self._vector(text) for text in texts]
+
+
+def install_fake_providers():
+    """Route Gemini, TTS and embeddings in this process to the fakes above."""
+    from . import tts, utils
+
+    utils.client = FakeGeminiClient()
+    tts._synthesize_remote = fake_synthesize
+    settings.EMBEDDING_BACKEND = {**getattr(settings, "EMBEDDING_BACKEND", {}), "BACKEND": "fake"}
+    logging.warning("🧪 Fake Gemini, TTS and embedding providers installed (benchmark mode)")
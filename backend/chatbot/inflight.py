@@ -0,0 +1,168 @@
+# backend/chatbot/inflight.py
+"""
+Single-flight coalescing of identical in-flight questions.
+
+Right after an assignment is posted, many students ask the same question
+within seconds. Turns whose prompt uses global context only (``personal`` is
+False in ``abuild_prompt``: no student documents, no chat history) and whose
+normalized question and retrieved context match share one Gemini stream.
+The first turn starts a ``Flight``; later ones subscribe to it, get the
+chunks produced so far replayed, then follow it live.
+
+A flight's generation runs in its own task, so it outlives the socket that
+started it; it is cancelled once every subscriber has left. A finished
+flight lingers for ``LINGER_SECONDS`` so turns arriving before its answer
+reaches the semantic cache (answer_cache.py) still join it. Flights are
+per process.
+"""
+import asyncio
+import hashlib
+import logging
+import re
+import time
+
+from django.conf import settings
+
+from .metrics import counter, gauge
+from .prompting import prompt_context
+
+DEFAULT_COALESCING = {
+    "ENABLED": True,
+    "LINGER_SECONDS": 5,
+    "MAX_SUBSCRIBERS": 1000,
+}
+
+_WHITESPACE = re.compile(r"\s+")
+
+_flights = {}
+
+_generations = counter("chat_coalesced_generations_total", "Shareable Gemini generations started")
+_joined = counter("chat_coalesced_joins_total", "Turns answered by joining an in-flight generation")
+gauge("chat_inflight_generations", "Shareable generations running or lingering", lambda: len(_flights))
+
+
+def coalescing_config() -> dict:
+    config = dict(DEFAULT_COALESCING)
+    config.update(getattr(settings, "CHAT_COALESCING", {}))
+    return config
+
+
+def normalize_question(query: str) -> str:
+    """Case, spacing and trailing punctuation don't make a different question."""
+    return _WHITESPACE.sub(" ", query).strip().casefold().rstrip("?!. ")
+
+
+def flight_key(query: str, prompt: str) -> str:
+    text = normalize_question(query) + "\0" + prompt_context(prompt)
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+class Flight:
+    """One generation and the buffered chunks every subscriber replays."""
+
+    def __init__(self, key: str, source):
+        self.key = key
+        self.chunks = []
+        self.done = False
+        self.error = None
+        self.subscribers = 0
+        self.started = time.monotonic()
+        self.seconds = None
+        self._claimed = False
+        self._more = asyncio.Event()
+        self._loop = asyncio.get_running_loop()
+        self._task = asyncio.ensure_future(self._run(source))
+
+    async def _run(self, source):
+        try:
+            async for text in source:
+                self.chunks.append(text)
+                self._wake()
+        except asyncio.CancelledError:
+            self.error = asyncio.CancelledError()
+            raise
+        except Exception as e:
+            self.error = e
+        finally:
+            self.done = True
+            self.seconds = time.monotonic() - self.started
+            self._wake()
+            if self.error is None:
+                self._loop.call_later(coalescing_config()["LINGER_SECONDS"], self._forget)
+            else:
+                self._forget()
+
+    def _wake(self):
+        event, self._more = self._more, asyncio.Event()
+        event.set()
+
+    def _forget(self):
+        if _flights.get(self.key) is self:
+            del _flights[self.key]
+
+    async def subscribe(self):
+        """Yield every chunk from the first, then live ones until the generation ends."""
+        self.subscribers += 1
+        try:
+            index = 0
+            while True:
+                if index < len(self.chunks):
+                    index += 1
+                    yield self.chunks[index - 1]
+                elif self.error is not None:
+                    raise self.error
+                elif self.done:
+                    return
+                else:
+                    await self._more.wait()
+        finally:
+            self.subscribers -= 1
+            if self.subscribers == 0 and not self.done:
+                logging.info("🛑 Every subscriber left, cancelling shared generation")
+                self._forget()
+                self._task.cancel()
+
+    def claim(self) -> bool:
+        """True for the one caller that should cache the answer."""
+        claimed, self._claimed = self._claimed, True
+        return not claimed
+
+
+class SharedStream:
+    """A turn's view of its answer: its own stream, or a subscription to a shared flight."""
+
+    def __init__(self, source, flight: Flight = None, joined: bool = False):
+        self._source = source
+        self.flight = flight
+        self.joined = joined
+
+    def __aiter__(self):
+        return self._source.__aiter__()
+
+    async def aclose(self):
+        """Leave promptly (e.g. on disconnect) instead of when the generator is collected."""
+        await self._source.aclose()
+
+    def should_store(self) -> bool:
+        """Only one turn per flight writes the answer to the semantic cache."""
+        return self.flight is None or self.flight.claim()
+
+
+def shared_stream(query: str, prompt: str, personal: bool, generate) -> SharedStream:
+    """Stream ``generate(prompt)``, sharing it with identical global-context turns in flight."""
+    config = coalescing_config()
+    if personal or not config["ENABLED"]:
+        return SharedStream(generate(prompt))
+
+    key = flight_key(query, prompt)
+    flight = _flights.get(key)
+    if flight is not None and flight._loop is asyncio.get_running_loop() \
+            and flight.subscribers < config["MAX_SUBSCRIBERS"]:
+        _joined.inc()
+        logging.info(f"🔗 Joining in-flight answer ({len(flight.chunks)} chunks buffered) for: {query}")
+        return SharedStream(flight.subscribe(), flight, joined=True)
+
+    _generations.inc()
+    flight = Flight(key, generate(prompt))
+    _flights[key] = flight
+    return SharedStream(flight.subscribe(), flight)
@@ -0,0 +1,297 @@
+# backend/chatbot/lexical_index.py
+"""
+In-process BM25 index over resource chunks, the lexical half of hybrid retrieval.
+
+Built from ``ResourceChunk.text`` on a background thread (at server start via
+``start_lexical_warmup``, or on first use) and kept current incrementally: when
+the resource index version (bumped by every ingest, edit and delete) changes,
+only chunk rows written since the last refresh are tokenized and only
+``ResourceChunkChange`` rows (deletions, owner moves) logged since then are
+replayed, so a refresh costs O(changes), not O(corpus). Requests never wait for
+a build; until the first one finishes they search an empty index.
+
+"Since" is by ``IndexVersion.sequence``, not by primary key: writers stamp rows
+with a sequence number claimed under a row lock held until they commit, so
+sequences become visible in order. Chunk ids from two concurrent ingests can
+commit out of pk order; sequences can't.
+
+Every ``LEXICAL_REBUILD_SECONDS`` the index is rebuilt in the background and
+swapped in, which also drops rows removed by bulk deletes that bypass the
+change log, and change rows older than ``CHANGE_RETENTION`` are pruned. Each
+worker process holds its own copy.
+"""
+import datetime
+import heapq
+import logging
+import math
+import re
+import threading
+import time
+from collections import Counter as TermCounts
+
+from django.db import close_old_connections
+from django.utils import timezone
+
+from .metrics import histogram
+from .vector_store import index_version
+
+# Words plus codes/formulas such as "cs-101", "c++", "h2o" or "e=mc2"-style fragments.
+_TOKEN = re.compile(r"[a-z0-9]+(?:[.+#/=-]+[a-z0-9]+)*\+*")
+_PARTS = re.compile(r"[a-z]+|[0-9]+")
+
+STOPWORDS = frozenset(
+    "a an and are as at be by can do does for from how i in is it me my of on or "
+    "that the this to was what when where which who why will with you".split()
+)
+
+_refresh_seconds = histogram("lexical_index_refresh_seconds", description="Time to refresh the BM25 index")
+
+CHANGE_RETENTION = datetime.timedelta(days=1)
+
+_index = None
+_index_lock = threading.Lock()
+
+
+def tokenize(text: str):
+    """Lowercased terms; compound tokens like ``CS101`` also yield ``cs`` and ``101``."""
+    terms = []
+    for token in _TOKEN.findall((text or "").lower()):
+        if token in STOPWORDS:
+            continue
+        terms.append(token)
+        parts = _PARTS.findall(token)
+        if len(parts) > 1 or (parts and parts[0] != token):
+            terms.extend(p for p in parts if p not in STOPWORDS)
+    return terms
+
+
+class _Postings:
+    """The BM25 structures, built off to the side during a full rebuild and then swapped in."""
+
+    def __init__(self):
+        self.postings = {}     # term -> {chunk pk: term frequency}
+        self.docs = {}         # chunk pk -> (text, owner id, length, terms, resource id)
+        self.by_resource = {}  # resource id -> {chunk pk}
+        self.total_length = 0
+
+    def add(self, pk, text, owner, resource_id, counts):
+        if pk in self.docs:
+            return
+        for term, tf in counts.items():
+            self.postings.setdefault(term, {})[pk] = tf
+        length = sum(counts.values())
+        self.docs[pk] = (text, owner, length, tuple(counts), resource_id)
+        self.by_resource.setdefault(resource_id, set()).add(pk)
+        self.total_length += length
+
+    def remove(self, pk):
+        entry = self.docs.pop(pk, None)
+        if entry is None:
+            return
+        _text, _owner, length, terms, resource_id = entry
+        for term in terms:
+            posting = self.postings.get(term)
+            if posting is not None:
+                posting.pop(pk, None)
+                if not posting:
+                    del self.postings[term]
+        pks = self.by_resource.get(resource_id)
+        if pks is not None:
+            pks.discard(pk)
+            if not pks:
+                del self.by_resource[resource_id]
+        self.total_length -= length
+
+    def apply(self, change):
+        from .models import ResourceChunkChange
+
+        kind, resource_id, chunk_id, owner_id = change
+        if kind == ResourceChunkChange.KIND_CHUNK_DELETED:
+            self.remove(chunk_id)
+        elif kind == ResourceChunkChange.KIND_RESOURCE_DELETED:
+            for pk in list(self.by_resource.get(resource_id, ())):
+                self.remove(pk)
+        elif kind == ResourceChunkChange.KIND_OWNER_CHANGED:
+            for pk in self.by_resource.get(resource_id, ()):
+                text, _owner, length, terms, _ = self.docs[pk]
+                self.docs[pk] = (text, owner_id, length, terms, resource_id)
+
+
+def _new_rows(after: int, upto: int):
+    """Chunk rows written with a sequence in ``(after, upto]``."""
+    from .models import ResourceChunk
+
+    return [
+        (pk, text, owner, resource_id, TermCounts(tokenize(text)))
+        for pk, text, owner, resource_id in ResourceChunk.objects
+        .filter(sequence__gt=after, sequence__lte=upto).exclude(text="")
+        .values_list("pk", "text", "resource__owner_id", "resource_id").order_by("pk").iterator(chunk_size=2000)
+    ]
+
+
+def _changes_since(after: int, upto: int):
+    from .models import ResourceChunkChange
+
+    return list(
+        ResourceChunkChange.objects.filter(sequence__gt=after, sequence__lte=upto).order_by("sequence", "pk")
+        .values_list("kind", "resource_id", "chunk_id", "owner_id")
+    )
+
+
+def _committed_sequence() -> int:
+    from .models import IndexVersion
+
+    return IndexVersion.committed_sequence()
+
+
+class LexicalIndex:
+    def __init__(self, k1: float = 1.2, b: float = 0.75, refresh_interval: float = 1.0,
+                 rebuild_interval: float = 3600.0):
+        self.k1 = k1
+        self.b = b
+        self.refresh_interval = refresh_interval
+        self.rebuild_interval = rebuild_interval
+        self.version = None
+        self._data = _Postings()
+        self._sequence = 0  # every row and change stamped up to here is applied
+        self._built_at = None
+        self._building = False
+        self._checked_at = 0.0
+        self._lock = threading.Lock()          # guards self._data
+        self._refresh_lock = threading.Lock()  # one refresh or build at a time
+
+    def __len__(self):
+        return len(self._data.docs)
+
+    def build(self, version=None):
+        """Full rebuild from ResourceChunk rows, swapped in when done; searches keep running meanwhile."""
+        from .models import ResourceChunkChange
+
+        started = time.monotonic()
+        sequence = _committed_sequence()  # read first: later writes are picked up by the refresh below
+        data = _Postings()
+        for pk, text, owner, resource_id, counts in _new_rows(-1, sequence):
+            data.add(pk, text, owner, resource_id, counts)
+        with self._lock:
+            self._data = data
+            self._sequence = sequence
+            self._built_at = time.monotonic()
+        self.refresh(version)
+        ResourceChunkChange.objects.filter(created_at__lt=timezone.now() - CHANGE_RETENTION).delete()
+        logging.info(f"🔤 Lexical index built: {len(data.docs)} chunks in {time.monotonic() - started:.2f}s")
+
+    def refresh(self, version=None):
+        """Apply chunk rows written and changes logged since the last refresh."""
+        started = time.monotonic()
+        # Everything stamped up to the committed sequence is visible; later stamps wait for the next refresh.
+        upto = _committed_sequence()
+        changes = _changes_since(self._sequence, upto)
+        new_rows = _new_rows(self._sequence, upto)
+        with self._lock:
+            data = self._data
+            # Rows first: a chunk can only be deleted, or moved, after it was written.
+            for pk, text, owner, resource_id, counts in new_rows:
+                data.add(pk, text, owner, resource_id, counts)
+            for change in changes:
+                data.apply(change)
+            self._sequence = max(self._sequence, upto)
+            self.version = version
+        _refresh_seconds.observe(time.monotonic() - started)
+        logging.debug(f"🔤 Lexical index refreshed: {len(new_rows)} new chunks, {len(changes)} changes")
+
+    def start_build(self):
+        """Build (or rebuild) on a daemon thread unless one is already running."""
+        with self._lock:
+            if self._building:
+                return None
+            self._building = True
+
+        def run():
+            try:
+                with self._refresh_lock:
+                    self.build(index_version())
+            except Exception as e:
+                logging.error(f"❌ Lexical index build failed: {e}", exc_info=True)
+            finally:
+                self._building = False
+                close_old_connections()
+
+        thread = threading.Thread(target=run, name="lexical-index-build", daemon=True)
+        thread.start()
+        return thread
+
+    def maybe_refresh(self):
+        """Refresh when the index version moved (checked at most every ``refresh_interval``).
+
+        Never builds on the caller's thread: a missing or due full build is started in the background.
+        """
+        now = time.monotonic()
+        if self._built_at is None or now - self._built_at > self.rebuild_interval:
+            self.start_build()
+            if self._built_at is None:
+                return
+        if now - self._checked_at < self.refresh_interval:
+            return
+        self._checked_at = now
+        version = index_version()
+        if version == self.version or not self._refresh_lock.acquire(blocking=False):
+            return  # current, or another thread is refreshing: search what we have
+        try:
+            self.refresh(version)
+        finally:
+            self._refresh_lock.release()
+            close_old_connections()
+
+    def search(self, query: str, k: int = 10, student_id=None):
+        """Return up to ``k`` ``(document, personal)`` pairs ranked by BM25."""
+        terms = set(tokenize(query))
+        student_id = str(student_id) if student_id is not None else None
+        with self._lock:
+            data = self._data
+            n = len(data.docs)
+            if not n or not terms:
+                return []
+            avg_length = data.total_length / n or 1.0
+            scores = {}
+            for term in terms:
+                posting = data.postings.get(term)
+                if not posting:
+                    continue
+                idf = math.log(1 + (n - len(posting) + 0.5) / (len(posting) + 0.5))
+                for pk, tf in posting.items():
+                    norm = self.k1 * (1 - self.b + self.b * data.docs[pk][2] / avg_length)
+                    scores[pk] = scores.get(pk, 0.0) + idf * tf * (self.k1 + 1) / (tf + norm)
+            best = heapq.nlargest(k, scores.items(), key=lambda item: item[1])
+            return [
+                (data.docs[pk][0], student_id is not None and str(data.docs[pk][1]) == student_id)
+                for pk, _ in best
+            ]
+
+
+def get_lexical_index() -> LexicalIndex:
+    global _index
+    if _index is None:
+        with _index_lock:
+            if _index is None:
+                from .retrieval import retrieval_config
+
+                config = retrieval_config()
+                _index = LexicalIndex(config["BM25_K1"], config["BM25_B"], config["LEXICAL_REFRESH_INTERVAL"],
+                                      config["LEXICAL_REBUILD_SECONDS"])
+    return _index
+
+
+def lexical_search(student_id: str, query: str, k: int = 10):
+    """BM25 search over resource chunks, refreshing the index first if it is stale."""
+    index = get_lexical_index()
+    index.maybe_refresh()
+    return index.search(query, k, student_id)
+
+
+def start_lexical_warmup():
+    """Build the BM25 index in the background at server start, in hybrid mode."""
+    from .retrieval import hybrid_enabled
+
+    if not hybrid_enabled():
+        return None
+    return get_lexical_index().start_build()
@@ -0,0 +1,35 @@
+# backend/chatbot/management/commands/archive_chat_history.py
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from chatbot.archival import archive_config, archive_old_history
+from chatbot.models import ChatHistory
+
+
+class Command(BaseCommand):
+    help = "Move ChatHistory rows older than the retention period into compressed archive files."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--older-than-days", type=int, help="Retention in days (default: CHAT_ARCHIVE['RETENTION_DAYS']).")
+        parser.add_argument("--batch-size", type=int, help="Rows per archive file (default: CHAT_ARCHIVE['BATCH_SIZE']).")
+        parser.add_argument("--max-batches", type=int, help="Stop after this many batches.")
+        parser.add_argument("--dry-run", action="store_true", help="Only report how many rows would be archived.")
+
+    def handle(self, *args, **options):
+        config = archive_config()
+        days = options["older_than_days"] if options["older_than_days"] is not None else config["RETENTION_DAYS"]
+        if options["dry_run"]:
+            cutoff = timezone.now() - timedelta(days=days)
+            pending = ChatHistory.objects.filter(created_at__lt=cutoff).count()
+            self.stdout.write(f"{pending} chat history rows older than {days} days would be archived to {config['DIR']}")
+            return
+
+        total = archive_old_history(
+            retention_days=days,
+            batch_size=options["batch_size"],
+            max_batches=options["max_batches"],
+            progress=lambda done: self.stdout.write(f"  archived {done} rows"),
+        )
+        self.stdout.write(self.style.SUCCESS(f"Archived {total} chat history rows older than {days} days"))
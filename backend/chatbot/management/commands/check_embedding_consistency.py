@@ -0,0 +1,62 @@
+# backend/chatbot/management/commands/check_embedding_consistency.py
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from chatbot.embedding_service import ENCODER_BACKENDS, backend_config, get_model
+from chatbot.models import ResourceChunk
+
+SAMPLE_TEXTS = [
+    "What topics does the linear algebra midterm cover?",
+    "Explain the difference between a process and a thread.",
+    "CS101 assignment 3 is due on Friday at noon.",
+    "Photosynthesis converts light energy into chemical energy.",
+    "How do I compute the eigenvalues of a 2x2 matrix?",
+    "The French Revolution began in 1789.",
+]
+
+
+def _cosine(a, b):
+    dot = sum(x * y for x, y in zip(a, b))
+    norm = (sum(x * x for x in a) ** 0.5) * (sum(y * y for y in b) ** 0.5)
+    return dot / norm if norm else 0.0
+
+
+class Command(BaseCommand):
+    help = "Check that an embedding backend (e.g. onnx-int8) stays within tolerance of the fp32 reference."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--backend", help="Backend to check (defaults to EMBEDDING_BACKEND['BACKEND']).")
+        parser.add_argument("--reference", default="torch", help="Reference backend (default: torch fp32).")
+        parser.add_argument("--samples", type=int, default=200, help="Resource chunks to sample in addition to built-in texts.")
+        parser.add_argument("--min-cosine", type=float, help="Fail below this cosine similarity (default: EMBEDDING_BACKEND['MIN_COSINE']).")
+
+    def handle(self, *args, **options):
+        config = backend_config()
+        backend = options["backend"] or config["BACKEND"]
+        reference = options["reference"]
+        min_cosine = options["min_cosine"] if options["min_cosine"] is not None else config["MIN_COSINE"]
+        for name in (backend, reference):
+            if name not in ENCODER_BACKENDS:
+                raise CommandError(f"Unknown backend {name!r}; choose from {', '.join(ENCODER_BACKENDS)}.")
+
+        texts = SAMPLE_TEXTS + list(
+            ResourceChunk.objects.exclude(text="").order_by("?").values_list("text", flat=True)[:options["samples"]]
+        )
+
+        results = {}
+        for name in (reference, backend):
+            model = get_model(name)
+            model.encode(texts[:1])  # exclude one-off graph set-up from the timing
+            started = time.monotonic()
+            results[name] = model.encode(texts)
+            elapsed = time.monotonic() - started
+            self.stdout.write(f"  {name}: {len(texts)} texts in {elapsed:.2f}s ({len(texts) / elapsed:.1f} texts/s)")
+
+        similarities = [_cosine(a, b) for a, b in zip(results[reference], results[backend])]
+        worst = min(similarities)
+        summary = (f"{backend} vs {reference}: min cosine {worst:.4f}, "
+                   f"mean {sum(similarities) / len(similarities):.4f} over {len(texts)} texts")
+        if worst < min_cosine:
+            raise CommandError(f"{summary} (below {min_cosine})")
+        self.stdout.write(self.style.SUCCESS(summary))
@@ -0,0 +1,302 @@
+# backend/chatbot/management/commands/loadtest.py
+"""
+In-process load test and benchmark.
+
+Ingests ``--resources`` documents through ``IngestResourceView``, measures
+retrieval latency, then opens ``--sockets`` concurrent ``ws/chat/`` sockets,
+each sending ``--messages`` questions one after another. Gemini, TTS and the
+embedding model are replaced by chatbot/fake_providers.py unless
+``--real-providers`` is given, so runs are reproducible offline.
+
+The report is JSON (stdout or ``--output``); ``--baseline`` compares it with
+an earlier report. Run against a scratch database: the users and resources
+it creates are deleted afterwards unless ``--keep`` is given.
+"""
+import asyncio
+import json
+import subprocess
+import sys
+import time
+import uuid
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+
+from celery import current_app
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from rest_framework.test import APIRequestFactory, force_authenticate
+
+from chatbot.fake_providers import fakes_config, install_fake_providers
+from chatbot.models import IngestionJob, Resource
+from chatbot.persistence import get_write_behind_queue
+from chatbot.wire import FRAME_DEFLATE
+
+TOPICS = [
+    ("Linear algebra", "matrix eigenvalue eigenvector determinant basis span rank kernel"),
+    ("Operating systems", "process thread scheduler mutex semaphore deadlock paging kernel"),
+    ("Organic chemistry", "alkane alkene benzene reaction mechanism nucleophile electrophile"),
+    ("World history", "revolution empire treaty republic monarchy industrial colonial"),
+    ("Cell biology", "membrane mitochondria ribosome protein enzyme photosynthesis nucleus"),
+    ("Microeconomics", "supply demand elasticity equilibrium marginal cost utility market"),
+]
+
+QUESTIONS = [
+    "What does the {} midterm cover about {}?",
+    "Can you explain {} and how {} fits in?",
+    "Give me a short example involving {} in {}.",
+    "Why does {} matter when studying {}?",
+]
+
+
+def _resource_text(i: int) -> tuple:
+    title, vocabulary = TOPICS[i % len(TOPICS)]
+    words = vocabulary.split()
+    paragraphs = []
+    for p in range(6):
+        sentences = [
+            f"In {title.lower()}, the {words[(i + p + s) % len(words)]} relates to the "
+            f"{words[(i * 3 + p + s * 2) % len(words)]} through worked example {i}.{p}.{s}."
+            for s in range(8)
+        ]
+        paragraphs.append(" ".join(sentences))
+    return f"{title} notes #{i}", "\n\n".join(paragraphs)
+
+
+def _question(socket: int, message: int) -> str:
+    title, vocabulary = TOPICS[(socket + message) % len(TOPICS)]
+    word = vocabulary.split()[(socket * 7 + message) % len(vocabulary.split())]
+    return QUESTIONS[(socket + message) % len(QUESTIONS)].format(word, title.lower()) + f" (#{socket}.{message})"
+
+
+def _summary(values) -> dict:
+    """Nearest-rank percentiles in milliseconds."""
+    if not values:
+        return {"count": 0}
+    ordered = sorted(v * 1000 for v in values)
+
+    def pct(p):
+        return round(ordered[min(len(ordered) - 1, max(0, int(round(p / 100 * len(ordered))) - 1))], 2)
+
+    return {
+        "count": len(ordered), "mean": round(sum(ordered) / len(ordered), 2),
+        "p50": pct(50), "p90": pct(90), "p95": pct(95), "p99": pct(99), "max": round(ordered[-1], 2),
+    }
+
+
+def _git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              timeout=5, check=True).stdout.strip()
+    except Exception:
+        return None
+
+
+class Command(BaseCommand):
+    help = "Benchmark ingestion, retrieval and concurrent chat sockets in-process; prints a JSON report."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--sockets", type=int, default=20, help="Concurrent chat sockets (one user each).")
+        parser.add_argument("--messages", type=int, default=3, help="Questions sent per socket, one at a time.")
+        parser.add_argument("--resources", type=int, default=50, help="Resources ingested before chatting.")
+        parser.add_argument("--ingest-concurrency", type=int, default=4, help="Parallel IngestResourceView requests.")
+        parser.add_argument("--queries", type=int, default=200, help="Retrieval calls timed on their own.")
+        parser.add_argument("--query-concurrency", type=int, default=16)
+        parser.add_argument("--tts", choices=["none", "full", "stream"], default="none", help="TTS mode requested per message.")
+        parser.add_argument("--protocol", type=int, default=1, help="Wire protocol version requested by the sockets.")
+        parser.add_argument("--compress", action="store_true", help="Request deflated JSON frames (protocol 2+).")
+        parser.add_argument("--timeout", type=float, default=120.0, help="Seconds to wait for any one answer or for ingestion.")
+        parser.add_argument("--real-providers", action="store_true", help="Call the real Gemini/TTS/embedding model.")
+        parser.add_argument("--broker", action="store_true", help="Ingest through the Celery broker instead of eagerly.")
+        parser.add_argument("--output", help="Write the JSON report here instead of stdout.")
+        parser.add_argument("--baseline", help="Earlier JSON report to compare against.")
+        parser.add_argument("--keep", action="store_true", help="Keep the users and resources created by the run.")
+
+    def handle(self, *args, **options):
+        if options["sockets"] < 1 or options["messages"] < 1:
+            raise CommandError("--sockets and --messages must be at least 1.")
+        if not options["real_providers"]:
+            install_fake_providers()
+        if not options["broker"]:
+            current_app.conf.task_always_eager = True
+
+        run = uuid.uuid4().hex[:8]
+        User = get_user_model()
+        users = [User.objects.create_user(username=f"loadtest-{run}-{i}") for i in range(options["sockets"])]
+        try:
+            report = {
+                "commit": _git_commit(),
+                "started": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+                "options": {k: options[k] for k in (
+                    "sockets", "messages", "resources", "ingest_concurrency", "queries", "query_concurrency", "tts",
+                    "protocol", "compress",
+                )},
+                "fake_providers": None if options["real_providers"] else {
+                    k: v for k, v in fakes_config().items() if k != "ENABLED"
+                },
+                "ingestion": self.ingest(users, options),
+                "retrieval_ms": asyncio.run(self.retrieve(users, options)),
+                "chat": asyncio.run(self.chat(users, options)),
+            }
+        finally:
+            get_write_behind_queue().stop()  # land buffered ChatHistory rows before deleting their users
+            if not options["keep"]:
+                Resource.objects.filter(owner__in=users).delete()
+                User.objects.filter(pk__in=[u.pk for u in users]).delete()
+
+        text = json.dumps(report, indent=2)
+        if options["output"]:
+            with open(options["output"], "w") as f:
+                f.write(text + "\n")
+        else:
+            self.stdout.write(text)
+        if options["baseline"]:
+            self.compare(options["baseline"], report)
+
+    def ingest(self, users, options) -> dict:
+        from chatbot.views import IngestResourceView
+
+        view = IngestResourceView.as_view()
+        factory = APIRequestFactory()
+
+        def post(i):
+            title, content = _resource_text(i)
+            request = factory.post("/api/resources/add/", {"title": title, "content": content}, format="json")
+            force_authenticate(request, user=users[i % len(users)])
+            response = view(request)
+            if response.status_code != 202:
+                raise CommandError(f"Ingest request {i} failed: {response.status_code} {response.data}")
+            return response.data["job_id"]
+
+        started = time.monotonic()
+        with ThreadPoolExecutor(max_workers=max(1, options["ingest_concurrency"])) as pool:
+            job_ids = list(pool.map(post, range(options["resources"])))
+        accepted = time.monotonic() - started
+
+        jobs = IngestionJob.objects.filter(pk__in=job_ids)
+        done_states = (IngestionJob.STATUS_SUCCEEDED, IngestionJob.STATUS_FAILED)
+        while jobs.exclude(status__in=done_states).exists():
+            if time.monotonic() - started > options["timeout"]:
+                raise CommandError("Timed out waiting for ingestion jobs.")
+            time.sleep(0.1)
+        elapsed = time.monotonic() - started
+
+        chunks = sum(jobs.values_list("total_chunks", flat=True))
+        return {
+            "resources": len(job_ids),
+            "failed": jobs.filter(status=IngestionJob.STATUS_FAILED).count(),
+            "chunks": chunks,
+            "accept_seconds": round(accepted, 3),
+            "seconds": round(elapsed, 3),
+            "resources_per_second": round(len(job_ids) / elapsed, 2) if elapsed else None,
+            "chunks_per_second": round(chunks / elapsed, 2) if elapsed else None,
+        }
+
+    async def retrieve(self, users, options) -> dict:
+        from chatbot.utils import aretrieve_documents
+
+        await aretrieve_documents(str(users[0].id), _question(0, 0))  # exclude one-off loading
+        semaphore = asyncio.Semaphore(max(1, options["query_concurrency"]))
+        timings = []
+
+        async def one(i):
+            async with semaphore:
+                started = time.monotonic()
+                await aretrieve_documents(str(users[i % len(users)].id), _question(i, i // len(users)))
+                timings.append(time.monotonic() - started)
+
+        await asyncio.gather(*(one(i) for i in range(options["queries"])))
+        return _summary(timings)
+
+    async def chat(self, users, options) -> dict:
+        from channels.routing import URLRouter
+        from channels.testing import WebsocketCommunicator
+
+        from chatbot.routing import websocket_urlpatterns
+
+        application = URLRouter(websocket_urlpatterns)
+        first_partial, final, queued, errors = [], [], [], {}
+        audio_frames = partial_frames = wire_bytes = 0
+        path = f"/ws/chat/?protocol={options['protocol']}" + ("&compress=deflate" if options["compress"] else "")
+
+        async def socket(i):
+            nonlocal audio_frames, partial_frames, wire_bytes
+            communicator = WebsocketCommunicator(application, path)
+            inflate = zlib.decompressobj(wbits=-15)
+            communicator.scope["user"] = users[i]
+            connected, _ = await communicator.connect(timeout=options["timeout"])
+            if not connected:
+                errors["connect"] = errors.get("connect", 0) + 1
+                return
+            await communicator.receive_from(timeout=options["timeout"])  # greeting
+            try:
+                for m in range(options["messages"]):
+                    message = {"message": _question(i, m)}
+                    if options["tts"] != "none":
+                        message["tts"] = options["tts"]
+                    started = time.monotonic()
+                    await communicator.send_to(text_data=json.dumps(message))
+                    seen_partial, waited = False, False
+                    while True:
+                        frame = await communicator.receive_output(timeout=options["timeout"])
+                        raw = frame.get("bytes")
+                        if raw is not None and raw[0] != FRAME_DEFLATE:
+                            audio_frames += 1
+                            continue
+                        wire_bytes += len(raw) if raw is not None else len(frame["text"].encode("utf-8"))
+                        data = json.loads(inflate.decompress(raw[1:]) if raw is not None else frame["text"])
+                        if data.get("type") == "partial":
+                            partial_frames += 1
+                            if not seen_partial:
+                                seen_partial = True
+                                first_partial.append(time.monotonic() - started)
+                        elif data.get("type") == "status" and data.get("value") == "queued" and not waited:
+                            waited = True
+                            queued.append(data.get("position"))
+                        elif data.get("type") == "final":
+                            final.append(time.monotonic() - started)
+                            break
+                        elif "error" in data:
+                            code = data.get("code", "error")
+                            errors[code] = errors.get(code, 0) + 1
+                            break
+            except asyncio.TimeoutError:
+                errors["timeout"] = errors.get("timeout", 0) + 1
+            finally:
+                await communicator.disconnect()
+
+        started = time.monotonic()
+        await asyncio.gather(*(socket(i) for i in range(options["sockets"])))
+        elapsed = time.monotonic() - started
+        return {
+            "turns": options["sockets"] * options["messages"],
+            "completed": len(final),
+            "errors": errors,
+            "queued_turns": len(queued),
+            "audio_frames": audio_frames,
+            "partial_frames": partial_frames,
+            "json_wire_bytes": wire_bytes,
+            "seconds": round(elapsed, 3),
+            "turns_per_second": round(len(final) / elapsed, 2) if elapsed else None,
+            "first_partial_ms": _summary(first_partial),
+            "final_ms": _summary(final),
+        }
+
+    def compare(self, path: str, report: dict):
+        """Print p50/p99 and throughput changes against ``path`` to stderr."""
+        with open(path) as f:
+            baseline = json.load(f)
+        lines = [f"Compared with {path} (commit {baseline.get('commit')}):"]
+        for label, keys in (("retrieval", ("retrieval_ms",)), ("first partial", ("chat", "first_partial_ms")),
+                            ("final", ("chat", "final_ms"))):
+            old, new = baseline, report
+            for key in keys:
+                old, new = old.get(key, {}), new.get(key, {})
+            for stat in ("p50", "p99"):
+                if stat in old and stat in new and old[stat]:
+                    change = (new[stat] - old[stat]) / old[stat] * 100
+                    lines.append(f"  {label} {stat}: {old[stat]:.1f}ms -> {new[stat]:.1f}ms ({change:+.1f}%)")
+        old_rate = baseline.get("ingestion", {}).get("chunks_per_second")
+        new_rate = report["ingestion"].get("chunks_per_second")
+        if old_rate and new_rate:
+            lines.append(f"  ingestion: {old_rate} -> {new_rate} chunks/s ({(new_rate - old_rate) / old_rate * 100:+.1f}%)")
+        sys.stderr.write("\n".join(lines) + "\n")
@@ -0,0 +1,56 @@
+# backend/chatbot/management/commands/migrate_vector_layout.py
+from django.core.management.base import BaseCommand
+
+from chatbot.models import Resource
+from chatbot.vector_store import (
+    SCOPE_GLOBAL, SCOPE_MEMORY, forget_collection, get_chroma_client, get_shared_collection,
+    resource_id_of as _resource_id,
+)
+
+
+class Command(BaseCommand):
+    help = "Copy per-student and global Chroma collections into the shared multi-tenant collection."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=500, help="Vectors read/written per batch.")
+        parser.add_argument("--delete-source", action="store_true", help="Drop the old collections once copied.")
+
+    def handle(self, *args, **options):
+        client = get_chroma_client()
+        target = get_shared_collection()
+        batch_size = options["batch_size"]
+        owners = {str(pk): str(owner_id) for pk, owner_id in
+                  Resource.objects.exclude(owner=None).values_list("id", "owner_id")}
+
+        names = [c.name for c in client.list_collections()]
+        sources = [n for n in names if n == "global_resources"] + sorted(n for n in names if n.startswith("student_"))
+
+        for name in sources:
+            collection = client.get_collection(name)
+            student_id = name[len("student_"):] if name.startswith("student_") else None
+            copied, offset = 0, 0
+            while True:
+                page = collection.get(limit=batch_size, offset=offset, include=["documents", "embeddings"])
+                ids = page["ids"]
+                if not ids:
+                    break
+                metadatas = []
+                for doc_id in ids:
+                    resource_id = _resource_id(doc_id)
+                    if resource_id is not None:
+                        meta = {"scope": SCOPE_GLOBAL, "owner": owners.get(resource_id, student_id or ""), "resource_id": resource_id}
+                    else:
+                        meta = {"scope": SCOPE_MEMORY if student_id else SCOPE_GLOBAL, "owner": student_id or ""}
+                    metadatas.append(meta)
+                target.upsert(ids=ids, documents=page["documents"], embeddings=page["embeddings"], metadatas=metadatas)
+                copied += len(ids)
+                offset += len(ids)
+            self.stdout.write(f"{name}: {copied} vectors copied")
+            if options["delete_source"]:
+                client.delete_collection(name)
+                forget_collection(name)
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Migrated {len(sources)} collections into '{target.name}'. "
+            f"Set VECTOR_STORE_LAYOUT=shared to serve from it."
+        ))
@@ -0,0 +1,30 @@
+# backend/chatbot/management/commands/precompute_tts.py
+import json
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from chatbot.audio_cache import audio_cache_stats
+from chatbot.tts import AUDIO_FORMATS, synthesize_speech
+
+
+class Command(BaseCommand):
+    help = "Synthesize canned phrases (TTS_CANNED_PHRASES) into the audio cache ahead of time."
+
+    def add_arguments(self, parser):
+        parser.add_argument("phrases", nargs="*", help="Extra phrases to precompute.")
+        parser.add_argument("--encoding", action="append", choices=sorted(AUDIO_FORMATS),
+                            help="Audio encoding(s) to cache (default: OGG_OPUS and LINEAR16).")
+
+    def handle(self, *args, **options):
+        phrases = list(getattr(settings, "TTS_CANNED_PHRASES", [])) + options["phrases"]
+        if not phrases:
+            raise CommandError("No phrases: set TTS_CANNED_PHRASES or pass phrases as arguments.")
+        encodings = options["encoding"] or ["OGG_OPUS", "LINEAR16"]
+
+        for phrase in phrases:
+            for encoding in encodings:
+                audio = synthesize_speech(phrase, encoding)
+                self.stdout.write(f"{encoding:9} {len(audio):>8} bytes  {phrase[:60]}")
+
+        self.stdout.write(json.dumps(audio_cache_stats()))
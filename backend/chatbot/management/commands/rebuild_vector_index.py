@@ -0,0 +1,88 @@
+# backend/chatbot/management/commands/rebuild_vector_index.py
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from chatbot.answer_cache import invalidate_answers
+from chatbot.models import IndexVersion, Resource, ResourceChunk, ResourceChunkChange
+from chatbot.utils import chunk_id, chunk_resource, get_embeddings
+from chatbot.vector_store import (
+    SCOPE_GLOBAL, add_resource_chunks, bump_index_version, forget_collection, get_chroma_client, get_layout,
+    get_shared_collection,
+)
+
+
+class Command(BaseCommand):
+    help = "Rebuild the resource vectors from Resource rows, embedding chunks in large batches."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=getattr(settings, "INGEST_EMBED_BATCH_SIZE", 64) * 4,
+                            help="Chunks embedded per model call (across resources).")
+        parser.add_argument("--reset", action="store_true", help="Drop existing global resource vectors first.")
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        batch_size = options["batch_size"]
+
+        if options["reset"]:
+            if get_layout() == "shared":
+                get_shared_collection().delete(where={"scope": SCOPE_GLOBAL})
+            else:
+                client = get_chroma_client()
+                if "global_resources" in [c.name for c in client.list_collections()]:
+                    client.delete_collection("global_resources")
+                forget_collection("global_resources")
+
+        pending, resources, chunks_total = [], 0, 0
+        for resource in Resource.objects.order_by("id").iterator(chunk_size=200):
+            chunks = chunk_resource(resource)
+            with transaction.atomic():
+                sequence = IndexVersion.claim_sequence()
+                deleted = list(ResourceChunk.objects.filter(resource=resource).values_list("pk", flat=True))
+                ResourceChunk.objects.filter(pk__in=deleted).delete()
+                ResourceChunkChange.objects.bulk_create([
+                    ResourceChunkChange(kind=ResourceChunkChange.KIND_CHUNK_DELETED, resource_id=resource.id,
+                                        chunk_id=pk, sequence=sequence)
+                    for pk in deleted
+                ])
+            pending.extend((resource.owner_id, resource.id, chunk) for chunk in chunks)
+            resources += 1
+            if len(pending) >= batch_size:
+                chunks_total += self._flush(pending)
+                pending = []
+                self.stdout.write(f"  {resources} resources, {chunks_total} chunks indexed")
+        chunks_total += self._flush(pending)
+
+        bump_index_version()
+        invalidate_answers()
+        self.stdout.write(self.style.SUCCESS(
+            f"Rebuilt index: {resources} resources, {chunks_total} chunks in {time.monotonic() - started:.1f}s"
+        ))
+
+    def _flush(self, pending):
+        if not pending:
+            return 0
+        embeddings = get_embeddings([chunk.text for _, _, chunk in pending])
+        groups = {}
+        for (owner_id, resource_id, chunk), embedding in zip(pending, embeddings):
+            group = groups.setdefault((owner_id, resource_id), ([], [], [], []))
+            group[0].append(chunk_id(resource_id, chunk))
+            group[1].append(chunk.text)
+            group[2].append(embedding)
+            group[3].append(chunk)
+        rows = []
+        for (owner_id, resource_id), (ids, docs, vectors, chunks) in groups.items():
+            add_resource_chunks(owner_id, ids, docs, vectors, resource_id=resource_id)
+            rows.extend(
+                ResourceChunk(resource_id=resource_id, position=c.position, content_hash=c.content_hash,
+                              vector_id=doc_id, token_count=c.tokens, text=c.text)
+                for doc_id, c in zip(ids, chunks)
+            )
+        with transaction.atomic():
+            sequence = IndexVersion.claim_sequence()
+            for row in rows:
+                row.sequence = sequence
+            ResourceChunk.objects.bulk_create(rows)
+        return len(pending)
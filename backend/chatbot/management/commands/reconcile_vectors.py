@@ -0,0 +1,129 @@
+# backend/chatbot/management/commands/reconcile_vectors.py
+import time
+
+from django.core.management.base import BaseCommand
+
+from chatbot.answer_cache import invalidate_answers
+from chatbot.models import Resource, ResourceChunk
+from chatbot.utils import index_resource
+from chatbot.vector_store import (
+    SCOPE_GLOBAL, SHARED_COLLECTION, bump_index_version, get_chroma_client, get_collection, get_global_collection,
+    get_layout, get_shared_collection, resource_id_of,
+)
+
+
+def _pages(collection, batch_size, **kwargs):
+    offset = 0
+    while True:
+        page = collection.get(limit=batch_size, offset=offset, **kwargs)
+        if not page["ids"]:
+            return
+        yield page
+        offset += len(page["ids"])
+
+
+def _chunked(items, size):
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+class Command(BaseCommand):
+    help = "Garbage-collect resource vectors that no longer match a ResourceChunk row (or sit under the wrong owner)."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=1000, help="Vectors read/deleted per call.")
+        parser.add_argument("--dry-run", action="store_true", help="Report what would change without changing it.")
+        parser.add_argument("--reindex", action="store_true",
+                            help="Index resources that have no chunk rows (e.g. indexed before chunk tracking) "
+                                 "instead of leaving their vectors alone.")
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        batch_size, dry_run = options["batch_size"], options["dry_run"]
+
+        unindexed = list(Resource.objects.filter(chunks__isnull=True).exclude(content=""))
+        if options["reindex"] and not dry_run:
+            for resource in unindexed:
+                index_resource(resource)
+            self.stdout.write(f"  indexed {len(unindexed)} resources without chunk rows")
+            unindexed = []
+        # Vectors of these resources predate chunk tracking; keep them until re-indexed.
+        protected = {str(r.pk) for r in unindexed}
+
+        expected = {
+            vector_id: str(owner_id) if owner_id else ""
+            for vector_id, owner_id in ResourceChunk.objects.values_list("vector_id", "resource__owner_id")
+        }
+
+        def is_orphan(doc_id):
+            return doc_id not in expected and resource_id_of(doc_id) not in protected
+
+        # Both are {collection name: [vector id, ...]}.
+        shared = get_layout() == "shared"
+        if shared:
+            orphans, misowned = self._scan_shared(batch_size, expected, is_orphan)
+        else:
+            orphans, misowned = self._scan_per_student(batch_size, expected, is_orphan)
+
+        deleted = sum(len(ids) for ids in orphans.values())
+        moved = sum(len(ids) for ids in misowned.values())
+        if not dry_run:
+            for name, ids in orphans.items():
+                for batch in _chunked(ids, batch_size):
+                    get_collection(name).delete(ids=batch)
+            for name, ids in misowned.items():
+                for batch in _chunked(ids, batch_size):
+                    if shared:
+                        # One copy per vector: fix the owner metadata in place.
+                        get_collection(name).update(ids=batch, metadatas=[{"owner": expected[i]} for i in batch])
+                    else:
+                        get_collection(name).delete(ids=batch)
+            if deleted or moved:
+                bump_index_version()
+                invalidate_answers()
+
+        verb = "Would remove" if dry_run else "Removed"
+        self.stdout.write(self.style.SUCCESS(
+            f"{verb} {deleted} orphaned and {moved} mis-owned vectors "
+            f"({len(protected)} resources awaiting --reindex) in {time.monotonic() - started:.1f}s"
+        ))
+
+    def _scan_shared(self, batch_size, expected, is_orphan):
+        collection = get_shared_collection()
+        orphans, misowned = [], []
+        for page in _pages(collection, batch_size, where={"scope": SCOPE_GLOBAL}, include=["metadatas"]):
+            for doc_id, meta in zip(page["ids"], page["metadatas"]):
+                if resource_id_of(doc_id) is None:
+                    continue
+                if is_orphan(doc_id):
+                    orphans.append(doc_id)
+                elif doc_id in expected and (meta or {}).get("owner", "") != expected[doc_id]:
+                    misowned.append(doc_id)
+        return {SHARED_COLLECTION: orphans}, {SHARED_COLLECTION: misowned}
+
+    def _scan_per_student(self, batch_size, expected, is_orphan):
+        orphans, misowned = {}, {}
+        global_collection = get_global_collection()
+        orphans[global_collection.name] = [
+            doc_id
+            for page in _pages(global_collection, batch_size, include=[])
+            for doc_id in page["ids"]
+            if resource_id_of(doc_id) is not None and is_orphan(doc_id)
+        ]
+
+        client = get_chroma_client()
+        for name in sorted(c.name for c in client.list_collections() if c.name.startswith("student_")):
+            student_id = name[len("student_"):]
+            collection = get_collection(name)
+            stale = []
+            for page in _pages(collection, batch_size, include=[]):
+                for doc_id in page["ids"]:
+                    if resource_id_of(doc_id) is None:
+                        continue  # chat memories
+                    if is_orphan(doc_id):
+                        stale.append(doc_id)
+                    elif doc_id in expected and expected[doc_id] != student_id:
+                        misowned.setdefault(name, []).append(doc_id)
+            if stale:
+                orphans[name] = stale
+        return orphans, misowned
@@ -0,0 +1,38 @@
+# backend/chatbot/management/commands/run_embedding_service.py
+import asyncio
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from chatbot.embedding_service import EmbeddingClient, MicroBatcher, serve, service_config, warm_up_model
+
+
+class Command(BaseCommand):
+    help = "Run the shared micro-batching embedding sidecar on a Unix socket."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--socket", help="Unix socket path (defaults to EMBEDDING_SERVICE['SOCKET']).")
+        parser.add_argument("--max-batch-size", type=int, help="Maximum texts per model call.")
+        parser.add_argument("--max-wait-ms", type=float, help="Maximum time to hold a batch open.")
+        parser.add_argument("--stats", action="store_true", help="Print batch-size/queue-wait histograms of a running service and exit.")
+
+    def handle(self, *args, **options):
+        config = service_config()
+        socket_path = options["socket"] or config["SOCKET"]
+        if not socket_path:
+            raise CommandError("No socket path: pass --socket or set EMBEDDING_SERVICE_SOCKET.")
+
+        if options["stats"]:
+            stats = EmbeddingClient(socket_path, timeout=config["TIMEOUT"]).stats()
+            self.stdout.write(json.dumps(stats, indent=2))
+            return
+
+        batcher = MicroBatcher(
+            max_batch_size=options["max_batch_size"] or config["MAX_BATCH_SIZE"],
+            max_wait_ms=options["max_wait_ms"] if options["max_wait_ms"] is not None else config["MAX_WAIT_MS"],
+        )
+        warm_up_model()  # load before accepting connections
+        try:
+            asyncio.run(serve(socket_path, batcher))
+        except KeyboardInterrupt:
+            self.stdout.write("Embedding service stopped.")
@@ -0,0 +1,154 @@
+# backend/chatbot/metrics.py
+"""
+Lightweight in-process counters, gauges and histograms for the chat pipeline.
+
+``render_prometheus()`` renders the registry in the Prometheus text format for
+the metrics endpoint; values are per process.
+"""
+import bisect
+import threading
+
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+_registry = {}
+_registry_lock = threading.Lock()
+
+
+class Counter:
+    """A monotonically increasing value."""
+
+    def __init__(self, name: str, description: str = ""):
+        self.name = name
+        self.description = description
+        self._value = 0
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1):
+        with self._lock:
+            self._value += amount
+
+    @property
+    def value(self):
+        return self._value
+
+    def snapshot(self) -> dict:
+        return {"type": "counter", "value": self._value}
+
+
+class Gauge:
+    """A value that goes up and down, or is read from ``callback`` at collection time."""
+
+    def __init__(self, name: str, description: str = "", callback=None):
+        self.name = name
+        self.description = description
+        self.callback = callback
+        self._value = 0
+        self._lock = threading.Lock()
+
+    def set(self, value):
+        self._value = value
+
+    def inc(self, amount=1):
+        with self._lock:
+            self._value += amount
+
+    def dec(self, amount=1):
+        self.inc(-amount)
+
+    @property
+    def value(self):
+        if self.callback is not None:
+            try:
+                return self.callback()
+            except Exception:
+                return float("nan")
+        return self._value
+
+    def snapshot(self) -> dict:
+        return {"type": "gauge", "value": self.value}
+
+
+class Histogram:
+    """Bucketed distribution with count and sum, Prometheus style."""
+
+    def __init__(self, name: str, buckets=DEFAULT_BUCKETS, description: str = ""):
+        self.name = name
+        self.description = description
+        self.buckets = tuple(sorted(buckets))
+        self._counts = [0] * (len(self.buckets) + 1)
+        self._sum = 0.0
+        self._count = 0
+        self._lock = threading.Lock()
+
+    def observe(self, value: float):
+        with self._lock:
+            self._counts[bisect.bisect_left(self.buckets, value)] += 1
+            self._sum += value
+            self._count += 1
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            cumulative, buckets = 0, {}
+            for bound, count in zip(self.buckets, self._counts):
+                cumulative += count
+                buckets[str(bound)] = cumulative
+            buckets["+Inf"] = self._count
+            return {"type": "histogram", "count": self._count, "sum": self._sum, "buckets": buckets}
+
+
+def _get_or_create(name: str, factory):
+    metric = _registry.get(name)
+    if metric is None:
+        with _registry_lock:
+            metric = _registry.get(name)
+            if metric is None:
+                metric = factory()
+                _registry[name] = metric
+    return metric
+
+
+def counter(name: str, description: str = "") -> Counter:
+    """Return the process-wide counter called ``name``."""
+    return _get_or_create(name, lambda: Counter(name, description))
+
+
+def gauge(name: str, description: str = "", callback=None) -> Gauge:
+    """Return the process-wide gauge called ``name``."""
+    return _get_or_create(name, lambda: Gauge(name, description, callback))
+
+
+def hit_ratio(hits, misses):
+    """Gauge callback: hits / (hits + misses) over the given counters, 0 before any lookup."""
+    def ratio():
+        hit = sum(c.value for c in hits)
+        total = hit + sum(c.value for c in misses)
+        return hit / total if total else 0.0
+    return ratio
+
+
+def histogram(name: str, buckets=DEFAULT_BUCKETS, description: str = "") -> Histogram:
+    """Return the process-wide histogram called ``name``."""
+    return _get_or_create(name, lambda: Histogram(name, buckets, description))
+
+
+def metrics_snapshot(prefix: str = "") -> dict:
+    """Current values of every registered metric whose name starts with ``prefix``."""
+    return {name: m.snapshot() for name, m in sorted(_registry.items()) if name.startswith(prefix)}
+
+
+def render_prometheus() -> str:
+    """Every registered metric in the Prometheus text exposition format (0.0.4)."""
+    lines = []
+    for name, metric in sorted(_registry.items()):
+        snap = metric.snapshot()
+        if metric.description:
+            lines.append(f"# HELP {name} {metric.description}")
+        lines.append(f"# TYPE {name} {snap['type']}")
+        if snap["type"] == "histogram":
+            for bound, count in snap["buckets"].items():
+                lines.append(f'{name}_bucket{{le="{bound}"}} {count}')
+            lines.append(f"{name}_sum {snap['sum']}")
+            lines.append(f"{name}_count {snap['count']}")
+        else:
+            lines.append(f"{name} {snap['value']}")
+    return "\n".join(lines) + "\n"
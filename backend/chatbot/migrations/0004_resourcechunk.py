@@ -0,0 +1,29 @@
+# Generated by Django 4.2.26 on 2026-10-18 20:49
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chatbot', '0003_conversationsummary'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ResourceChunk',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('position', models.PositiveIntegerField()),
+                ('content_hash', models.CharField(max_length=64)),
+                ('vector_id', models.CharField(max_length=128)),
+                ('token_count', models.PositiveIntegerField(default=0)),
+                ('resource', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='chunks', to='chatbot.resource')),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='resourcechunk',
+            constraint=models.UniqueConstraint(fields=('resource', 'content_hash'), name='unique_resource_chunk_hash'),
+        ),
+    ]
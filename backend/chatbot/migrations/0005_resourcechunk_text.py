@@ -0,0 +1,18 @@
+# Generated by Django 4.2.26 on 2026-10-18 20:53
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chatbot', '0004_resourcechunk'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='resourcechunk',
+            name='text',
+            field=models.TextField(blank=True, default=''),
+        ),
+    ]
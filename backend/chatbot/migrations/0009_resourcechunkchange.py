@@ -0,0 +1,24 @@
+# Generated by Django 4.2.26 on 2026-10-18 21:25
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chatbot', '0008_indexversion'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ResourceChunkChange',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('chunk_deleted', 'Chunk deleted'), ('resource_deleted', 'Resource deleted'), ('owner_changed', 'Owner changed')], max_length=20)),
+                ('resource_id', models.BigIntegerField()),
+                ('chunk_id', models.BigIntegerField(blank=True, null=True)),
+                ('owner_id', models.BigIntegerField(blank=True, null=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True, db_index=True)),
+            ],
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 4.2.26 on 2026-10-18 21:41
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chatbot', '0009_resourcechunkchange'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='indexversion',
+            name='sequence',
+            field=models.PositiveBigIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='resourcechunk',
+            name='sequence',
+            field=models.PositiveBigIntegerField(db_index=True, default=0),
+        ),
+        migrations.AddField(
+            model_name='resourcechunkchange',
+            name='sequence',
+            field=models.PositiveBigIntegerField(db_index=True, default=0),
+        ),
+    ]
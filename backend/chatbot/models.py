@@ -1,5 +1,7 @@
 #/Users/set/final_project/backend/chatbot/models.py
+import uuid
 from django.db import models
+from django.utils import timezone
 from django.conf import settings
 
 class Resource(models.Model):
@@ -17,7 +19,146 @@ class ChatHistory(models.Model):
     user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name="chat_histories")
     question = models.TextField()
     answer = models.TextField()
+    # Set by the consumer when the turn finishes, not when the write-behind queue flushes it.
+    created_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        indexes = [
+            # Serves "latest turns for a user" and keyset pagination without a sort.
+            models.Index(fields=["user", "-created_at", "-id"], name="chat_history_user_recent"),
+        ]
+
+    def __str__(self):
+        return f"ChatHistory({self.user}, {self.created_at})"
+
+class ChatHistoryArchive(models.Model):
+    """One compressed batch of ChatHistory rows moved out of the live table."""
+    path = models.CharField(max_length=500, unique=True)
+    row_count = models.PositiveIntegerField()
+    first_id = models.BigIntegerField()
+    last_id = models.BigIntegerField()
+    oldest = models.DateTimeField()
+    newest = models.DateTimeField()
+    sha256 = models.CharField(max_length=64)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"ChatHistoryArchive({self.path}, {self.row_count} rows)"
+
+class IngestionJob(models.Model):
+    """Tracks background indexing of a Resource into the vector store."""
+    STATUS_QUEUED = "queued"
+    STATUS_RUNNING = "running"
+    STATUS_SUCCEEDED = "succeeded"
+    STATUS_FAILED = "failed"
+    STATUS_CHOICES = [
+        (STATUS_QUEUED, "Queued"),
+        (STATUS_RUNNING, "Running"),
+        (STATUS_SUCCEEDED, "Succeeded"),
+        (STATUS_FAILED, "Failed"),
+    ]
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    resource = models.ForeignKey(Resource, on_delete=models.CASCADE, related_name="ingestion_jobs")
+    owner = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, null=True, blank=True, related_name="ingestion_jobs")
+    status = models.CharField(max_length=16, choices=STATUS_CHOICES, default=STATUS_QUEUED)
+    total_chunks = models.PositiveIntegerField(default=0)
+    processed_chunks = models.PositiveIntegerField(default=0)
+    error = models.TextField(blank=True, default="")
     created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    @property
+    def progress(self) -> float:
+        if self.status == self.STATUS_SUCCEEDED:
+            return 1.0
+        if not self.total_chunks:
+            return 0.0
+        return round(self.processed_chunks / self.total_chunks, 4)
+
+    def __str__(self):
+        return f"IngestionJob({self.resource_id}, {self.status})"
+
+
+class ConversationSummary(models.Model):
+    """Rolling summary of a user's older chat turns, used instead of re-sending them verbatim."""
+    user = models.OneToOneField(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name="conversation_summary")
+    summary = models.TextField(blank=True, default="")
+    summarized_until = models.DateTimeField(null=True, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"ConversationSummary({self.user}, {self.summarized_until})"
+
+
+class ResourceChunk(models.Model):
+    """One indexed chunk of a Resource, keyed by content hash so unchanged chunks are never re-embedded."""
+    resource = models.ForeignKey(Resource, on_delete=models.CASCADE, related_name="chunks")
+    position = models.PositiveIntegerField()
+    content_hash = models.CharField(max_length=64)
+    vector_id = models.CharField(max_length=128)
+    token_count = models.PositiveIntegerField(default=0)
+    text = models.TextField(blank=True, default="")
+    # IndexVersion.claim_sequence() of the transaction that wrote the row.
+    sequence = models.PositiveBigIntegerField(default=0, db_index=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["resource", "content_hash"], name="unique_resource_chunk_hash"),
+        ]
+
+    def __str__(self):
+        return f"ResourceChunk({self.resource_id}, {self.position})"
+
+
+class IndexVersion(models.Model):
+    """Single-row counters of resource index changes.
+
+    ``version`` is the retrieval cache version, used when the shared cache can't
+    increment atomically. ``sequence`` stamps ResourceChunk and ResourceChunkChange
+    writes in commit order (see ``claim_sequence``).
+    """
+    version = models.PositiveBigIntegerField(default=0)
+    sequence = models.PositiveBigIntegerField(default=0)
+
+    @classmethod
+    def claim_sequence(cls) -> int:
+        """Next write sequence number; call inside the transaction that writes the stamped rows.
+
+        The row lock is held until that transaction commits, so transactions
+        commit in sequence order and every row stamped ``<= sequence`` is
+        visible once ``sequence`` is.
+        """
+        cls.objects.get_or_create(pk=1)
+        current = cls.objects.select_for_update().filter(pk=1).values_list("sequence", flat=True).get()
+        cls.objects.filter(pk=1).update(sequence=current + 1)
+        return current + 1
+
+    @classmethod
+    def committed_sequence(cls) -> int:
+        return cls.objects.filter(pk=1).values_list("sequence", flat=True).first() or 0
+
+    def __str__(self):
+        return f"IndexVersion({self.version})"
+
+
+class ResourceChunkChange(models.Model):
+    """Append-only log of chunk deletions and owner moves, so in-process indexes refresh in O(changes)."""
+    KIND_CHUNK_DELETED = "chunk_deleted"
+    KIND_RESOURCE_DELETED = "resource_deleted"
+    KIND_OWNER_CHANGED = "owner_changed"
+    KIND_CHOICES = [
+        (KIND_CHUNK_DELETED, "Chunk deleted"),
+        (KIND_RESOURCE_DELETED, "Resource deleted"),
+        (KIND_OWNER_CHANGED, "Owner changed"),
+    ]
+
+    kind = models.CharField(max_length=20, choices=KIND_CHOICES)
+    resource_id = models.BigIntegerField()
+    chunk_id = models.BigIntegerField(null=True, blank=True)
+    owner_id = models.BigIntegerField(null=True, blank=True)
+    sequence = models.PositiveBigIntegerField(default=0, db_index=True)
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
 
     def __str__(self):
-        return f"ChatHistory({self.user}, {self.created_at})"
\ No newline at end of file
+        return f"ResourceChunkChange({self.kind}, {self.resource_id})"
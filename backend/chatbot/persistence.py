@@ -0,0 +1,173 @@
+# backend/chatbot/persistence.py
+"""
+Write-behind persistence for finished chat turns.
+
+The consumer hands each turn to ``submit_turn`` and moves on; a background
+thread flushes queued turns every ``FLUSH_INTERVAL`` seconds (or as soon as
+``MAX_BATCH`` are waiting) with one ``ChatHistory.bulk_create`` and one
+memory-vector upsert. Pending turns are flushed at interpreter shutdown.
+
+A turn keeps the time it finished as its ``created_at``, however long it
+waits, and turns not yet written are visible through ``pending_turns`` so a
+follow-up question's prompt (``prompting.load_history``) still sees them.
+"""
+import atexit
+import datetime
+import logging
+import threading
+import time
+import uuid
+from collections import deque
+from dataclasses import dataclass, field
+
+from django.conf import settings
+from django.db import close_old_connections
+from django.utils import timezone
+
+from .metrics import counter, histogram
+from .vector_store import add_memories
+
+DEFAULT_WRITE_BEHIND = {"FLUSH_INTERVAL": 1.0, "MAX_BATCH": 200, "MAX_PENDING": 10000}
+
+_flushed = counter("chat_write_behind_turns_total", "Chat turns persisted by the write-behind queue")
+_flush_seconds = histogram("chat_write_behind_flush_seconds", description="Time to persist one write-behind batch")
+
+_queue = None
+_queue_lock = threading.Lock()
+
+
+@dataclass
+class ChatTurn:
+    student_id: str
+    question: str
+    answer: str
+    user_id: int = None
+    embedding: list = None
+    memory_id: str = field(default_factory=lambda: uuid.uuid4().hex)
+    created_at: datetime.datetime = field(default_factory=timezone.now)
+
+    @property
+    def memory_document(self) -> str:
+        return f"Q: {self.question}\nA: {self.answer}"
+
+
+def write_turns(turns):
+    """Persist turns now: bulk ChatHistory insert plus batched memory upsert."""
+    from .models import ChatHistory
+    from .utils import get_embeddings
+
+    if not turns:
+        return
+    started = time.monotonic()
+    rows = [ChatHistory(user_id=t.user_id, question=t.question, answer=t.answer, created_at=t.created_at)
+            for t in turns if t.user_id]
+    if rows:
+        ChatHistory.objects.bulk_create(rows)
+
+    missing = [t for t in turns if t.embedding is None]
+    if missing:
+        for turn, embedding in zip(missing, get_embeddings([t.question for t in missing])):
+            turn.embedding = embedding
+    add_memories([
+        (t.student_id, f"chat_{t.student_id}_{t.memory_id}", t.memory_document, t.embedding)
+        for t in turns
+    ])
+    _flushed.inc(len(turns))
+    _flush_seconds.observe(time.monotonic() - started)
+
+
+class WriteBehindQueue:
+    def __init__(self, flush_interval: float = 1.0, max_batch: int = 200, max_pending: int = 10000):
+        self.flush_interval = flush_interval
+        self.max_batch = max_batch
+        self.max_pending = max_pending
+        self._pending = deque()
+        self._writing = []  # batches taken off the queue but not yet written
+        self._cond = threading.Condition()
+        self._stopped = False
+        self._thread = threading.Thread(target=self._run, name="chat-write-behind", daemon=True)
+        self._thread.start()
+
+    def __len__(self):
+        return len(self._pending)
+
+    def submit(self, turn: ChatTurn) -> bool:
+        """Queue a turn; returns False (caller should write directly) when the queue is full."""
+        with self._cond:
+            if self._stopped or len(self._pending) >= self.max_pending:
+                return False
+            self._pending.append(turn)
+            if len(self._pending) >= self.max_batch:
+                self._cond.notify()
+        return True
+
+    def _take(self):
+        with self._cond:
+            batch = []
+            while self._pending and len(batch) < self.max_batch:
+                batch.append(self._pending.popleft())
+            if batch:
+                self._writing.append(batch)
+            return batch
+
+    def pending_for(self, user_id) -> list:
+        """Turns of ``user_id`` queued or being written, oldest first."""
+        with self._cond:
+            turns = [t for batch in self._writing for t in batch] + list(self._pending)
+        return [t for t in turns if t.user_id == user_id]
+
+    def flush(self):
+        """Write everything queued so far (runs on the caller's thread)."""
+        while True:
+            batch = self._take()
+            if not batch:
+                return
+            close_old_connections()
+            try:
+                write_turns(batch)
+            except Exception as e:
+                logging.error(f"💾 Write-behind flush of {len(batch)} turns failed: {e}", exc_info=True)
+            finally:
+                with self._cond:
+                    self._writing.remove(batch)
+                close_old_connections()
+
+    def _run(self):
+        while True:
+            with self._cond:
+                if not self._stopped and len(self._pending) < self.max_batch:
+                    self._cond.wait(self.flush_interval)
+                stopped = self._stopped
+            self.flush()
+            if stopped:
+                return
+
+    def stop(self, timeout: float = 10.0):
+        """Stop accepting turns and flush what is pending."""
+        with self._cond:
+            self._stopped = True
+            self._cond.notify()
+        self._thread.join(timeout)
+        self.flush()
+
+
+def get_write_behind_queue() -> WriteBehindQueue:
+    global _queue
+    if _queue is None:
+        with _queue_lock:
+            if _queue is None:
+                config = dict(DEFAULT_WRITE_BEHIND)
+                config.update(getattr(settings, "CHAT_WRITE_BEHIND", {}))
+                _queue = WriteBehindQueue(config["FLUSH_INTERVAL"], config["MAX_BATCH"], config["MAX_PENDING"])
+                atexit.register(_queue.stop)
+    return _queue
+
+
+def submit_turn(turn: ChatTurn) -> bool:
+    """Hand a finished turn to the write-behind queue."""
+    return get_write_behind_queue().submit(turn)
+
+
+def pending_turns(user_id) -> list:
+    """``user_id``'s turns this process has accepted but not yet written, oldest first."""
+    return _queue.pending_for(user_id) if _queue is not None else []
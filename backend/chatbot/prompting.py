@@ -0,0 +1,217 @@
+# backend/chatbot/prompting.py
+"""
+Token-budgeted prompt assembly.
+
+The prompt gets ``PROMPT_BUDGET['MAX_TOKENS']``; after the system message and
+the question, the rest is split between retrieved context and history
+(``CONTEXT_SHARE``), with either side's unused share going to the other.
+History is the user's rolling ``ConversationSummary`` plus the most recent
+turns verbatim; once enough older turns have piled up they are folded into
+the summary in the background (``refresh_summary``).
+"""
+import logging
+import threading
+
+from django.conf import settings
+from django.db import close_old_connections
+
+from .metrics import counter, histogram
+
+DEFAULT_PROMPT_BUDGET = {
+    "MAX_TOKENS": 3000,
+    "CONTEXT_SHARE": 0.6,
+    "RECENT_TURNS": 3,
+    "SUMMARIZE_AFTER": 4,
+    "SUMMARY_MAX_TOKENS": 300,
+}
+
+SYSTEM_MESSAGE = (
+    "You are an academic mentor. Be concise and clear. "
+    "Use the context and chat history to answer helpfully."
+)
+
+TOKEN_BUCKETS = (250, 500, 1000, 2000, 3000, 4000, 6000, 8000, 12000, 16000)
+
+_tokens_before = histogram("prompt_tokens_before_compaction", TOKEN_BUCKETS, "Estimated prompt tokens without the budget")
+_tokens_after = histogram("prompt_tokens_after_compaction", TOKEN_BUCKETS, "Estimated prompt tokens actually sent")
+_summaries = counter("conversation_summaries_updated_total", "Rolling conversation summaries refreshed")
+
+_refreshing = set()
+_refreshing_lock = threading.Lock()
+
+
+def budget_config() -> dict:
+    config = dict(DEFAULT_PROMPT_BUDGET)
+    config.update(getattr(settings, "PROMPT_BUDGET", {}))
+    return config
+
+
+def estimate_tokens(text: str) -> int:
+    """Cheap token estimate (~4 characters per token for English text)."""
+    return (len(text or "") + 3) // 4
+
+
+def truncate_to_tokens(text: str, tokens: int) -> str:
+    """Cut ``text`` to roughly ``tokens`` tokens, preferring a word boundary."""
+    limit = tokens * 4
+    if len(text) <= limit:
+        return text
+    cut = text.rfind(" ", 0, limit)
+    return text[:cut if cut > limit // 2 else limit].rstrip() + " …"
+
+
+_PROMPT = "{system}\n\nContext:\n{context}\n\nHistory:\n{history}\n\nUser: {query}\nAnswer:"
+
+
+def format_turn(question: str, answer: str) -> str:
+    return f"Q: {question}\nA: {answer or ''}"
+
+
+def _fill(blocks, budget: int):
+    """Take blocks in priority order until ``budget`` tokens are used; truncate the last one."""
+    taken, used = [], 0
+    for block in blocks:
+        cost = estimate_tokens(block)
+        if used + cost <= budget:
+            taken.append(block)
+            used += cost
+        else:
+            remaining = budget - used
+            if remaining >= 32:
+                taken.append(truncate_to_tokens(block, remaining))
+                used = budget
+            break
+    return taken, used
+
+
+def load_history(user):
+    """Return ``(summary, recent_turns, needs_refresh)`` for the prompt.
+
+    ``recent_turns`` are ``(question, answer)`` pairs, newest first, that are not
+    yet covered by the summary, including this process's turns still waiting in
+    the write-behind queue.
+    """
+    from .models import ChatHistory, ConversationSummary
+    from .persistence import pending_turns
+
+    if user is None or not getattr(user, "is_authenticated", False):
+        return "", [], False
+
+    config = budget_config()
+    summary = ConversationSummary.objects.filter(user=user).values_list("summary", "summarized_until").first()
+    text, until = summary if summary else ("", None)
+
+    qs = ChatHistory.objects.filter(user=user)
+    if until is not None:
+        qs = qs.filter(created_at__gt=until)
+    window = config["RECENT_TURNS"] + config["SUMMARIZE_AFTER"]
+    # Read the queue first: a turn flushed in between is then in both, not in neither.
+    pending = [(t.question, t.answer, t.created_at) for t in pending_turns(user.pk)
+               if until is None or t.created_at > until]
+    stored = list(qs.order_by('-created_at', '-id').values_list('question', 'answer', 'created_at')[:window])
+    seen = set(stored)
+    turns = sorted(stored + [t for t in pending if t not in seen], key=lambda t: t[2], reverse=True)[:window]
+    return text, [(q, a) for q, a, _ in turns], len(stored) >= window
+
+
+def assemble_prompt(query: str, documents, summary: str = "", turns=()) -> str:
+    """Build the prompt from ranked documents, a summary and recent turns within the budget."""
+    config = budget_config()
+    # Newest first, so the budget drops the oldest unsummarized turns first.
+    history_blocks = [format_turn(q, a) for q, a in turns]
+    if summary:
+        history_blocks.insert(0, f"Summary of earlier conversation: {summary}")
+
+    fixed = estimate_tokens(SYSTEM_MESSAGE) + estimate_tokens(query) + 16
+    available = max(config["MAX_TOKENS"] - fixed, 0)
+
+    context_budget = int(available * config["CONTEXT_SHARE"])
+    history_need = sum(estimate_tokens(b) for b in history_blocks)
+    history_budget = available - context_budget
+    # Hand whichever side doesn't need its share over to the other.
+    if history_need < history_budget:
+        context_budget += history_budget - history_need
+        history_budget = history_need
+    context_docs, context_used = _fill(documents, context_budget)
+    history_budget += context_budget - context_used
+    history, _ = _fill(history_blocks, history_budget)
+
+    context = "\n".join(context_docs)
+    mem_block = "\n---\n".join(history)
+    prompt = _PROMPT.format(system=SYSTEM_MESSAGE, context=context, history=mem_block, query=query)
+
+    # The unbudgeted prompt this replaced: every document and the last five turns, verbatim.
+    naive = _PROMPT.format(
+        system=SYSTEM_MESSAGE, context="\n".join(documents),
+        history="\n---\n".join(format_turn(q, a) for q, a in list(turns)[:5]), query=query,
+    )
+    _tokens_before.observe(estimate_tokens(naive))
+    _tokens_after.observe(estimate_tokens(prompt))
+    return prompt
+
+
+def prompt_context(prompt: str) -> str:
+    """The system message and retrieved context of an assembled prompt, without history or question."""
+    return prompt.split("\n\nHistory:\n", 1)[0]
+
+
+def _summarize_with_model(previous: str, turns, max_tokens: int) -> str:
+    from .utils import TEXT_MODEL, client
+
+    transcript = "\n---\n".join(format_turn(q, a) for q, a in turns)
+    instruction = (
+        "Update the running summary of a tutoring conversation. Keep the student's goals, "
+        "topics covered, difficulties and facts they shared. Be brief.\n\n"
+        f"Current summary:\n{previous or '(none)'}\n\nNew exchanges:\n{transcript}\n\nUpdated summary:"
+    )
+    response = client.models.generate_content(
+        model=TEXT_MODEL,
+        contents=[{"role": "user", "parts": [{"text": instruction}]}],
+        config={"max_output_tokens": max_tokens},
+    )
+    return (getattr(response, "text", "") or "").strip()
+
+
+def _summarize_extractively(previous: str, turns, max_tokens: int) -> str:
+    lines = [previous] if previous else []
+    lines += [f"- Asked: {q[:160]}" for q, _ in turns]
+    # Keep the newest material when over budget.
+    return truncate_to_tokens("\n".join(lines)[-max_tokens * 4:], max_tokens)
+
+
+def refresh_summary(user_id: int):
+    """Fold turns that fell out of the recent window into the user's summary."""
+    from .models import ChatHistory, ConversationSummary
+
+    with _refreshing_lock:
+        if user_id in _refreshing:
+            return
+        _refreshing.add(user_id)
+    close_old_connections()
+    try:
+        config = budget_config()
+        summary, _ = ConversationSummary.objects.get_or_create(user_id=user_id)
+        qs = ChatHistory.objects.filter(user_id=user_id)
+        if summary.summarized_until is not None:
+            qs = qs.filter(created_at__gt=summary.summarized_until)
+        pending = list(qs.order_by('-created_at').values_list('question', 'answer', 'created_at'))
+        older = list(reversed(pending[config["RECENT_TURNS"]:]))
+        if len(older) < config["SUMMARIZE_AFTER"]:
+            return
+
+        turns = [(q, a) for q, a, _ in older]
+        try:
+            text = _summarize_with_model(summary.summary, turns, config["SUMMARY_MAX_TOKENS"])
+        except Exception as e:
+            logging.warning(f"⚠️ Summary model call failed, using extractive summary: {e}")
+            text = ""
+        text = text or _summarize_extractively(summary.summary, turns, config["SUMMARY_MAX_TOKENS"])
+
+        summary.summary = truncate_to_tokens(text, config["SUMMARY_MAX_TOKENS"])
+        summary.summarized_until = older[-1][2]
+        summary.save(update_fields=["summary", "summarized_until", "updated_at"])
+        _summaries.inc()
+    finally:
+        close_old_connections()
+        with _refreshing_lock:
+            _refreshing.discard(user_id)
@@ -0,0 +1,129 @@
+# backend/chatbot/retrieval.py
+"""
+Hybrid retrieval: dense (vector) and lexical (BM25) rankings merged with
+reciprocal-rank fusion.
+
+``MODE`` is "hybrid" or "dense". In hybrid mode each retriever contributes up
+to ``CANDIDATES`` documents and the fused top ``top_k`` are returned; the
+lexical side is dropped for a request when it misses ``LEXICAL_BUDGET_MS``.
+
+Global-collection results do not depend on the student, so they are cached per
+normalized query (in-process, then the ``shared`` cache) under the current
+resource index version; any ingest bumps the version and retires old entries.
+"""
+import hashlib
+import logging
+import threading
+
+from cachetools import TTLCache
+from django.conf import settings
+from django.core.cache import caches
+
+from .embedding_cache import normalize_text
+from .metrics import counter, gauge, histogram, hit_ratio
+from .vector_store import index_version, query_global
+
+DEFAULT_RETRIEVAL = {
+    "MODE": "hybrid",
+    "CANDIDATES": 10,
+    "RRF_K": 60,
+    "LEXICAL_BUDGET_MS": 50,
+    "LEXICAL_REFRESH_INTERVAL": 1.0,
+    "LEXICAL_REBUILD_SECONDS": 3600,
+    "BM25_K1": 1.2,
+    "BM25_B": 0.75,
+    "GLOBAL_CACHE": True,
+    "GLOBAL_CACHE_SIZE": 5000,
+    "GLOBAL_CACHE_TTL": 3600,
+}
+
+_lexical_timeouts = counter("retrieval_lexical_timeouts_total", "Hybrid retrievals that fell back to dense only")
+_global_hits = counter("retrieval_global_cache_hits_total", "Global-collection results served from cache")
+_global_misses = counter("retrieval_global_cache_misses_total", "Global-collection queries sent to the vector store")
+gauge("retrieval_global_cache_hit_ratio", "Share of global-collection queries served from cache",
+      hit_ratio([_global_hits], [_global_misses]))
+retrieval_seconds = histogram("retrieval_seconds", description="End-to-end document retrieval time per request")
+
+_local_results = None
+_local_results_lock = threading.Lock()
+
+
+def retrieval_config() -> dict:
+    config = dict(DEFAULT_RETRIEVAL)
+    config.update(getattr(settings, "RETRIEVAL", {}))
+    return config
+
+
+def hybrid_enabled() -> bool:
+    return retrieval_config()["MODE"] == "hybrid"
+
+
+def record_lexical_timeout():
+    _lexical_timeouts.inc()
+
+
+def _local_cache(config):
+    global _local_results
+    if _local_results is None:
+        with _local_results_lock:
+            if _local_results is None:
+                _local_results = TTLCache(maxsize=config["GLOBAL_CACHE_SIZE"], ttl=config["GLOBAL_CACHE_TTL"])
+    return _local_results
+
+
+def global_results(query: str, embedding, top_k: int):
+    """``query_global`` with results cached per (index version, normalized query, top_k)."""
+    config = retrieval_config()
+    version = index_version() if config["GLOBAL_CACHE"] else None
+    if version is None:
+        return query_global(embedding, top_k)
+
+    digest = hashlib.sha256(normalize_text(query).lower().encode("utf-8")).hexdigest()
+    key = f"retrieval:global:{version}:{top_k}:{digest}"
+    local = _local_cache(config)
+    with _local_results_lock:
+        results = local.get(key)
+    if results is None:
+        try:
+            results = caches["shared"].get(key)
+        except Exception as e:
+            logging.warning(f"⚠️ Shared retrieval cache unavailable: {e}")
+        if results is not None:
+            with _local_results_lock:
+                local[key] = results
+    if results is not None:
+        _global_hits.inc()
+        return results
+
+    _global_misses.inc()
+    results = query_global(embedding, top_k)
+    with _local_results_lock:
+        local[key] = results
+    try:
+        caches["shared"].set(key, results, config["GLOBAL_CACHE_TTL"])
+    except Exception as e:
+        logging.warning(f"⚠️ Could not write shared retrieval cache: {e}")
+    return results
+
+
+def mark_personal(student_id: str, results):
+    """Turn cached ``(document, owner)`` pairs into ``(document, personal)`` for one student."""
+    student_id = str(student_id)
+    return [(doc, bool(owner) and str(owner) == student_id) for doc, owner in results]
+
+
+def reciprocal_rank_fusion(rankings, k: int = 60):
+    """Merge ranked lists of documents: score(d) = sum over lists of 1 / (k + rank)."""
+    scores = {}
+    for ranking in rankings:
+        for rank, doc in enumerate(ranking, start=1):
+            scores[doc] = scores.get(doc, 0.0) + 1.0 / (k + rank)
+    return sorted(scores, key=scores.get, reverse=True)
+
+
+def fuse(student, global_, lexical, top_k: int):
+    """Fuse the student, global and lexical ``(document, personal)`` rankings into ``(documents, personal)``."""
+    personal_docs = {doc for doc, personal in [*student, *global_, *lexical] if personal}
+    rankings = [[doc for doc, _ in ranking] for ranking in (student, global_, lexical) if ranking]
+    fused = reciprocal_rank_fusion(rankings, retrieval_config()["RRF_K"])[:top_k]
+    return fused, any(doc in personal_docs for doc in fused)
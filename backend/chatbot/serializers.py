@@ -0,0 +1,20 @@
+#backend/chatbot/serializers.py
+from rest_framework import serializers
+from .models import ChatHistory, IngestionJob
+
+
+class IngestionJobSerializer(serializers.ModelSerializer):
+    job_id = serializers.UUIDField(source="id", read_only=True)
+    progress = serializers.FloatField(read_only=True)
+
+    class Meta:
+        model = IngestionJob
+        fields = ('job_id', 'resource', 'status', 'progress', 'processed_chunks', 'total_chunks', 'error', 'created_at', 'updated_at')
+        read_only_fields = fields
+
+
+class ChatHistorySerializer(serializers.ModelSerializer):
+    class Meta:
+        model = ChatHistory
+        fields = ('id', 'question', 'answer', 'created_at')
+        read_only_fields = fields
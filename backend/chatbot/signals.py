@@ -0,0 +1,144 @@
+# backend/chatbot/signals.py
+"""
+Keep the vector store in step with Resource rows.
+
+* Content edits queue an ``IngestionJob``; ``index_resource`` then re-embeds
+  only the chunks whose hashes changed and deletes the stale ones.
+* Owner changes (including the owner's account being deleted, which nulls
+  ``Resource.owner``) move the existing vectors out of the old owner's scope
+  without re-embedding anything.
+* Deleting a Resource deletes its vectors from every collection.
+* Saving or deleting a user drops it from the WebSocket auth cache (ws_auth.py).
+
+Owner moves and deletions are also logged as ``ResourceChunkChange`` rows,
+stamped with ``IndexVersion.claim_sequence()`` in the transaction that makes
+them, which the BM25 index (lexical_index.py) replays in commit order.
+
+Vector work runs after the transaction commits. Bulk queryset updates and
+deletes bypass these signals; ``manage.py reconcile_vectors`` cleans up after them.
+"""
+import logging
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_delete, pre_save
+from django.dispatch import receiver
+
+from .answer_cache import invalidate_answers
+from .models import IndexVersion, IngestionJob, Resource, ResourceChunk, ResourceChunkChange
+from .vector_store import bump_index_version, delete_resource_chunks, reassign_resource_chunks
+from .ws_auth import forget_user
+
+
+def _vector_ids(**filters):
+    return list(ResourceChunk.objects.filter(**filters).values_list("vector_id", flat=True))
+
+
+def _log_changes(kind, resource_ids, owner_id=None):
+    """Log chunk changes in commit order; joins the caller's transaction when there is one."""
+    with transaction.atomic():
+        sequence = IndexVersion.claim_sequence()
+        ResourceChunkChange.objects.bulk_create([
+            ResourceChunkChange(kind=kind, resource_id=pk, owner_id=owner_id, sequence=sequence)
+            for pk in resource_ids
+        ])
+
+
+def _on_commit_safely(label, func):
+    def run():
+        try:
+            func()
+        except Exception as e:
+            logging.error(f"❌ {label} failed: {e}", exc_info=True)
+    transaction.on_commit(run)
+
+
+@receiver(pre_save, sender=Resource)
+def remember_indexed_state(sender, instance, raw=False, **kwargs):
+    """Stash the stored content/owner so post_save can tell what changed."""
+    if raw or instance.pk is None:
+        instance._indexed_state = None
+        return
+    instance._indexed_state = Resource.objects.filter(pk=instance.pk).values("content", "owner_id").first()
+
+
+@receiver(post_save, sender=Resource)
+def sync_resource_vectors(sender, instance, created, raw=False, **kwargs):
+    previous = getattr(instance, "_indexed_state", None)
+    instance._indexed_state = None
+    if raw or created or previous is None:
+        return  # creation paths queue their own IngestionJob
+
+    old_owner, new_owner = previous["owner_id"], instance.owner_id
+    if old_owner != new_owner:
+        ids = _vector_ids(resource_id=instance.pk)
+        _log_changes(ResourceChunkChange.KIND_OWNER_CHANGED, [instance.pk], new_owner)
+
+        def move():
+            reassign_resource_chunks(old_owner, new_owner, ids)
+            bump_index_version()
+            invalidate_answers(old_owner)
+            invalidate_answers(new_owner)
+            logging.info(f"📦 Moved {len(ids)} vectors of resource {instance.pk} from owner {old_owner} to {new_owner}")
+        _on_commit_safely(f"Moving vectors of resource {instance.pk}", move)
+
+    if previous["content"] != instance.content:
+        from .tasks import ingest_resource
+
+        job = IngestionJob.objects.create(resource=instance, owner_id=new_owner)
+        instance._ingestion_job = job
+        transaction.on_commit(lambda: ingest_resource.delay(str(job.id)))
+
+
+@receiver(pre_delete, sender=Resource)
+def delete_resource_vectors(sender, instance, **kwargs):
+    # Collect ids now: the ResourceChunk rows cascade away with the resource.
+    instance._indexed_vector_ids = _vector_ids(resource_id=instance.pk)
+
+
+@receiver(post_delete, sender=Resource)
+def purge_resource_vectors(sender, instance, **kwargs):
+    ids, owner_id = getattr(instance, "_indexed_vector_ids", None), instance.owner_id
+    if not ids:
+        return
+    # Logged after the delete, which already holds the Resource row: the same lock order as index_resource.
+    _log_changes(ResourceChunkChange.KIND_RESOURCE_DELETED, [instance.pk])
+
+    def purge():
+        delete_resource_chunks(owner_id, ids)
+        bump_index_version()
+        invalidate_answers(owner_id)
+        logging.info(f"🗑️ Deleted {len(ids)} vectors of resource {instance.pk}")
+    _on_commit_safely(f"Deleting vectors of resource {instance.pk}", purge)
+
+
+@receiver(pre_delete, sender=settings.AUTH_USER_MODEL)
+def remember_owned_resources(sender, instance, **kwargs):
+    """Resources outlive their owner (SET_NULL, a queryset update that sends no save signals)."""
+    instance._owned_resources = (
+        _vector_ids(resource__owner_id=instance.pk),
+        list(Resource.objects.filter(owner_id=instance.pk).values_list("pk", flat=True)),
+    )
+
+
+@receiver(post_delete, sender=settings.AUTH_USER_MODEL)
+def detach_owned_resource_vectors(sender, instance, **kwargs):
+    ids, resource_ids = getattr(instance, "_owned_resources", ([], []))
+    owner_id = instance.pk
+    if not ids:
+        return
+    _log_changes(ResourceChunkChange.KIND_OWNER_CHANGED, resource_ids)
+
+    def detach():
+        reassign_resource_chunks(owner_id, None, ids)
+        bump_index_version()
+        invalidate_answers(owner_id)
+        logging.info(f"📦 Detached {len(ids)} resource vectors from deleted user {owner_id}")
+    _on_commit_safely(f"Detaching resource vectors of user {owner_id}", detach)
+
+
+@receiver(post_save, sender=settings.AUTH_USER_MODEL)
+@receiver(post_delete, sender=settings.AUTH_USER_MODEL)
+def forget_cached_socket_user(sender, instance, **kwargs):
+    """Deactivation, password changes and deletes reach new WebSocket connections immediately."""
+    forget_user(instance.pk)
@@ -0,0 +1,48 @@
+# backend/chatbot/tasks.py
+import logging
+from celery import shared_task
+from .answer_cache import purge_expired_answers
+from .archival import archive_old_history
+from .models import IngestionJob
+from .tracing import stage
+from .utils import index_resource
+
+
+@shared_task(acks_late=True)
+def ingest_resource(job_id):
+    """Chunk, batch-embed and upsert one Resource, recording progress on its job."""
+    try:
+        job = IngestionJob.objects.select_related("resource").get(pk=job_id)
+    except IngestionJob.DoesNotExist:
+        logging.warning(f"⚠️ Ingestion job {job_id} no longer exists")
+        return
+
+    IngestionJob.objects.filter(pk=job.pk).update(status=IngestionJob.STATUS_RUNNING, processed_chunks=0)
+
+    def report(done, total):
+        IngestionJob.objects.filter(pk=job.pk).update(processed_chunks=done, total_chunks=total)
+
+    try:
+        with stage("index.resource", resource_id=job.resource_id):
+            total = index_resource(job.resource, progress=report)
+    except Exception as e:
+        logging.error(f"❌ Ingestion job {job_id} failed: {e}", exc_info=True)
+        IngestionJob.objects.filter(pk=job.pk).update(status=IngestionJob.STATUS_FAILED, error=str(e))
+        raise
+
+    IngestionJob.objects.filter(pk=job.pk).update(
+        status=IngestionJob.STATUS_SUCCEEDED, total_chunks=total, processed_chunks=total
+    )
+    logging.info(f"📚 Indexed resource {job.resource_id} ({total} chunks)")
+
+
+@shared_task
+def archive_chat_history():
+    """Move ChatHistory rows past CHAT_ARCHIVE['RETENTION_DAYS'] into compressed archives."""
+    return archive_old_history()
+
+
+@shared_task
+def purge_answer_cache():
+    """Delete semantic-cache answers older than ANSWER_CACHE['TTL']."""
+    return purge_expired_answers()
@@ -0,0 +1,126 @@
+import asyncio
+import time
+from unittest import mock, skipUnless
+
+from django.test import SimpleTestCase, TestCase, override_settings
+
+from ..admission import AdmissionRejected, DEFAULT_ADMISSION, LocalAdmission, RedisAdmission, client_address
+from ..consumers import ChatConsumer
+
+try:
+    import fakeredis
+except ImportError:  # optional test dependency
+    fakeredis = None
+
+
+class LocalAdmissionTests(TestCase):
+    def admission(self, **overrides):
+        return LocalAdmission({**DEFAULT_ADMISSION, **overrides})
+
+    async def test_a_user_at_its_limit_does_not_block_the_queue(self):
+        admission = self.admission(GLOBAL_CONCURRENCY=2, USER_CONCURRENCY=1, USER_QUEUE_SIZE=5)
+        release_a = await admission.acquire("a")
+        release_b = await admission.acquire("b")
+        second_a = asyncio.ensure_future(admission.acquire("a"))
+        first_c = asyncio.ensure_future(admission.acquire("c"))
+        await asyncio.sleep(0)
+        await release_b()
+        release_c = await asyncio.wait_for(first_c, 1)
+        self.assertFalse(second_a.done())
+        await release_a()
+        await (await asyncio.wait_for(second_a, 1))()
+        await release_c()
+        self.assertEqual(admission._active, 0)
+
+    async def test_full_queue_and_timeout_are_rejected(self):
+        admission = self.admission(GLOBAL_CONCURRENCY=1, QUEUE_SIZE=1, QUEUE_TIMEOUT=0.05)
+        release = await admission.acquire("a")
+        waiting = asyncio.ensure_future(admission.acquire("b"))
+        await asyncio.sleep(0)
+        with self.assertRaises(AdmissionRejected) as rejected:
+            await admission.acquire("c")
+        self.assertEqual(rejected.exception.reason, "queue_full")
+        with self.assertRaises(AdmissionRejected) as rejected:
+            await waiting
+        self.assertEqual(rejected.exception.reason, "queue_timeout")
+        await release()
+
+    async def test_empty_bucket_reports_retry_after(self):
+        admission = self.admission(RATE=1, BURST=2)
+        await admission.take_token("a")
+        await admission.take_token("a")
+        with self.assertRaises(AdmissionRejected) as rejected:
+            await admission.take_token("a")
+        self.assertEqual(rejected.exception.reason, "rate_limited")
+        self.assertGreater(rejected.exception.retry_after, 0)
+
+
+class RedisAdmissionTests(TestCase):
+    def admission(self, **overrides):
+        config = {**DEFAULT_ADMISSION, "POLL_INTERVAL": 0.01, **overrides}
+        admission = RedisAdmission(config, LocalAdmission(config))
+        server = fakeredis.FakeServer()
+        patcher = mock.patch("chatbot.admission.aioredis.from_url",
+                             lambda url: fakeredis.FakeAsyncRedis(server=server))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        return admission
+
+    @skipUnless(fakeredis, "fakeredis is not installed")
+    async def test_queued_tickets_report_position_and_are_granted_in_turn(self):
+        admission = self.admission(GLOBAL_CONCURRENCY=1)
+        release_a = await admission.acquire("a")
+        positions = []
+
+        async def report(position):
+            positions.append(position)
+        waiting = asyncio.ensure_future(admission.acquire("b", report))
+        await asyncio.sleep(0.05)
+        self.assertFalse(waiting.done())
+        self.assertEqual(positions, [1])
+        await release_a()
+        await (await asyncio.wait_for(waiting, 1))()
+        self.assertEqual(await admission._client.zcard(admission._key("active")), 0)
+
+    @skipUnless(fakeredis, "fakeredis is not installed")
+    async def test_lease_is_renewed_while_the_turn_runs(self):
+        admission = self.admission(GLOBAL_CONCURRENCY=1, LEASE_SECONDS=0.3, QUEUE_TIMEOUT=0.6)
+        release = await admission.acquire("a")
+        started_ms = time.time() * 1000
+        await asyncio.sleep(0.5)
+        (_, expires_ms), = await admission._client.zrange(admission._key("active"), 0, -1, withscores=True)
+        self.assertGreater(expires_ms, started_ms + 300)
+        with self.assertRaises(AdmissionRejected) as rejected:
+            await admission.acquire("b")
+        self.assertEqual(rejected.exception.reason, "queue_timeout")
+        await release()
+
+
+class GuestKeyTests(SimpleTestCase):
+    scope = {"client": ["10.0.0.2", 5123], "headers": [(b"x-forwarded-for", b"1.2.3.4, 203.0.113.9")]}
+
+    def test_forwarded_address_is_only_believed_from_a_trusted_proxy(self):
+        self.assertEqual(client_address(self.scope), "10.0.0.2")
+        with override_settings(ADMISSION={"TRUSTED_PROXIES": ["10.0.0.2"]}):
+            self.assertEqual(client_address(self.scope), "203.0.113.9")
+        self.assertEqual(client_address({}), "")
+
+
+class SocketTurnQueueTests(SimpleTestCase):
+    async def test_a_second_message_is_told_it_is_queued_behind_the_first(self):
+        consumer = ChatConsumer()
+        consumer._turn_lock = asyncio.Lock()
+        consumer._admission_key = "user:1"
+        consumer.send_frame = mock.AsyncMock()
+        finish = asyncio.Event()
+
+        async def stream(*args):
+            await finish.wait()
+        consumer.stream_answer = stream
+        consumer._answer_tasks = set()
+        for _ in range(2):
+            consumer._answer_tasks.add(asyncio.ensure_future(consumer.answer("q", None, None, "1")))
+        await asyncio.sleep(0.01)
+        consumer.send_frame.assert_awaited_once_with({"type": "status", "value": "queued", "position": 1})
+        finish.set()
+        await asyncio.gather(*consumer._answer_tasks)
@@ -0,0 +1,41 @@
+import time
+from unittest import mock
+
+from django.test import SimpleTestCase, override_settings
+
+from ..answer_cache import lookup_answer, purge_expired_answers, replay_chunks, store_answer
+from ..vector_store import get_answer_cache_collection
+
+
+@override_settings(ANSWER_CACHE={"ENABLED": True, "SIMILARITY": 0.9, "TTL": 60})
+class AnswerCacheTests(SimpleTestCase):
+    def setUp(self):
+        collection = get_answer_cache_collection()
+        ids = collection.get(include=[])["ids"]
+        if ids:
+            collection.delete(ids=ids)
+
+    def store(self, answer, embedding, student_id="7", personal=False, age=0.0):
+        with mock.patch("chatbot.answer_cache.time.time", return_value=time.time() - age):
+            store_answer(student_id, "q", embedding, answer, personal, 1.5)
+
+    def test_personal_answers_are_only_replayed_to_their_owner(self):
+        self.store("mine", [1.0, 0.0, 0.0], personal=True)
+        self.assertEqual(lookup_answer("7", [1.0, 0.0, 0.0])["answer"], "mine")
+        self.assertIsNone(lookup_answer("8", [1.0, 0.0, 0.0]))
+        self.assertIsNone(lookup_answer("7", [1.0, 0.0, 0.0], authenticated=False))
+
+    def test_expired_entries_neither_match_nor_crowd_out_fresh_ones(self):
+        for i in range(3):
+            self.store(f"stale {i}", [1.0, 0.0, 0.001 * i], age=120)
+        self.store("fresh", [0.98, 0.0, 0.2])
+        self.assertEqual(lookup_answer("7", [1.0, 0.0, 0.0])["answer"], "fresh")
+
+        self.assertEqual(purge_expired_answers(), 3)
+        self.assertEqual(get_answer_cache_collection().count(), 1)
+
+    def test_replay_chunks_split_on_word_boundaries(self):
+        answer = "word " * 100
+        parts = list(replay_chunks(answer, size=42))
+        self.assertEqual("".join(parts), answer)
+        self.assertTrue(all(p.endswith(" ") for p in parts))
@@ -0,0 +1,38 @@
+import os
+import tempfile
+from unittest import mock
+
+from django.test import SimpleTestCase, override_settings
+
+from .. import audio_cache
+from ..audio_cache import AudioCache, audio_key, cached_audio
+
+
+class AudioCacheTests(SimpleTestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+
+    def test_least_recently_used_files_are_evicted_past_the_budget(self):
+        cache = AudioCache(self.directory.name, max_bytes=300, rescan_fraction=1.0)
+        for i, key in enumerate("abc"):
+            cache.put(key * 64, b"x" * 100)
+            os.utime(cache._path(key * 64), (i, i))
+        cache.get("a" * 64)  # now the most recently used
+        cache.put("d" * 64, b"x" * 100)
+        self.assertIsNone(cache.get("b" * 64))
+        self.assertEqual(cache.get("a" * 64), b"x" * 100)
+        self.assertLessEqual(cache._size, 300)
+
+    def test_key_ignores_spacing_but_not_voice_or_encoding(self):
+        self.assertEqual(audio_key("Hello  world\n", "v", "MP3"), audio_key("Hello world", "v", "MP3"))
+        self.assertNotEqual(audio_key("Hello", "v", "MP3"), audio_key("Hello", "v", "OGG_OPUS"))
+        self.assertNotEqual(audio_key("Hello", "v", "MP3"), audio_key("Hello", "w", "MP3"))
+
+    def test_synthesize_runs_only_on_a_miss(self):
+        synthesize = mock.Mock(return_value=b"audio")
+        with override_settings(TTS_AUDIO_CACHE={"DIR": self.directory.name}), \
+                mock.patch.object(audio_cache, "_cache", None):
+            self.assertEqual(cached_audio("Hi there", "v", "MP3", synthesize), b"audio")
+            self.assertEqual(cached_audio("Hi  there", "v", "MP3", synthesize), b"audio")
+        synthesize.assert_called_once()
@@ -0,0 +1,43 @@
+import asyncio
+from unittest import mock
+
+from django.test import TestCase
+
+from ..audio_stream import AUDIO_HEADER, AudioStreamer
+from ..tts import SentenceSegmenter
+
+
+class AudioStreamTests(TestCase):
+    def test_short_sentences_are_merged_and_run_ons_cut(self):
+        segmenter = SentenceSegmenter(min_chars=20, max_chars=50)
+        self.assertEqual(segmenter.feed("Hi. Ok. "), [])
+        self.assertEqual(segmenter.feed("This one is long enough. Next"), ["Hi. Ok. This one is long enough."])
+        segments = segmenter.feed(" word" * 20)
+        self.assertTrue(segments and all(len(s) <= 50 for s in segments))
+        self.assertEqual(len(segmenter.flush()), 1)
+        self.assertEqual(segmenter.flush(), [])
+
+    async def test_frames_go_out_in_order_whatever_finishes_first(self):
+        class Consumer:
+            def __init__(self):
+                self.frames, self.binary = [], []
+
+            async def send_frame(self, payload):
+                self.frames.append(payload)
+
+            async def send(self, bytes_data=None):
+                self.binary.append(AUDIO_HEADER.unpack(bytes_data[:AUDIO_HEADER.size])[1])
+
+        async def synthesize(text):
+            await asyncio.sleep(0.03 if text.startswith("First") else 0)
+            return b"audio"
+
+        consumer = Consumer()
+        streamer = AudioStreamer(consumer)
+        with mock.patch.object(streamer, "_synthesize", synthesize):
+            await streamer.feed("First sentence is slow to synthesize here. Second sentence comes back quickly from synthesis. ")
+            await streamer.feed("Third part arrives at the end")
+            await streamer.finish()
+        self.assertEqual(consumer.binary, [0, 1, 2])
+        self.assertEqual(consumer.frames[0]["type"], "audio_start")
+        self.assertEqual(consumer.frames[-1], {"type": "audio_end", "segments": 3})
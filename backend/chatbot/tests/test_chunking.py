@@ -0,0 +1,27 @@
+from django.test import TestCase
+
+from ..chunking import Chunk, chunk_text, structured_chunks
+from ..prompting import estimate_tokens
+
+
+class ChunkingTests(TestCase):
+    def test_chunks_stay_near_target_and_keep_their_heading(self):
+        sentence = "Integration accumulates change over an interval of the real line. "
+        content = "# Calculus\n\n" + sentence * 40 + "\n\nLIMITS\n\nA limit describes behaviour near a point."
+        chunks = structured_chunks(content, target_tokens=60, overlap_tokens=10)
+        self.assertGreater(len(chunks), 2)
+        for text in chunks[:-1]:
+            self.assertTrue(text.startswith("Calculus\n"))
+            self.assertLessEqual(estimate_tokens(text), 60 + estimate_tokens("Calculus\n"))
+        self.assertTrue(chunks[-1].startswith("LIMITS\n"))
+
+    def test_consecutive_chunks_overlap_by_whole_sentences(self):
+        content = " ".join(f"Sentence number {i} talks about derivatives." for i in range(40))
+        chunks = structured_chunks(content, target_tokens=50, overlap_tokens=12)
+        last_sentence = chunks[0].rsplit(". ", 1)[-1]
+        self.assertIn(last_sentence, chunks[1])
+
+    def test_chunk_text_numbers_chunks_and_hashes_ignore_spacing(self):
+        chunks = chunk_text("one two three " * 500, strategy="fixed")
+        self.assertEqual([c.position for c in chunks], list(range(len(chunks))))
+        self.assertEqual(Chunk("a  b\n", 0).content_hash, Chunk("a b", 3).content_hash)
@@ -0,0 +1,43 @@
+import tempfile
+
+import numpy as np
+from django.test import TestCase
+
+from ..compact_store import CompactClient, quantize
+
+
+class CompactStoreTests(TestCase):
+    def setUp(self):
+        self.client = CompactClient(tempfile.mkdtemp(), "int8", promote_at=10_000, max_segments=3)
+        self.collection = self.client.get_or_create_collection(
+            "student_1", configuration={"hnsw": {"space": "cosine"}}
+        )
+        self.vectors = np.random.default_rng(0).standard_normal((50, 16)).astype(np.float32)
+
+    def test_int8_keeps_vectors_close(self):
+        stored, scales = quantize(self.vectors, "int8")
+        self.assertEqual(stored.dtype, np.int8)
+        restored = stored.astype(np.float32) * scales[:, None]
+        self.assertLess(np.abs(restored - self.vectors).max(), np.abs(self.vectors).max() / 100)
+
+    def test_query_finds_nearest_after_many_small_writes(self):
+        for i, vector in enumerate(self.vectors):
+            self.collection.upsert(ids=[f"d{i}"], embeddings=[vector.tolist()], documents=[f"doc {i}"],
+                                   metadatas=[{"parity": i % 2}])
+        self.assertEqual(self.collection.count(), 50)
+        self.assertLessEqual(len(self.collection._load().segments), 3)
+        result = self.collection.query([self.vectors[7].tolist()], n_results=3)
+        self.assertEqual(result["ids"][0][0], "d7")
+        result = self.collection.query([self.vectors[7].tolist()], n_results=3, where={"parity": 0})
+        self.assertNotIn("d7", result["ids"][0])
+
+    def test_deletes_and_updates_are_visible_to_other_clients(self):
+        ids = [f"d{i}" for i in range(10)]
+        self.collection.upsert(ids=ids, embeddings=self.vectors[:10].tolist(), documents=ids)
+        self.collection.delete(ids=["d1"])
+        self.collection.update(ids=["d2"], documents=["changed"])
+        reader = CompactClient(self.client.path, "int8").get_collection("student_1")
+        self.assertEqual(reader.count(), 9)
+        self.assertEqual(reader.get(ids=["d1", "d2"])["documents"], ["changed"])
+        self.collection.upsert(ids=["d1"], embeddings=[self.vectors[1].tolist()], documents=["back"])
+        self.assertEqual(reader.get(ids=["d1"])["documents"], ["back"])
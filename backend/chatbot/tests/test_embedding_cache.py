@@ -0,0 +1,27 @@
+import uuid
+
+from django.test import SimpleTestCase
+
+from ..embedding_cache import DEFAULT_CACHE, EmbeddingCache
+
+
+class EmbeddingCacheTests(SimpleTestCase):
+    def setUp(self):
+        # A fresh model name keeps entries from earlier runs out of the on-disk shared tier.
+        self.model = f"test-{uuid.uuid4().hex}"
+
+    def cache(self, **overrides):
+        return EmbeddingCache(self.model, {**DEFAULT_CACHE, **overrides})
+
+    def test_other_workers_read_through_the_shared_tier(self):
+        self.cache().set_many({"Hello  world": [0.5, -1.0]})
+        other = self.cache()
+        self.assertEqual(other.get_many([" Hello\nworld", "unseen"]), {" Hello\nworld": [0.5, -1.0]})
+        # Now promoted to the reader's local tier.
+        self.assertEqual(other._local.currsize, 1)
+
+    def test_without_a_shared_alias_entries_stay_in_process(self):
+        local = self.cache(SHARED_ALIAS="")
+        local.set_many({"a": [1.0]})
+        self.assertEqual(local.get_many(["a"]), {"a": [1.0]})
+        self.assertEqual(self.cache(SHARED_ALIAS="").get_many(["a"]), {})
@@ -0,0 +1,33 @@
+import threading
+
+from django.test import SimpleTestCase
+
+from ..embedding_service import MicroBatcher
+
+
+class MicroBatcherTests(SimpleTestCase):
+    def test_requests_in_one_window_share_a_batch(self):
+        calls = []
+        batcher = MicroBatcher(lambda texts: calls.append(list(texts)) or [[len(t)] for t in texts],
+                               max_batch_size=8, max_wait_ms=200)
+        first, second = batcher.submit(["a", "bb"]), batcher.submit(["ccc"])
+        self.assertEqual(first.result(timeout=5), [[1], [2]])
+        self.assertEqual(second.result(timeout=5), [[3]])
+        self.assertEqual(calls, [["a", "bb", "ccc"]])
+
+    def test_cancelled_requests_are_skipped_and_the_worker_survives(self):
+        release, calls = threading.Event(), []
+
+        def encode(texts):
+            calls.append(list(texts))
+            release.wait(5)
+            return [[0.0] for _ in texts]
+
+        batcher = MicroBatcher(encode, max_batch_size=1, max_wait_ms=0)
+        running = batcher.submit(["running"])
+        abandoned = batcher.submit(["abandoned"])
+        self.assertTrue(abandoned.cancel())
+        release.set()
+        self.assertEqual(running.result(timeout=5), [[0.0]])
+        self.assertEqual(batcher.embed(["next"], timeout=5), [[0.0]])
+        self.assertNotIn(["abandoned"], calls)
@@ -0,0 +1,66 @@
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.test import TestCase
+
+from ..chunking import Chunk
+from ..models import Resource, ResourceChunk, ResourceChunkChange
+from ..utils import index_resource
+
+
+def paragraphs(content, **kwargs):
+    return [Chunk(text, i) for i, text in enumerate(content.split("\n\n"))]
+
+
+@mock.patch("chatbot.utils.invalidate_answers", mock.Mock())
+@mock.patch("chatbot.utils.bump_index_version", mock.Mock())
+@mock.patch("chatbot.utils.get_embeddings", lambda docs: [[0.0]] * len(docs))
+@mock.patch("chatbot.utils.chunk_text", paragraphs)
+class IndexResourceTests(TestCase):
+    def setUp(self):
+        self.resource = Resource.objects.create(title="Notes", content="alpha\n\nbeta\n\ngamma",
+                                                owner=User.objects.create_user("owner"))
+        patchers = [mock.patch("chatbot.utils.add_resource_chunks"), mock.patch("chatbot.utils.delete_resource_chunks")]
+        self.upsert, self.delete = [p.start() for p in patchers]
+        for p in patchers:
+            self.addCleanup(p.stop)
+
+    def upserted(self):
+        return [doc for call in self.upsert.call_args_list for doc in call.args[2]]
+
+    def rows(self):
+        return list(ResourceChunk.objects.filter(resource=self.resource).order_by("position")
+                    .values_list("text", "position"))
+
+    def edit(self, content):
+        Resource.objects.filter(pk=self.resource.pk).update(content=content)
+        self.resource.content = content
+
+    def test_only_changed_chunks_are_embedded_and_stale_ones_removed(self):
+        self.assertEqual(index_resource(self.resource), 3)
+        alpha = ResourceChunk.objects.get(text="alpha")
+        self.upsert.reset_mock()
+
+        self.edit("beta\n\ngamma\n\ndelta")
+        self.assertEqual(index_resource(self.resource), 3)
+        self.assertEqual(self.upserted(), ["delta"])
+        self.delete.assert_called_once_with(self.resource.owner_id, [alpha.vector_id])
+        self.assertEqual(self.rows(), [("beta", 0), ("gamma", 1), ("delta", 2)])
+        self.assertTrue(ResourceChunkChange.objects.filter(
+            kind=ResourceChunkChange.KIND_CHUNK_DELETED, chunk_id=alpha.pk).exists())
+
+        self.upsert.reset_mock()
+        self.delete.reset_mock()
+        index_resource(self.resource)
+        self.upsert.assert_not_called()
+        self.delete.assert_not_called()
+
+    def test_a_job_overtaken_by_a_newer_edit_indexes_the_newer_content(self):
+        stale = Resource.objects.get(pk=self.resource.pk)
+        self.edit("alpha\n\nomega")
+        self.assertEqual(index_resource(stale), 2)
+        self.assertEqual(self.rows(), [("alpha", 0), ("omega", 1)])
+        # beta and gamma were embedded for the old content and are dropped again.
+        orphans = self.delete.call_args.args[1]
+        self.assertEqual(len(orphans), 2)
+        self.assertIn("omega", self.upserted())
@@ -0,0 +1,53 @@
+import asyncio
+
+from django.test import TestCase, override_settings
+
+from ..fake_providers import FakeGeminiClient
+from ..inflight import _flights, shared_stream
+
+
+FAST_FAKES = {"FIRST_TOKEN_MS": 20, "TOKENS_PER_SECOND": 4000, "CHUNK_TOKENS": 4, "ANSWER_TOKENS": 24,
+              "TTS_LATENCY_MS": 0, "TTS_MS_PER_CHAR": 0}
+
+
+@override_settings(FAKE_PROVIDERS=FAST_FAKES, CHAT_COALESCING={"LINGER_SECONDS": 0})
+class SharedStreamTests(TestCase):
+    def setUp(self):
+        _flights.clear()
+        self.generations = 0
+        self.gemini = FakeGeminiClient()
+
+    async def generate(self, prompt):
+        self.generations += 1
+        stream = await self.gemini.aio.models.generate_content_stream(model="fake", contents=prompt)
+        async for chunk in stream:
+            yield chunk.text
+
+    async def read(self, stream):
+        return "".join([part async for part in stream])
+
+    async def test_identical_global_questions_share_one_generation(self):
+        prompt = "system\n\nContext:\ndocs\n\nHistory:\n\n\nUser: q\nAnswer:"
+        first = shared_stream("What is a limit?", prompt, False, self.generate)
+        second = shared_stream("what is a LIMIT", prompt, False, self.generate)
+        answers = await asyncio.gather(self.read(first), self.read(second))
+        self.assertEqual(self.generations, 1)
+        self.assertTrue(second.joined)
+        self.assertEqual(answers[0], answers[1])
+        self.assertEqual([first.should_store(), second.should_store()], [True, False])
+
+    async def test_personal_turns_are_not_shared(self):
+        first = shared_stream("q", "p", True, self.generate)
+        second = shared_stream("q", "p", True, self.generate)
+        await asyncio.gather(self.read(first), self.read(second))
+        self.assertEqual(self.generations, 2)
+        self.assertTrue(first.should_store() and second.should_store())
+
+    async def test_generation_stops_when_every_subscriber_leaves(self):
+        stream = shared_stream("q", "p", False, self.generate)
+        iterator = stream.__aiter__()
+        await iterator.__anext__()
+        await stream.aclose()
+        await asyncio.sleep(0)
+        self.assertTrue(stream.flight._task.cancelled() or stream.flight._task.done())
+        self.assertNotIn(stream.flight.key, _flights)
@@ -0,0 +1,72 @@
+import hashlib
+
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.test import TestCase
+
+from ..lexical_index import LexicalIndex, tokenize
+from ..models import IndexVersion, Resource, ResourceChunk, ResourceChunkChange
+
+
+def write_chunk(resource, text, pk=None):
+    with transaction.atomic():
+        sequence = IndexVersion.claim_sequence()
+        return ResourceChunk.objects.create(
+            pk=pk, resource=resource, position=0, content_hash=hashlib.sha256(text.encode()).hexdigest(),
+            vector_id=f"{resource.pk}:{text[:10]}", text=text, sequence=sequence,
+        )
+
+
+class LexicalIndexTests(TestCase):
+    def setUp(self):
+        self.owner = User.objects.create_user("owner")
+        self.resource = Resource.objects.create(title="Notes", content="x", owner=self.owner)
+        self.index = LexicalIndex()
+        self.index.build()
+
+    def found(self, query, student_id=None):
+        return self.index.search(query, k=5, student_id=student_id)
+
+    def test_tokenize_splits_codes_and_drops_stopwords(self):
+        self.assertEqual(tokenize("What is CS-101?"), ["cs-101", "cs", "101"])
+
+    def test_refresh_applies_new_rows_owner_moves_and_deletes(self):
+        chunk = write_chunk(self.resource, "photosynthesis converts light")
+        self.index.refresh()
+        self.assertEqual(self.found("photosynthesis", self.owner.pk), [("photosynthesis converts light", True)])
+
+        self.resource.owner = None
+        self.resource.save()
+        self.index.refresh()
+        self.assertEqual(self.found("photosynthesis", self.owner.pk), [("photosynthesis converts light", False)])
+
+        with transaction.atomic():
+            sequence = IndexVersion.claim_sequence()
+            chunk_id = chunk.pk
+            chunk.delete()
+            ResourceChunkChange.objects.create(kind=ResourceChunkChange.KIND_CHUNK_DELETED,
+                                               resource_id=self.resource.pk, chunk_id=chunk_id, sequence=sequence)
+        write_chunk(self.resource, "chlorophyll absorbs light")
+        self.index.refresh()
+        self.assertEqual(self.found("photosynthesis"), [])
+        self.resource.delete()
+        self.index.refresh()
+        self.assertEqual(len(self.index), 0)
+
+    def test_rows_committed_out_of_pk_order_are_not_skipped(self):
+        write_chunk(self.resource, "mitochondria powerhouse", pk=500)
+        self.index.refresh()
+        # A concurrent ingest that took a lower id commits afterwards.
+        write_chunk(self.resource, "ribosome synthesis", pk=20)
+        self.index.refresh()
+        self.assertEqual(len(self.found("ribosome")), 1)
+
+    def test_rows_of_uncommitted_sequences_wait_for_a_later_refresh(self):
+        pending = IndexVersion.committed_sequence() + 1
+        ResourceChunk.objects.create(resource=self.resource, position=0, content_hash="h", vector_id="v",
+                                     text="osmosis membrane", sequence=pending)
+        self.index.refresh()
+        self.assertEqual(self.found("osmosis"), [])
+        IndexVersion.objects.update_or_create(pk=1, defaults={"sequence": pending})
+        self.index.refresh()
+        self.assertEqual(len(self.found("osmosis")), 1)
@@ -0,0 +1,78 @@
+import asyncio
+import datetime
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.test import TestCase
+from django.utils import timezone
+
+from .. import persistence
+from ..consumers import ChatConsumer
+from ..models import ChatHistory
+from ..persistence import ChatTurn, WriteBehindQueue, write_turns
+from ..prompting import load_history
+
+
+@mock.patch("chatbot.persistence.add_memories")
+class WriteBehindTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user("student")
+        # A long interval keeps the background thread idle; tests flush on their own thread.
+        self.queue = WriteBehindQueue(flush_interval=3600, max_batch=10, max_pending=2)
+        self.addCleanup(self.queue.stop)
+
+    def turn(self, question, **kwargs):
+        return ChatTurn(student_id=str(self.user.pk), question=question, answer=f"re: {question}",
+                        user_id=self.user.pk, embedding=[0.0], **kwargs)
+
+    def test_rows_keep_the_time_the_turn_finished(self, add_memories):
+        finished = timezone.now() - datetime.timedelta(minutes=5)
+        write_turns([self.turn("first", created_at=finished),
+                     ChatTurn(student_id="guest", question="hi", answer="hello", embedding=[0.0])])
+        self.assertEqual(list(ChatHistory.objects.values_list("question", "created_at")), [("first", finished)])
+        self.assertEqual(len(add_memories.call_args.args[0]), 2)
+
+    def test_full_queue_refuses_and_flush_writes_in_order(self, add_memories):
+        self.assertTrue(self.queue.submit(self.turn("one")))
+        self.assertTrue(self.queue.submit(self.turn("two")))
+        self.assertFalse(self.queue.submit(self.turn("three")))
+        self.assertEqual([t.question for t in self.queue.pending_for(self.user.pk)], ["one", "two"])
+        self.queue.flush()
+        self.assertEqual(len(self.queue), 0)
+        self.assertEqual(self.queue.pending_for(self.user.pk), [])
+        self.assertEqual(list(ChatHistory.objects.order_by("created_at").values_list("question", flat=True)),
+                         ["one", "two"])
+
+    def test_history_includes_unflushed_turns_once(self, add_memories):
+        write_turns([self.turn("stored", created_at=timezone.now() - datetime.timedelta(minutes=1))])
+        self.queue.submit(self.turn("queued"))
+        with mock.patch.object(persistence, "_queue", self.queue):
+            _, turns, _ = load_history(self.user)
+            self.assertEqual([q for q, _ in turns], ["queued", "stored"])
+            # Mid-flush the turn is both written and still tracked by the queue.
+            write_turns(self.queue._take())
+            _, turns, _ = load_history(self.user)
+        self.assertEqual([q for q, _ in turns], ["queued", "stored"])
+
+
+class PersistOnCancelTests(TestCase):
+    async def test_cancel_during_persist_does_not_write_the_turn_twice(self):
+        consumer = ChatConsumer()
+        consumer._coalescer = None
+        consumer.send_frame = mock.AsyncMock()
+        consumer.send_partial = mock.AsyncMock()
+        entered = asyncio.Event()
+
+        async def slow_persist(*args):
+            entered.set()
+            await asyncio.Event().wait()
+
+        cached = {"scope": "global", "similarity": 1.0, "answer": "Cached answer."}
+        with mock.patch("chatbot.consumers.run_cpu", mock.AsyncMock(side_effect=[[0.0], cached])), \
+                mock.patch.object(consumer, "persist", mock.AsyncMock(side_effect=slow_persist)) as persist:
+            task = asyncio.create_task(consumer.stream_answer("q", "none", None, "guest"))
+            await entered.wait()
+            task.cancel()
+            with self.assertRaises(asyncio.CancelledError):
+                await task
+        self.assertEqual(persist.await_count, 1)
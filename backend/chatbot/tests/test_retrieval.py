@@ -0,0 +1,37 @@
+from unittest import mock
+
+from django.core.cache import caches
+from django.test import TestCase, override_settings
+
+from .. import retrieval
+from ..retrieval import fuse, global_results, reciprocal_rank_fusion
+
+
+class FuseTests(TestCase):
+    def test_documents_found_by_several_retrievers_rank_first(self):
+        self.assertEqual(reciprocal_rank_fusion([["a", "b", "c"], ["c", "b"], ["b"]])[0], "b")
+
+    def test_personal_only_when_a_personal_document_survives_the_cut(self):
+        student = [("mine", True)]
+        global_ = [("g1", False), ("g2", False)]
+        lexical = [("g1", False), ("g2", False)]
+        documents, personal = fuse(student, global_, lexical, top_k=2)
+        self.assertEqual(documents, ["g1", "g2"])
+        self.assertFalse(personal)
+        documents, personal = fuse(student, global_, lexical, top_k=3)
+        self.assertIn("mine", documents)
+        self.assertTrue(personal)
+
+
+@override_settings(RETRIEVAL={"GLOBAL_CACHE": True})
+class GlobalResultsCacheTests(TestCase):
+    def setUp(self):
+        caches["shared"].clear()
+        retrieval._local_results = None
+
+    def test_results_are_cached_per_index_version_and_not_when_it_is_unknown(self):
+        with mock.patch("chatbot.retrieval.query_global", side_effect=lambda e, k: [("doc", None)]) as query, \
+                mock.patch("chatbot.retrieval.index_version", side_effect=[41, 41, None, None]):
+            for _ in range(4):
+                self.assertEqual(global_results("What is osmosis?", [0.0], 3), [("doc", None)])
+        self.assertEqual(query.call_count, 3)
@@ -0,0 +1,89 @@
+import datetime
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from ..models import ChatHistory, IngestionJob, Resource
+
+
+class ChatHistoryViewTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user("student")
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_pages_walk_back_in_time_without_repeats_or_gaps(self):
+        now = timezone.now()
+        # Two turns share a timestamp: the id tiebreak keeps them apart across pages.
+        times = [now - datetime.timedelta(minutes=i) for i in (0, 1, 1, 2, 3)]
+        ChatHistory.objects.bulk_create([ChatHistory(user=self.user, question=f"q{i}", answer="a", created_at=t)
+                                         for i, t in enumerate(times)])
+        ChatHistory.objects.create(user=User.objects.create_user("other"), question="not mine", answer="a")
+
+        seen, url = [], "/api/chatbot/history/?limit=2"
+        while url:
+            page = self.client.get(url).json()
+            self.assertLessEqual(len(page["results"]), 2)
+            seen += [row["question"] for row in page["results"]]
+            url = page["next"]
+        self.assertEqual(seen, ["q0", "q2", "q1", "q3", "q4"])
+
+    def test_requires_authentication(self):
+        self.assertEqual(APIClient().get("/api/chatbot/history/").status_code, 401)
+
+
+class BulkIngestViewTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user("teacher")
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def post(self, resources):
+        return self.client.post("/api/chatbot/resources/bulk/", {"resources": resources}, format="json")
+
+    def test_jobs_are_queued_once_the_rows_commit(self):
+        with mock.patch("chatbot.views.ingest_resource") as task, \
+                self.captureOnCommitCallbacks(execute=True):
+            response = self.post([{"title": "A", "content": "alpha"}, {"title": "B", "content": "beta"}])
+            task.delay.assert_not_called()
+        self.assertEqual(response.status_code, 202)
+        jobs = response.json()["jobs"]
+        self.assertEqual(sorted(c.args[0] for c in task.delay.call_args_list), sorted(j["job_id"] for j in jobs))
+        self.assertEqual(Resource.objects.filter(owner=self.user).count(), 2)
+        self.assertEqual(set(IngestionJob.objects.values_list("status", flat=True)), {IngestionJob.STATUS_QUEUED})
+
+    @override_settings(INGEST_BULK_MAX_RESOURCES=2)
+    def test_invalid_or_oversized_batches_create_nothing(self):
+        response = self.post([{"title": "A", "content": "alpha"}, {"title": "", "content": "x"}])
+        self.assertEqual((response.status_code, response.json()["invalid_indexes"]), (400, [1]))
+        self.assertEqual(self.post([{"title": "t", "content": "c"}] * 3).status_code, 400)
+        self.assertEqual(self.post([]).status_code, 400)
+        self.assertFalse(Resource.objects.exists())
+
+
+class ReadinessViewTests(TestCase):
+    def test_not_ready_until_the_model_is_loaded(self):
+        with mock.patch("chatbot.views.model_ready", return_value=False):
+            response = self.client.get("/api/chatbot/health/ready/")
+        self.assertEqual((response.status_code, response.json()["ready"]), (503, False))
+        with mock.patch("chatbot.views.model_ready", return_value=True):
+            self.assertEqual(self.client.get("/api/chatbot/health/ready/").status_code, 200)
+
+
+class MetricsViewTests(TestCase):
+    url = "/api/chatbot/metrics/"
+
+    @override_settings(METRICS_TOKEN="")
+    def test_closed_without_a_configured_token(self):
+        self.assertEqual(self.client.get(self.url).status_code, 403)
+
+    @override_settings(METRICS_TOKEN="s3cret")
+    def test_needs_the_bearer_token(self):
+        self.assertEqual(self.client.get(self.url).status_code, 401)
+        self.assertEqual(self.client.get(self.url, HTTP_AUTHORIZATION="Bearer wrong").status_code, 401)
+        response = self.client.get(self.url, HTTP_AUTHORIZATION="Bearer s3cret")
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(b"# TYPE", response.content)
@@ -0,0 +1,40 @@
+import asyncio
+import zlib
+
+from django.test import TestCase
+
+from ..wire import FRAME_DEFLATE, PartialCoalescer, WireProtocol
+
+
+class WireTests(TestCase):
+    def test_negotiate_clamps_version_and_needs_v2_for_deflate(self):
+        self.assertEqual(WireProtocol.negotiate({"query_string": b""}).version, 1)
+        self.assertEqual(WireProtocol.negotiate({"query_string": b"protocol=9"}).version, 2)
+        self.assertEqual(WireProtocol.negotiate({"query_string": b"protocol=x"}).version, 1)
+        self.assertFalse(WireProtocol.negotiate({"query_string": b"compress=deflate"}).compress)
+        self.assertTrue(WireProtocol.negotiate({"query_string": b"protocol=2&compress=deflate"}).compress)
+
+    def test_deflated_frames_share_one_stream(self):
+        wire = WireProtocol(2, compress=True, config={"DEFLATE_MIN_BYTES": 10})
+        inflate = zlib.decompressobj(wbits=-15)
+        for reply in ("first answer " * 5, "second answer " * 5):
+            frame = wire.encode({"reply": reply})["bytes_data"]
+            self.assertEqual(frame[0], FRAME_DEFLATE)
+            self.assertIn(reply, inflate.decompress(frame[1:]).decode("utf-8"))
+        self.assertEqual(wire.encode({"a": 1}), {"text_data": '{"a":1}'})
+
+    async def test_coalescer_sends_first_partial_then_batches(self):
+        sent = []
+
+        async def send(payload):
+            sent.append(payload["text"])
+
+        coalescer = PartialCoalescer(send, window_ms=20, max_bytes=1000)
+        for part in ("a", "b", "c", "d"):
+            await coalescer.add(part)
+        self.assertEqual(sent, ["a"])
+        await asyncio.sleep(0.05)
+        self.assertEqual(sent, ["a", "bcd"])
+        await coalescer.add("x" * 1000)
+        self.assertEqual(sent[-1], "x" * 1000)
+        self.assertEqual(coalescer.frames, 3)
@@ -0,0 +1,100 @@
+import asyncio
+
+from django.contrib.auth.models import AnonymousUser, User
+from django.core.cache import caches
+from django.test import TestCase, TransactionTestCase, override_settings
+from rest_framework_simplejwt.tokens import AccessToken
+
+from .. import ws_auth
+from ..ws_auth import JWTAuthMiddleware, WebSocketAuthError, authenticate_token, forget_user
+
+
+def reset_caches():
+    ws_auth._local = None
+    caches["shared"].clear()
+
+
+class TokenAuthenticationTests(TestCase):
+    def setUp(self):
+        reset_caches()
+        self.user = User.objects.create_user("student", password="secret")
+        self.token = str(AccessToken.for_user(self.user))
+
+    def test_user_is_loaded_once_and_the_shared_tier_holds_no_password(self):
+        lookups = ws_auth._user_lookups.value
+        with self.assertNumQueries(1):
+            first = authenticate_token(self.token)
+            second = authenticate_token(self.token)
+        self.assertEqual((first.pk, second.username), (self.user.pk, "student"))
+        self.assertEqual(ws_auth._user_lookups.value, lookups + 1)
+        shared = caches["shared"].get(f"ws_auth:user:{self.user.pk}")
+        self.assertNotIn(self.user.password, shared["values"])
+
+        forget_user(self.user.pk)
+        with self.assertNumQueries(1):
+            authenticate_token(self.token)
+
+    def test_inactive_unknown_and_malformed_tokens_are_rejected(self):
+        User.objects.filter(pk=self.user.pk).update(is_active=False)
+        with self.assertRaisesMessage(WebSocketAuthError, "inactive"):
+            authenticate_token(self.token)
+        ghost = User(pk=self.user.pk + 100, username="ghost")
+        with self.assertRaisesMessage(WebSocketAuthError, "not found"):
+            authenticate_token(str(AccessToken.for_user(ghost)))
+        self.assertIsNone(caches["shared"].get(f"ws_auth:user:{ghost.pk}"))
+        with self.assertRaises(WebSocketAuthError):
+            authenticate_token("not-a-jwt")
+
+    @override_settings(SIMPLE_JWT={"CHECK_REVOKE_TOKEN": True})
+    def test_password_change_revokes_tokens_after_the_cache_is_dropped(self):
+        from rest_framework_simplejwt.settings import api_settings
+        from rest_framework_simplejwt.utils import get_md5_hash_password
+
+        # tokens.py keeps the api_settings it imported, so add the claim the way for_user would.
+        token = AccessToken.for_user(self.user)
+        token[api_settings.REVOKE_TOKEN_CLAIM] = get_md5_hash_password(self.user.password)
+        token = str(token)
+        authenticate_token(token)
+        self.user.set_password("changed")
+        self.user.save()
+        forget_user(self.user.pk)
+        with self.assertRaisesMessage(WebSocketAuthError, "password"):
+            authenticate_token(token)
+
+
+class MiddlewareTests(TransactionTestCase):
+    """Lookups run on the DB pool's threads, so rows must be committed."""
+
+    def setUp(self):
+        reset_caches()
+        self.user = User.objects.create_user("student")
+        self.token = str(AccessToken.for_user(self.user))
+
+    async def connect(self, **scope):
+        seen = {}
+
+        async def inner(scope, receive, send):
+            seen.update(scope)
+        await JWTAuthMiddleware(inner)({"type": "websocket", **scope}, None, None)
+        return seen
+
+    async def test_token_from_subprotocol_or_query_string(self):
+        scope = await self.connect(subprotocols=["bearer", self.token])
+        self.assertEqual((scope["user"].pk, scope["auth_subprotocol"]), (self.user.pk, "bearer"))
+        scope = await self.connect(query_string=f"token={self.token}".encode())
+        self.assertEqual((scope["user"].pk, scope["auth_subprotocol"]), (self.user.pk, None))
+
+    async def test_guests_and_bad_tokens(self):
+        scope = await self.connect()
+        self.assertIsInstance(scope["user"], AnonymousUser)
+        self.assertNotIn("auth_error", scope)
+        scope = await self.connect(query_string=b"token=garbage")
+        self.assertIsInstance(scope["user"], AnonymousUser)
+        self.assertIn("auth_error", scope)
+
+    async def test_concurrent_connects_share_one_lookup(self):
+        lookups = ws_auth._user_lookups.value
+        scopes = await asyncio.gather(*(self.connect(subprotocols=["bearer", self.token]) for _ in range(5)))
+        self.assertEqual({s["user"].pk for s in scopes}, {self.user.pk})
+        self.assertEqual(ws_auth._user_lookups.value, lookups + 1)
+        self.assertEqual(ws_auth._inflight, {})
@@ -0,0 +1,108 @@
+# backend/chatbot/tracing.py
+"""
+Per-stage latency for the chat pipeline.
+
+``stage(name)`` times a block into the ``stage_<name>_seconds`` histogram
+(always on; a few microseconds) and wraps it in an OpenTelemetry span. Spans
+are only recorded when ``TRACING['OTLP_ENDPOINT']`` is set, for a
+``SAMPLE_RATIO`` share of root spans (children follow their parent), and are
+exported in batches off the request path. Otherwise the OpenTelemetry API's
+no-op tracer is used.
+
+Executors copy contextvars into their threads, so spans started inside
+``run_cpu``/``run_db``/``run_network`` nest under the caller's span.
+"""
+import contextlib
+import functools
+import logging
+import threading
+import time
+
+from django.conf import settings
+
+from .metrics import histogram
+
+try:
+    from opentelemetry import trace
+except ImportError:  # histograms still work without the API
+    trace = None
+
+DEFAULT_TRACING = {
+    "ENABLED": True,
+    "OTLP_ENDPOINT": "",
+    "SAMPLE_RATIO": 0.05,
+    "SERVICE_NAME": "chatbot-backend",
+}
+
+STAGE_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+_configured = False
+_configure_lock = threading.Lock()
+
+
+def tracing_config() -> dict:
+    config = dict(DEFAULT_TRACING)
+    config.update(getattr(settings, "TRACING", {}))
+    return config
+
+
+def configure_tracing():
+    """Install the sampled OTLP tracer provider once per process, when configured."""
+    global _configured
+    with _configure_lock:
+        if _configured:
+            return
+        _configured = True
+        config = tracing_config()
+        if not (config["ENABLED"] and config["OTLP_ENDPOINT"]) or trace is None:
+            return
+        try:
+            from opentelemetry.exporter.otlp.proto.grpc.trace_exporter import OTLPSpanExporter
+            from opentelemetry.sdk.resources import Resource
+            from opentelemetry.sdk.trace import TracerProvider
+            from opentelemetry.sdk.trace.export import BatchSpanProcessor
+            from opentelemetry.sdk.trace.sampling import ParentBased, TraceIdRatioBased
+        except ImportError as e:
+            logging.warning(f"⚠️ OpenTelemetry SDK not available, tracing disabled: {e}")
+            return
+
+        provider = TracerProvider(
+            resource=Resource.create({"service.name": config["SERVICE_NAME"]}),
+            sampler=ParentBased(TraceIdRatioBased(float(config["SAMPLE_RATIO"]))),
+        )
+        provider.add_span_processor(BatchSpanProcessor(OTLPSpanExporter(endpoint=config["OTLP_ENDPOINT"])))
+        trace.set_tracer_provider(provider)
+        logging.info(f"🔭 Tracing {config['SAMPLE_RATIO']:.0%} of chat turns to {config['OTLP_ENDPOINT']}")
+
+
+def _tracer():
+    return trace.get_tracer("chatbot") if trace is not None else None
+
+
+def stage_histogram(name: str):
+    return histogram(f"stage_{name.replace('.', '_')}_seconds", STAGE_BUCKETS, f"Time spent in {name}")
+
+
+@contextlib.contextmanager
+def stage(name: str, **attributes):
+    """Time the block into ``stage_<name>_seconds`` and trace it as span ``name``."""
+    timer = stage_histogram(name)
+    tracer = _tracer()
+    started = time.monotonic()
+    try:
+        if tracer is None:
+            yield None
+        else:
+            with tracer.start_as_current_span(name, attributes=attributes or None) as span:
+                yield span
+    finally:
+        timer.observe(time.monotonic() - started)
+
+
+def traced(name: str, func):
+    """``func`` wrapped in ``stage(name)``, for handing to an executor."""
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        with stage(name):
+            return func(*args, **kwargs)
+    return wrapper
@@ -1,16 +1,27 @@
 # backend/chatbot/tts.py
 import base64
 import os
+import re
+import threading
 from google.cloud import texttospeech
+from .audio_cache import cached_audio
+from .tracing import stage
+
+# Encoding name -> (Google enum, content type sent to the client)
+AUDIO_FORMATS = {
+    "LINEAR16": (texttospeech.AudioEncoding.LINEAR16, "audio/wav"),
+    "MP3": (texttospeech.AudioEncoding.MP3, "audio/mpeg"),
+    "OGG_OPUS": (texttospeech.AudioEncoding.OGG_OPUS, "audio/ogg; codecs=opus"),
+}
+
+VOICE_NAME = "en-US-Standard-B"
+LANGUAGE_CODE = "en-US"
+
+_client = None
+_client_lock = threading.Lock()
 
-def synthesize_text(text: str):
-    """
-    Convert text to speech using Google Cloud Text-to-Speech.
-    Works both locally and on Render by using the environment variable 
-    GOOGLE_APPLICATION_CREDENTIALS if available.
-    Returns base64-encoded audio data.
-    """
 
+def _resolve_credentials():
     # Prefer credentials from environment (Render)
     credential_path = os.getenv("GOOGLE_APPLICATION_CREDENTIALS")
 
@@ -24,20 +35,45 @@ def synthesize_text(text: str):
 
     os.environ["GOOGLE_APPLICATION_CREDENTIALS"] = credential_path
 
-    # Initialize client
-    client = texttospeech.TextToSpeechClient()
+
+def get_tts_client():
+    """Return a process-wide TextToSpeechClient (gRPC channel is reused across calls)."""
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                _resolve_credentials()
+                _client = texttospeech.TextToSpeechClient()
+    return _client
+
+
+def content_type_for(encoding: str) -> str:
+    return AUDIO_FORMATS[encoding][1]
+
+
+def synthesize_speech(text: str, encoding: str = "LINEAR16") -> bytes:
+    """Synthesize ``text`` and return the raw audio bytes in ``encoding``.
+
+    Repeated (text, voice, encoding) requests are served from the audio cache.
+    """
+    with stage("tts.synthesize", encoding=encoding, chars=len(text)):
+        return cached_audio(text, VOICE_NAME, encoding, lambda: _synthesize_remote(text, encoding))
+
+
+def _synthesize_remote(text: str, encoding: str) -> bytes:
+    client = get_tts_client()
     synthesis_input = texttospeech.SynthesisInput(text=text)
 
     # Configure free-tier voice
     voice = texttospeech.VoiceSelectionParams(
-        language_code="en-US",
-        name="en-US-Standard-B",
+        language_code=LANGUAGE_CODE,
+        name=VOICE_NAME,
         ssml_gender=texttospeech.SsmlVoiceGender.FEMALE,
     )
 
     # Configure output
     audio_config = texttospeech.AudioConfig(
-        audio_encoding=texttospeech.AudioEncoding.LINEAR16
+        audio_encoding=AUDIO_FORMATS[encoding][0]
     )
 
     # Perform request
@@ -46,6 +82,58 @@ def synthesize_text(text: str):
         voice=voice,
         audio_config=audio_config,
     )
+    return response.audio_content
 
+
+def synthesize_text(text: str):
+    """
+    Convert text to speech using Google Cloud Text-to-Speech.
+    Works both locally and on Render by using the environment variable
+    GOOGLE_APPLICATION_CREDENTIALS if available.
+    Returns base64-encoded audio data.
+    """
     # Return base64 encoded audio
-    return base64.b64encode(response.audio_content).decode("utf-8")
\ No newline at end of file
+    return base64.b64encode(synthesize_speech(text, "LINEAR16")).decode("utf-8")
+
+
+# Sentence end: terminal punctuation (optionally closed by a quote/bracket)
+# followed by whitespace, or a blank line.
+_SENTENCE_END = re.compile(r"(?<=[.!?])[\"')\]]*\s+|\n\s*\n")
+
+
+class SentenceSegmenter:
+    """Accumulates streamed text and emits complete sentences for synthesis.
+
+    Sentences shorter than ``min_chars`` are merged with the next one so short
+    fragments don't each cost a TTS round trip.
+    """
+
+    def __init__(self, min_chars: int = 40, max_chars: int = 400):
+        self.min_chars = min_chars
+        self.max_chars = max_chars
+        self._buffer = ""
+
+    def feed(self, text: str):
+        """Add streamed text; return the list of segments that are now complete."""
+        self._buffer += text
+        segments = []
+        start = 0
+        for match in _SENTENCE_END.finditer(self._buffer):
+            candidate = self._buffer[start:match.end()]
+            if len(candidate.strip()) >= self.min_chars:
+                segments.append(candidate.strip())
+                start = match.end()
+        self._buffer = self._buffer[start:]
+
+        # Very long run-on text: cut at the last space instead of waiting forever.
+        while len(self._buffer) > self.max_chars:
+            cut = self._buffer.rfind(" ", 0, self.max_chars)
+            cut = cut if cut > 0 else self.max_chars
+            segments.append(self._buffer[:cut].strip())
+            self._buffer = self._buffer[cut:]
+        return [s for s in segments if s]
+
+    def flush(self):
+        """Return whatever text remains at the end of the stream."""
+        rest, self._buffer = self._buffer.strip(), ""
+        return [rest] if rest else []
@@ -4,4 +4,10 @@ from . import views
 
 urlpatterns = [
     path('resources/add/', views.IngestResourceView.as_view(), name='add_resource'),
-]
\ No newline at end of file
+    path('resources/bulk/', views.BulkIngestResourceView.as_view(), name='bulk_add_resources'),
+    path('resources/<int:resource_id>/', views.ResourceDetailView.as_view(), name='resource_detail'),
+    path('jobs/<uuid:job_id>/', views.IngestionJobView.as_view(), name='ingestion_job'),
+    path('history/', views.ChatHistoryView.as_view(), name='chat_history'),
+    path('health/ready/', views.ReadinessView.as_view(), name='readiness'),
+    path('metrics/', views.MetricsView.as_view(), name='metrics'),
+]
@@ -1,96 +1,283 @@
 # backend/chatbot/utils.py
 import os
+import asyncio
+import logging
+import time
 from django.conf import settings
+from django.db import transaction
 from django.utils import timezone
-from .vector_store import get_student_collection, get_global_collection
-from sentence_transformers import SentenceTransformer
+from .vector_store import add_resource_chunks, bump_index_version, delete_resource_chunks, query_student
+from .executors import run_cpu, run_db, run_network, spawn
+from .prompting import assemble_prompt, load_history, refresh_summary
+from .embedding_service import EMBEDDING_DIM, embed_texts, embedding_model_id
+from .embedding_cache import EmbeddingCache, cache_config, normalize_text
+from .answer_cache import invalidate_answers
+from .chunking import chunk_text
+from .lexical_index import lexical_search
+from .tracing import stage, traced
+from .retrieval import (
+    fuse, global_results, hybrid_enabled, mark_personal, record_lexical_timeout, retrieval_config, retrieval_seconds,
+)
 from google import genai
 
 # Initialize Gemini client
 client = genai.Client(api_key=os.environ.get("GEMINI_API_KEY"))
 TEXT_MODEL = "gemini-2.5-flash"
 
-_embedding_model = SentenceTransformer('all-mpnet-base-v2')
-
 
 def get_embedding(text: str):
-    """Generate embedding using local SentenceTransformer model."""
-    text = (text or "").strip()
-    if not text:
-        return [0.0] * 768
-    return _embedding_model.encode(text).tolist()
+    """Generate an embedding for one text via the (micro-batched) embedding service."""
+    return get_embeddings([text])[0]
+
+
+_embedding_cache = None
+
+
+def get_embedding_cache():
+    """Return the process-wide embedding cache, or None when disabled."""
+    global _embedding_cache
+    config = cache_config()
+    if not config["ENABLED"]:
+        return None
+    if _embedding_cache is None:
+        _embedding_cache = EmbeddingCache(embedding_model_id(), config)
+    return _embedding_cache
+
+
+def get_embeddings(texts):
+    """Embed many texts in one micro-batched model call (blank texts map to zero vectors).
 
+    Texts already in the embedding cache skip the model entirely.
+    """
+    texts = [normalize_text(t) for t in texts]
+    vectors = [[0.0] * EMBEDDING_DIM for _ in texts]
+    wanted = list(dict.fromkeys(t for t in texts if t))
+    if not wanted:
+        return vectors
 
-def index_resource(resource):
-    """Index a resource into the vector store."""
+    cache = get_embedding_cache()
+    found = cache.get_many(wanted) if cache is not None else {}
+    missing = [t for t in wanted if t not in found]
+    if missing:
+        computed = dict(zip(missing, embed_texts(missing)))
+        if cache is not None:
+            cache.set_many(computed)
+        found.update(computed)
+
+    for i, text in enumerate(texts):
+        if text:
+            vectors[i] = found[text]
+    return vectors
+
+
+def chunk_id(resource_id, chunk) -> str:
+    """Vector id for a resource chunk; stable for as long as the chunk's text is."""
+    return f"resource_{resource_id}_{chunk.content_hash[:16]}"
+
+
+def chunk_resource(resource):
+    """Split a resource into unique ``Chunk`` objects (see ``chunking.chunk_text``)."""
     content = resource.content or ""
     if not content.strip():
-        return
+        return []
+    seen = set()
+    return [c for c in chunk_text(content) if not (c.content_hash in seen or seen.add(c.content_hash))]
+
 
-    chunks = [content[i:i+1000] for i in range(0, len(content), 1000)]
-    embeddings = [get_embedding(chunk) for chunk in chunks]
-    ids = [f"resource_{resource.id}_chunk{i}" for i in range(len(chunks))]
+def _embed_chunks(resource, chunks, batch_size, progress=None):
+    """Embed and upsert ``chunks`` in batches; vector ids are stable, so repeats are harmless."""
+    for start in range(0, len(chunks), batch_size):
+        batch = chunks[start:start + batch_size]
+        docs = [c.text for c in batch]
+        with stage("index.embed", chunks=len(batch)):
+            embeddings = get_embeddings(docs)
+        with stage("index.upsert", chunks=len(batch)):
+            add_resource_chunks(
+                resource.owner_id, [chunk_id(resource.id, c) for c in batch], docs, embeddings,
+                resource_id=resource.id,
+            )
+        if progress:
+            progress(start + len(batch), len(chunks))
 
-    global_collection = get_global_collection()
-    global_collection.add(documents=chunks, embeddings=embeddings, ids=ids)
 
-    if resource.owner_id:
-        student_collection = get_student_collection(str(resource.owner_id))
-        student_collection.add(documents=chunks, embeddings=embeddings, ids=ids)
+def index_resource(resource, progress=None, batch_size=None):
+    """Index a resource into the vector store, embedding only chunks that changed.
 
+    The new chunk set is diffed against the resource's ``ResourceChunk`` rows by
+    content hash: new chunks are embedded and upserted in batches of
+    ``batch_size`` (``progress(done, total)`` is called after each batch), stale
+    ones are deleted, and unchanged ones are left alone. Returns the number of
+    chunks the resource now has.
 
-def retrieve_context(student_id: str, query: str, top_k: int = 3) -> str:
-    """Retrieve relevant context from student + global data."""
-    query_embedding = get_embedding(query)
-    student_collection = get_student_collection(student_id)
-    global_collection = get_global_collection()
+    Embedding happens unlocked; the diff is then redone and written under a
+    ``select_for_update`` lock on the Resource row, so overlapping jobs for the
+    same resource apply one after the other and the last edit wins.
+    """
+    from .models import IndexVersion, Resource, ResourceChunk, ResourceChunkChange
 
-    student_results = student_collection.query(query_embeddings=[query_embedding], n_results=top_k)
-    global_results = global_collection.query(query_embeddings=[query_embedding], n_results=top_k)
+    def current_rows():
+        return {
+            row.content_hash: row
+            for row in ResourceChunk.objects.filter(resource=resource).only("id", "content_hash", "vector_id", "position")
+        }
 
-    docs = []
-    if student_results.get("documents"):
-        docs.extend(student_results["documents"][0])
-    if global_results.get("documents"):
-        docs.extend(global_results["documents"][0])
+    with stage("index.chunk"):
+        chunks = chunk_resource(resource)
+    existing = current_rows()
+    embedded = [c for c in chunks if c.content_hash not in existing]
+    batch_size = batch_size or getattr(settings, "INGEST_EMBED_BATCH_SIZE", 64)
+    _embed_chunks(resource, embedded, batch_size, progress)
+
+    with transaction.atomic():
+        locked = Resource.objects.select_for_update().filter(pk=resource.pk).first()
+        if locked is None:
+            delete_resource_chunks(resource.owner_id, [chunk_id(resource.id, c) for c in embedded])
+            return 0
+        if locked.content != resource.content:
+            # A newer edit was saved while this job embedded: index that one instead.
+            resource = locked
+            with stage("index.chunk"):
+                chunks = chunk_resource(resource)
+        existing = current_rows()
+        wanted = {c.content_hash: c for c in chunks}
+        added = [c for c in chunks if c.content_hash not in existing]
+        stale = [row for h, row in existing.items() if h not in wanted]
+        done = {c.content_hash for c in embedded}
+        _embed_chunks(resource, [c for c in added if c.content_hash not in done], batch_size)
+        # Upserted above for content that has since been replaced, and not referenced by any row.
+        orphans = [chunk_id(resource.id, c) for c in embedded if c.content_hash not in wanted
+                   and c.content_hash not in existing]
+
+        if stale or orphans:
+            delete_resource_chunks(resource.owner_id, [row.vector_id for row in stale] + orphans)
+        # Claimed last so the sequence row stays locked only for the writes below.
+        sequence = IndexVersion.claim_sequence() if stale or added else 0
+        if stale:
+            ResourceChunk.objects.filter(pk__in=[row.pk for row in stale]).delete()
+            ResourceChunkChange.objects.bulk_create([
+                ResourceChunkChange(kind=ResourceChunkChange.KIND_CHUNK_DELETED, resource_id=resource.pk,
+                                    chunk_id=row.pk, sequence=sequence)
+                for row in stale
+            ])
+        ResourceChunk.objects.bulk_create([
+            ResourceChunk(resource=resource, position=c.position, content_hash=c.content_hash,
+                          vector_id=chunk_id(resource.id, c), token_count=c.tokens, text=c.text, sequence=sequence)
+            for c in added
+        ])
+        moved = [row for h, row in existing.items() if h in wanted and row.position != wanted[h].position]
+        for row in moved:
+            row.position = wanted[row.content_hash].position
+        if moved:
+            ResourceChunk.objects.bulk_update(moved, ["position"])
+
+    if added or stale:
+        logging.info(f"📚 Resource {resource.id}: {len(added)} chunks embedded, {len(stale)} removed, "
+                     f"{len(chunks) - len(added)} unchanged")
+        bump_index_version()
+        # Cached answers may be stale now that the corpus changed.
+        invalidate_answers(resource.owner_id)
+    return len(chunks)
+
+
+def _dense_documents(student, global_):
+    docs = [doc for doc, _ in student] + [doc for doc, _ in global_]
+    personal = any(is_personal for _, is_personal in [*student, *global_])
 
     seen = set()
     unique_docs = [d for d in docs if not (d in seen or seen.add(d))]
-    return "\n".join(unique_docs)
+    return unique_docs, personal
 
 
-def build_prompt(student_id: str, query: str, user=None) -> str:
-    """Compose a grounded prompt using RAG context + memory."""
-    from .models import ChatHistory
+def _combine(student_id, student, global_, lexical, top_k):
+    student = [(doc, True) for doc in student]
+    global_ = mark_personal(student_id, global_)
+    if hybrid_enabled():
+        return fuse(student, global_, lexical, top_k)
+    return _dense_documents(student, global_)
 
-    context = retrieve_context(student_id, query)
-    memory = []
 
-    if user is not None and getattr(user, "is_authenticated", False):
-        qs = ChatHistory.objects.filter(user=user).order_by('-created_at').values_list('question', 'answer')[:5]
-        for q, a in qs:
-            memory.append(f"Q: {q}\nA: {a or ''}")
+async def _astage(name, awaitable):
+    with stage(name):
+        return await awaitable
 
-    mem_block = "\n---\n".join(memory)
-    system_msg = (
-        "You are an academic mentor. Be concise and clear. "
-        "Use the context and chat history to answer helpfully."
-    )
 
-    return f"{system_msg}\n\nContext:\n{context}\n\nHistory:\n{mem_block}\n\nUser: {query}\nAnswer:"
+async def aretrieve_documents(student_id: str, query: str, top_k: int = 3, query_embedding=None):
+    """Return ``(documents, personal)``: ranked unique documents from student + global data.
+
+    ``personal`` says whether any of the student's own documents were used. The
+    student, global and BM25 searches run concurrently; in hybrid mode the
+    rankings are fused (see ``retrieval.py``).
 
+    The lexical side gets ``LEXICAL_BUDGET_MS`` from the start of the request;
+    if it has not finished by then (or the vector searches finish later), the
+    request goes ahead with dense results only.
+    """
+    started = time.monotonic()
+    hybrid = hybrid_enabled()
+    config = retrieval_config()
+    k = max(config["CANDIDATES"], top_k) if hybrid else top_k
 
-def generate_stream_with_context(student_id: str, query: str, user=None):
-    """Stream AI response with context grounding."""
-    prompt = build_prompt(student_id, query, user)
-    chunks, full_text = [], ""
+    lexical = (asyncio.ensure_future(run_cpu(traced("retrieve.lexical", lexical_search), student_id, query, k))
+               if hybrid else None)
+    try:
+        if query_embedding is None:
+            query_embedding = await run_cpu(traced("retrieve.embed", get_embedding), query)
+        # Two searches even in the shared layout: the global one is cached per query and
+        # index version (retrieval.global_results), so a hit leaves one owner-filtered query.
+        student, global_ = await asyncio.gather(
+            run_cpu(traced("retrieve.student", query_student), student_id, query_embedding, k),
+            run_cpu(traced("retrieve.global", global_results), query, query_embedding, k),
+        )
+    except BaseException:
+        if lexical is not None:
+            lexical.cancel()
+        raise
 
-    for chunk in client.models.generate_content_stream(
+    lexical_results = []
+    if lexical is not None:
+        remaining = config["LEXICAL_BUDGET_MS"] / 1000 - (time.monotonic() - started)
+        try:
+            lexical_results = await asyncio.wait_for(lexical, max(remaining, 0))
+        except asyncio.TimeoutError:
+            record_lexical_timeout()
+        except Exception as e:
+            logging.warning(f"⚠️ Lexical search failed, using dense results only: {e}")
+    result = _combine(student_id, student, global_, lexical_results, top_k)
+    retrieval_seconds.observe(time.monotonic() - started)
+    return result
+
+
+async def abuild_prompt(student_id: str, query: str, user=None, query_embedding=None):
+    """Build the grounded prompt: retrieval on the CPU pool and history on the DB pool, concurrently.
+
+    Returns ``(prompt, personal)``; ``personal`` is True when the prompt includes
+    student documents or chat history and so must not be shared with others.
+    ``query_embedding`` is reused for retrieval when given.
+    """
+    with stage("chat.prompt"):
+        (docs, personal_docs), (summary, turns, needs_refresh) = await asyncio.gather(
+            _astage("retrieve", aretrieve_documents(student_id, query, query_embedding=query_embedding)),
+            run_db(traced("chat.history", load_history), user),
+        )
+    if needs_refresh:
+        # Fold older turns into the rolling summary without delaying this answer.
+        spawn(run_network(refresh_summary, user.id))
+    prompt = assemble_prompt(query, docs, summary, turns)
+    return prompt, personal_docs or bool(summary or turns)
+
+
+async def astream_prompt(prompt: str):
+    """Async generator streaming Gemini's answer to an already built prompt."""
+    stream = await client.aio.models.generate_content_stream(
         model=TEXT_MODEL,
         contents=[{"role": "user", "parts": [{"text": prompt}]}],
-    ):
-        if hasattr(chunk, "text") and chunk.text:
-            chunks.append(chunk.text)
-            full_text += chunk.text
-
-    return chunks, full_text
\ No newline at end of file
+    )
+    try:
+        async for chunk in stream:
+            if hasattr(chunk, "text") and chunk.text:
+                yield chunk.text
+    finally:
+        # Close the HTTP stream promptly when the consumer stops early (disconnect).
+        aclose = getattr(stream, "aclose", None)
+        if aclose is not None:
+            await aclose()
@@ -1,27 +1,318 @@
 #backend/chatbot/vector_store.py
 import chromadb
-from chromadb.config import Settings
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.redis import RedisCache
+from django.db.models import F
+import logging
 import os
+import threading
+import time
 
 # Persistent storage directory for ChromaDB
 CHROMA_DIR = os.path.join(os.path.dirname(__file__), "chroma_db")
 
+DEFAULT_VECTOR_STORE = {
+    "BACKEND": "persistent",
+    "PATH": CHROMA_DIR,
+    "HOST": "127.0.0.1",
+    "PORT": 8001,
+    "HNSW": {"M": 16, "EF_CONSTRUCTION": 100, "EF_SEARCH": 64},
+    "WARMUP": True,
+    "COMPACT": {"DTYPE": "float16", "PROMOTE_AT": 5000, "MAX_SEGMENTS": 8, "HOT_COLLECTIONS": 64},
+}
+
 # Global variable to cache the Chroma client
 _chroma_client = None
+_collections = {}
+_collections_lock = threading.Lock()
+
+
+def vector_store_config() -> dict:
+    config = dict(DEFAULT_VECTOR_STORE)
+    config.update(getattr(settings, "VECTOR_STORE", {}))
+    config["HNSW"] = {**DEFAULT_VECTOR_STORE["HNSW"], **config.get("HNSW", {})}
+    config["COMPACT"] = {**DEFAULT_VECTOR_STORE["COMPACT"], **config.get("COMPACT", {})}
+    return config
+
+def _persistent_client(config):
+    os.makedirs(config["PATH"], exist_ok=True)
+    return chromadb.PersistentClient(path=config["PATH"])
+
+def _ephemeral_client(config):
+    return chromadb.EphemeralClient()
+
+def _http_client(config):
+    return chromadb.HttpClient(host=config["HOST"], port=int(config["PORT"]))
+
+def _compact_client(config):
+    from .compact_store import CompactClient
+    compact = config["COMPACT"]
+    return CompactClient(
+        os.path.join(config["PATH"], "compact"), compact["DTYPE"], int(compact["PROMOTE_AT"]),
+        int(compact["MAX_SEGMENTS"]), int(compact["HOT_COLLECTIONS"]),
+    )
+
+# Backend name -> client factory; register more here.
+CLIENT_BACKENDS = {
+    "persistent": _persistent_client,
+    "ephemeral": _ephemeral_client,
+    "http": _http_client,
+    "compact": _compact_client,
+}
 
 def get_chroma_client():
     """Safely get or create a global ChromaDB client instance."""
     global _chroma_client
     if _chroma_client is None:
-        _chroma_client = chromadb.Client(Settings(persist_directory=CHROMA_DIR))
+        config = vector_store_config()
+        _chroma_client = CLIENT_BACKENDS[config["BACKEND"]](config)
     return _chroma_client
 
+def hnsw_configuration(space: str = "l2") -> dict:
+    """Collection configuration built from VECTOR_STORE['HNSW']."""
+    hnsw = vector_store_config()["HNSW"]
+    return {"hnsw": {
+        "space": space,
+        "max_neighbors": hnsw["M"],
+        "ef_construction": hnsw["EF_CONSTRUCTION"],
+        "ef_search": hnsw["EF_SEARCH"],
+    }}
+
+def get_collection(name: str, space: str = "l2"):
+    """Return (creating if needed) a collection, caching the handle per process."""
+    collection = _collections.get(name)
+    if collection is None:
+        with _collections_lock:
+            collection = _collections.get(name)
+            if collection is None:
+                collection = get_chroma_client().get_or_create_collection(
+                    name=name, configuration=hnsw_configuration(space), embedding_function=None,
+                )
+                _collections[name] = collection
+    return collection
+
+def forget_collection(name: str = None):
+    """Drop cached collection handles (all of them when ``name`` is None)."""
+    with _collections_lock:
+        if name is None:
+            _collections.clear()
+        else:
+            _collections.pop(name, None)
+
 def get_student_collection(student_id: str):
     """Return or create a collection for a specific student."""
-    client = get_chroma_client()
-    return client.get_or_create_collection(name=f"student_{student_id}")
+    return get_collection(f"student_{student_id}")
 
 def get_global_collection():
     """Return or create a global resource collection."""
+    return get_collection("global_resources")
+
+def get_answer_cache_collection():
+    """Return or create the semantic answer cache collection (cosine distance)."""
+    return get_collection("answer_cache", space="cosine")
+
+def warm_up(include_students: bool = False):
+    """Open the store and touch collections so HNSW segments are loaded before traffic.
+
+    Per-student collections are skipped unless ``include_students`` (there can be
+    thousands). Also applies the configured ef_search to existing collections.
+    """
+    started = time.monotonic()
     client = get_chroma_client()
-    return client.get_or_create_collection(name="global_resources")
\ No newline at end of file
+    ef_search = vector_store_config()["HNSW"]["EF_SEARCH"]
+    warmed = 0
+    for listed in client.list_collections():
+        if listed.name.startswith("student_") and not include_students:
+            continue
+        collection = get_collection(listed.name)
+        try:
+            current = (collection.configuration or {}).get("hnsw") or {}
+            if current.get("ef_search") not in (None, ef_search):
+                collection.modify(configuration={"hnsw": {"ef_search": ef_search}})
+            if collection.count():
+                sample = collection.peek(limit=1)
+                collection.query(query_embeddings=[sample["embeddings"][0]], n_results=1)
+            warmed += 1
+        except Exception as e:
+            logging.warning(f"⚠️ Could not warm collection {listed.name}: {e}")
+    logging.info(f"🔥 Vector store warm: {warmed} collections in {time.monotonic() - started:.2f}s")
+    return warmed
+
+def start_warmup():
+    """Warm the store on a background thread at server start when VECTOR_STORE['WARMUP'] is set."""
+    if not vector_store_config()["WARMUP"]:
+        return None
+
+    def _run():
+        try:
+            warm_up()
+        except Exception as e:
+            logging.error(f"❌ Vector store warm-up failed: {e}", exc_info=True)
+
+    thread = threading.Thread(target=_run, name="vector-store-warmup", daemon=True)
+    thread.start()
+    return thread
+
+# ─── Layout-aware operations ──────────────────────────────────────────
+# "per_student": resources go to global_resources *and* the owner's
+#                student_<id> collection; retrieval queries both.
+# "shared":      every vector lives once in SHARED_COLLECTION with
+#                scope/owner metadata; retrieval runs an owner-filtered
+#                query and a scope=global one, the latter cached per query.
+
+SHARED_COLLECTION = "tenant_vectors"
+SCOPE_GLOBAL = "global"
+SCOPE_MEMORY = "memory"
+
+
+INDEX_VERSION_KEY = "resource_index_version"
+
+
+def _atomic_counter(shared) -> bool:
+    """Only Redis increments atomically; the file-based fallback's ``incr`` is a get then a set."""
+    return isinstance(shared, RedisCache)
+
+
+def index_version():
+    """Counter bumped whenever resource chunks change; derived indexes and caches key off it.
+
+    Kept in the shared cache when that is Redis, otherwise in the ``IndexVersion`` row.
+    Returns None when it can't be read, so callers skip their caches instead of
+    serving entries keyed to a stale version.
+    """
+    try:
+        shared = caches["shared"]
+        if _atomic_counter(shared):
+            return shared.get(INDEX_VERSION_KEY, 0)
+        from .models import IndexVersion
+        return IndexVersion.objects.filter(pk=1).values_list("version", flat=True).first() or 0
+    except Exception as e:
+        logging.warning(f"⚠️ Could not read resource index version: {e}")
+        return None
+
+def bump_index_version():
+    try:
+        shared = caches["shared"]
+        if _atomic_counter(shared):
+            try:
+                return shared.incr(INDEX_VERSION_KEY)
+            except ValueError:
+                if shared.add(INDEX_VERSION_KEY, 1, timeout=None):
+                    return 1
+                return shared.incr(INDEX_VERSION_KEY)
+        from .models import IndexVersion
+        IndexVersion.objects.get_or_create(pk=1)
+        IndexVersion.objects.filter(pk=1).update(version=F("version") + 1)
+        return IndexVersion.objects.filter(pk=1).values_list("version", flat=True).first()
+    except Exception as e:
+        logging.warning(f"⚠️ Could not bump resource index version: {e}")
+
+def resource_id_of(doc_id: str):
+    """Resource id encoded in a chunk vector id, or None for non-resource vectors."""
+    # Resource chunk ids look like resource_<id>_<hash> (or the older resource_<id>_chunk<n>)
+    if doc_id.startswith("resource_"):
+        return doc_id.split("_")[1]
+    return None
+
+def get_layout() -> str:
+    return getattr(settings, "VECTOR_STORE_LAYOUT", "per_student")
+
+def get_shared_collection():
+    """Return or create the single multi-tenant collection used by the shared layout."""
+    return get_collection(SHARED_COLLECTION)
+
+def add_resource_chunks(owner_id, ids, documents, embeddings, resource_id=None):
+    """Upsert resource chunks so they are visible globally and to their owner."""
+    owner = str(owner_id) if owner_id else ""
+    if get_layout() == "shared":
+        metadata = {"scope": SCOPE_GLOBAL, "owner": owner}
+        if resource_id is not None:
+            metadata["resource_id"] = str(resource_id)
+        get_shared_collection().upsert(
+            ids=ids, documents=documents, embeddings=embeddings,
+            metadatas=[dict(metadata) for _ in ids],
+        )
+        return
+    get_global_collection().upsert(documents=documents, embeddings=embeddings, ids=ids)
+    if owner:
+        get_student_collection(owner).upsert(documents=documents, embeddings=embeddings, ids=ids)
+
+def delete_resource_chunks(owner_id, ids):
+    """Remove resource chunk vectors from every collection they were written to."""
+    if not ids:
+        return
+    if get_layout() == "shared":
+        get_shared_collection().delete(ids=list(ids))
+        return
+    get_global_collection().delete(ids=list(ids))
+    if owner_id:
+        get_student_collection(str(owner_id)).delete(ids=list(ids))
+
+def reassign_resource_chunks(old_owner_id, new_owner_id, ids):
+    """Move resource chunk vectors from one owner's scope to another's (``None`` = no owner)."""
+    if not ids:
+        return
+    ids = list(ids)
+    if get_layout() == "shared":
+        owner = str(new_owner_id) if new_owner_id else ""
+        get_shared_collection().update(ids=ids, metadatas=[{"owner": owner} for _ in ids])
+        return
+    if old_owner_id:
+        get_student_collection(str(old_owner_id)).delete(ids=ids)
+    if new_owner_id:
+        page = get_global_collection().get(ids=ids, include=["documents", "embeddings"])
+        if page["ids"]:
+            get_student_collection(str(new_owner_id)).upsert(
+                ids=page["ids"], documents=page["documents"], embeddings=page["embeddings"],
+            )
+
+def add_memories(entries):
+    """Upsert many ``(student_id, doc_id, document, embedding)`` memory entries at once."""
+    if not entries:
+        return
+    if get_layout() == "shared":
+        get_shared_collection().upsert(
+            ids=[e[1] for e in entries],
+            documents=[e[2] for e in entries],
+            embeddings=[e[3] for e in entries],
+            metadatas=[{"scope": SCOPE_MEMORY, "owner": str(e[0])} for e in entries],
+        )
+        return
+    by_student = {}
+    for student_id, doc_id, document, embedding in entries:
+        group = by_student.setdefault(str(student_id), ([], [], []))
+        group[0].append(doc_id)
+        group[1].append(document)
+        group[2].append(embedding)
+    for student_id, (ids, documents, embeddings) in by_student.items():
+        get_student_collection(student_id).upsert(ids=ids, documents=documents, embeddings=embeddings)
+
+def query_student(student_id: str, embedding, top_k: int = 3):
+    """Return ``[document, ...]`` from the student's own data (memories and resources)."""
+    student_id = str(student_id)
+    if get_layout() == "shared":
+        results = get_shared_collection().query(
+            query_embeddings=[embedding], n_results=top_k, where={"owner": student_id}, include=["documents"],
+        )
+    else:
+        results = get_student_collection(student_id).query(
+            query_embeddings=[embedding], n_results=top_k, include=["documents"],
+        )
+    return list((results.get("documents") or [[]])[0])
+
+def query_global(embedding, top_k: int = 3):
+    """Return ``[(document, owner), ...]`` from the global resources; owner is "" when unknown.
+
+    Nothing here depends on the asking student, so results can be cached per query.
+    """
+    if get_layout() == "shared":
+        results = get_shared_collection().query(
+            query_embeddings=[embedding], n_results=top_k, where={"scope": SCOPE_GLOBAL},
+            include=["documents", "metadatas"],
+        )
+        documents = (results.get("documents") or [[]])[0]
+        metadatas = (results.get("metadatas") or [[]])[0]
+        return [(doc, (meta or {}).get("owner", "")) for doc, meta in zip(documents, metadatas)]
+    results = get_global_collection().query(query_embeddings=[embedding], n_results=top_k, include=["documents"])
+    return [(doc, "") for doc in (results.get("documents") or [[]])[0]]
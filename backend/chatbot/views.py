@@ -1,9 +1,27 @@
 #backend/chatbot/views.py
+import hmac
+
+from django.conf import settings
+from django.db import transaction
+from django.http import HttpResponse
+from django.shortcuts import get_object_or_404
+from rest_framework.generics import ListAPIView
+from rest_framework.pagination import CursorPagination
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status, permissions
-from .models import Resource
-from .utils import index_resource
+from .embedding_service import backend_config, model_ready
+from .metrics import render_prometheus
+from .models import ChatHistory, Resource, IngestionJob
+from .serializers import ChatHistorySerializer, IngestionJobSerializer
+from .tasks import ingest_resource
+
+
+def _enqueue(jobs):
+    """Dispatch ingestion tasks once the Resource/IngestionJob rows are committed."""
+    job_ids = [job.id for job in jobs]
+    transaction.on_commit(lambda: [ingest_resource.delay(str(job_id)) for job_id in job_ids])
+
 
 class IngestResourceView(APIView):
     permission_classes = [permissions.IsAuthenticated]
@@ -13,10 +31,137 @@ class IngestResourceView(APIView):
         content = request.data.get("content")
         if not title or not content:
             return Response({"error": "title and content required"}, status=status.HTTP_400_BAD_REQUEST)
-        resource = Resource.objects.create(
-            title=title,
-            content=content,
-            owner=request.user
+        with transaction.atomic():
+            resource = Resource.objects.create(
+                title=title,
+                content=content,
+                owner=request.user
+            )
+            job = IngestionJob.objects.create(resource=resource, owner=request.user)
+            _enqueue([job])
+        return Response({
+            "message": "Resource accepted for indexing.",
+            "resource_id": resource.id,
+            "job_id": str(job.id),
+        }, status=status.HTTP_202_ACCEPTED)
+
+
+class BulkIngestResourceView(APIView):
+    permission_classes = [permissions.IsAuthenticated]
+
+    def post(self, request):
+        items = request.data.get("resources")
+        if not isinstance(items, list) or not items:
+            return Response({"error": "resources must be a non-empty list"}, status=status.HTTP_400_BAD_REQUEST)
+        limit = getattr(settings, "INGEST_BULK_MAX_RESOURCES", 500)
+        if len(items) > limit:
+            return Response({"error": f"at most {limit} resources per request"}, status=status.HTTP_400_BAD_REQUEST)
+
+        invalid = [i for i, item in enumerate(items)
+                   if not isinstance(item, dict) or not item.get("title") or not item.get("content")]
+        if invalid:
+            return Response({"error": "title and content required", "invalid_indexes": invalid}, status=status.HTTP_400_BAD_REQUEST)
+
+        with transaction.atomic():
+            resources = Resource.objects.bulk_create([
+                Resource(title=item["title"], content=item["content"], owner=request.user)
+                for item in items
+            ])
+            jobs = IngestionJob.objects.bulk_create([
+                IngestionJob(resource=resource, owner=request.user) for resource in resources
+            ])
+            _enqueue(jobs)
+
+        return Response({
+            "message": f"{len(jobs)} resources accepted for indexing.",
+            "jobs": [{"resource_id": job.resource_id, "job_id": str(job.id)} for job in jobs],
+        }, status=status.HTTP_202_ACCEPTED)
+
+
+class ResourceDetailView(APIView):
+    """Edit or delete one of your resources; vectors follow via chatbot/signals.py."""
+    permission_classes = [permissions.IsAuthenticated]
+
+    def patch(self, request, resource_id):
+        resource = get_object_or_404(Resource, pk=resource_id, owner=request.user)
+        fields = {key: request.data[key] for key in ("title", "content") if key in request.data}
+        if not fields or any(not value for value in fields.values()):
+            return Response({"error": "non-empty title or content required"}, status=status.HTTP_400_BAD_REQUEST)
+
+        with transaction.atomic():
+            for key, value in fields.items():
+                setattr(resource, key, value)
+            resource.save(update_fields=list(fields))
+
+        job = getattr(resource, "_ingestion_job", None)
+        if job is None:
+            return Response({"message": "Resource updated.", "resource_id": resource.id})
+        return Response({
+            "message": "Resource updated; changed chunks queued for re-indexing.",
+            "resource_id": resource.id,
+            "job_id": str(job.id),
+        }, status=status.HTTP_202_ACCEPTED)
+
+    put = patch
+
+    def delete(self, request, resource_id):
+        resource = get_object_or_404(Resource, pk=resource_id, owner=request.user)
+        with transaction.atomic():
+            resource.delete()
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+
+class IngestionJobView(APIView):
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get(self, request, job_id):
+        job = get_object_or_404(IngestionJob, pk=job_id, owner=request.user)
+        return Response(IngestionJobSerializer(job).data)
+
+
+class ChatHistoryPagination(CursorPagination):
+    """Keyset pagination over (created_at, id), served by the chat_history_user_recent index."""
+    ordering = ("-created_at", "-id")
+    page_size = settings.CHAT_HISTORY_PAGE_SIZE
+    page_size_query_param = "limit"
+    max_page_size = settings.CHAT_HISTORY_MAX_PAGE_SIZE
+
+
+class ChatHistoryView(ListAPIView):
+    """The signed-in user's past questions and answers, newest first; follow ``next`` for older pages."""
+    permission_classes = [permissions.IsAuthenticated]
+    serializer_class = ChatHistorySerializer
+    pagination_class = ChatHistoryPagination
+
+    def get_queryset(self):
+        return ChatHistory.objects.filter(user=self.request.user)
+
+
+class ReadinessView(APIView):
+    """503 until this worker can embed without loading the model first."""
+    permission_classes = [permissions.AllowAny]
+
+    def get(self, request):
+        ready = model_ready()
+        return Response(
+            {"ready": ready, "embedding_backend": backend_config()["BACKEND"]},
+            status=status.HTTP_200_OK if ready else status.HTTP_503_SERVICE_UNAVAILABLE,
         )
-        index_resource(resource)
-        return Response({"message": "Resource ingested and indexed."}, status=status.HTTP_201_CREATED)
+
+
+class MetricsView(APIView):
+    """This process's metrics in the Prometheus text format; needs ``Bearer METRICS_TOKEN``.
+
+    Without a configured token the endpoint is closed rather than public.
+    """
+    authentication_classes = []
+    permission_classes = [permissions.AllowAny]
+
+    def get(self, request):
+        token = getattr(settings, "METRICS_TOKEN", "")
+        if not token:
+            return Response({"error": "Metrics are disabled until METRICS_TOKEN is set."},
+                            status=status.HTTP_403_FORBIDDEN)
+        if not hmac.compare_digest(request.headers.get("Authorization", ""), f"Bearer {token}"):
+            return Response({"error": "Invalid metrics token."}, status=status.HTTP_401_UNAUTHORIZED)
+        return HttpResponse(render_prometheus(), content_type="text/plain; version=0.0.4; charset=utf-8")
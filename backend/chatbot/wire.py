@@ -0,0 +1,151 @@
+# backend/chatbot/wire.py
+"""
+Chat socket wire protocol.
+
+The client picks a version with ``?protocol=N`` (capped at ``MAX_PROTOCOL``);
+the greeting frame echoes what was negotiated. Every version serializes JSON
+with orjson.
+
+* v1: one ``partial`` frame per Gemini chunk, as before.
+* v2: ``partial`` text is coalesced until ``COALESCE_MS`` have passed or
+  ``COALESCE_BYTES`` are buffered (the first partial of a turn goes out at
+  once), and any other frame flushes pending text first so order is kept.
+  With ``&compress=deflate``, JSON frames of at least ``DEFLATE_MIN_BYTES``
+  are sent as binary frames::
+
+      +------+-------------------------------------------+
+      | kind |  raw DEFLATE of the JSON, Z_SYNC_FLUSH-ed  |
+      | 0x02 |  (one stream per socket, like permessage- |
+      |      |   deflate with context takeover)          |
+      +------+-------------------------------------------+
+
+  Binary kind 0x01 stays audio (audio_stream.py).
+"""
+import asyncio
+import json
+import zlib
+from urllib.parse import parse_qs
+
+from django.conf import settings
+
+try:
+    import orjson
+except ImportError:  # stdlib fallback, same JSON on the wire
+    orjson = None
+
+DEFAULT_WIRE = {
+    "DEFAULT_PROTOCOL": 1,
+    "MAX_PROTOCOL": 2,
+    "COALESCE_MS": 30,
+    "COALESCE_BYTES": 512,
+    "DEFLATE_MIN_BYTES": 256,
+}
+
+FRAME_DEFLATE = 0x02
+
+
+def wire_config() -> dict:
+    config = dict(DEFAULT_WIRE)
+    config.update(getattr(settings, "CHAT_WIRE", {}))
+    return config
+
+
+def dumps(payload) -> str:
+    if orjson is not None:
+        return orjson.dumps(payload).decode("utf-8")
+    return json.dumps(payload, separators=(",", ":"), ensure_ascii=False)
+
+
+def loads(data):
+    return orjson.loads(data) if orjson is not None else json.loads(data)
+
+
+class WireProtocol:
+    """Per-socket encoding: protocol version plus the optional deflate stream."""
+
+    def __init__(self, version: int = 1, compress: bool = False, config: dict = None):
+        self.config = config or wire_config()
+        self.version = version
+        self.compress = compress and version >= 2
+        self._deflate = zlib.compressobj(wbits=-15) if self.compress else None
+
+    @classmethod
+    def negotiate(cls, scope) -> "WireProtocol":
+        config = wire_config()
+        params = parse_qs(scope.get("query_string", b"").decode("latin-1"))
+        try:
+            requested = int(params.get("protocol", [config["DEFAULT_PROTOCOL"]])[0])
+        except ValueError:
+            requested = config["DEFAULT_PROTOCOL"]
+        version = max(1, min(requested, config["MAX_PROTOCOL"]))
+        return cls(version, params.get("compress", [""])[0] == "deflate", config)
+
+    @property
+    def coalesce(self) -> bool:
+        return self.version >= 2
+
+    def describe(self) -> dict:
+        info = {"protocol": self.version}
+        if self.version >= 2:
+            info["compression"] = "deflate" if self.compress else None
+        return info
+
+    def encode(self, payload) -> dict:
+        """Keyword arguments for ``consumer.send`` carrying ``payload``."""
+        text = dumps(payload)
+        if self._deflate is not None and len(text) >= self.config["DEFLATE_MIN_BYTES"]:
+            data = self._deflate.compress(text.encode("utf-8")) + self._deflate.flush(zlib.Z_SYNC_FLUSH)
+            return {"bytes_data": bytes([FRAME_DEFLATE]) + data}
+        return {"text_data": text}
+
+
+class PartialCoalescer:
+    """Buffers streamed answer text and emits it as fewer, larger ``partial`` frames."""
+
+    def __init__(self, send_payload, window_ms: float = 30, max_bytes: int = 512):
+        self._send_payload = send_payload
+        self.window = window_ms / 1000
+        self.max_bytes = max_bytes
+        self._parts = []
+        self._size = 0
+        self._timer = None
+        self._lock = asyncio.Lock()
+        self._sent_any = False
+        self.frames = 0
+
+    async def add(self, text: str):
+        self._parts.append(text)
+        self._size += len(text.encode("utf-8"))
+        if not self._sent_any or self._size >= self.max_bytes:
+            await self.flush()
+        elif self._timer is None:
+            self._timer = asyncio.create_task(self._flush_later())
+
+    async def _flush_later(self):
+        await asyncio.sleep(self.window)
+        self._timer = None
+        await self.flush()
+
+    async def flush(self):
+        """Send whatever is buffered now."""
+        if self._timer is not None and self._timer is not asyncio.current_task():
+            self._timer.cancel()
+            self._timer = None
+        async with self._lock:
+            if not self._parts:
+                return
+            text, self._parts, self._size = "".join(self._parts), [], 0
+            self._sent_any = True
+            self.frames += 1
+            await self._send_payload({"type": "partial", "text": text})
+
+    def reset(self):
+        """Start a new turn: the next partial goes out immediately."""
+        self.cancel()
+        self._sent_any = False
+
+    def cancel(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        self._parts, self._size = [], 0
@@ -0,0 +1,239 @@
+# backend/chatbot/ws_auth.py
+"""
+Stateless JWT authentication for WebSockets.
+
+The simplejwt access token is read from the ``?token=`` query parameter or
+from the ``Sec-WebSocket-Protocol`` header as the pair ``bearer, <token>``
+(the socket is then accepted with the ``bearer`` subprotocol). Signature,
+expiry and token type are checked in-process; no session lookup is made.
+
+The user behind a token is cached in-process and in the ``shared`` cache for
+a short TTL, so a reconnect storm after a deploy costs at most one database
+query per user rather than one per connection. Concurrent connects with the
+same token share one lookup. The shared tier holds only the user's key, username,
+``is_active`` and the token revoke hash (never the password hash), and
+unknown users are cached in-process only. Sockets get a user instance rebuilt
+from those fields; its other fields load on access.
+
+Access tokens are not checked against the simplejwt blacklist, which only
+ever holds refresh tokens: a logged-out or rotated-away session keeps its
+socket access until the access token expires (``ACCESS_TOKEN_LIFETIME``).
+With simplejwt's ``CHECK_REVOKE_TOKEN``, a password change revokes tokens
+within ``USER_CACHE_TTL``.
+
+Sockets without a token are anonymous (guests); sockets with an invalid token
+get ``scope["auth_error"]`` and are closed by the consumer with code 4401.
+"""
+import asyncio
+import logging
+import threading
+from urllib.parse import parse_qs
+
+from cachetools import TTLCache
+from channels.auth import AuthMiddlewareStack
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.auth.models import AnonymousUser
+from django.core.cache import caches
+
+from .executors import run_db
+from .metrics import counter
+
+DEFAULT_WS_AUTH = {
+    "QUERY_PARAM": "token",
+    "SUBPROTOCOL": "bearer",
+    "USER_CACHE_TTL": 60,
+    "USER_CACHE_SIZE": 10000,
+    "SHARED_ALIAS": "shared",
+    "SESSION_FALLBACK": False,
+}
+
+_user_lookups = counter("ws_auth_user_lookups_total", "WebSocket users loaded from the database")
+_rejected = counter("ws_auth_rejected_total", "WebSocket connections with an invalid or revoked token")
+
+_MISSING = object()
+
+_local = None
+_local_lock = threading.Lock()
+_inflight = {}
+
+
+class WebSocketAuthError(Exception):
+    """The token was present but cannot authenticate anyone."""
+
+
+def ws_auth_config() -> dict:
+    config = dict(DEFAULT_WS_AUTH)
+    config.update(getattr(settings, "WS_AUTH", {}))
+    return config
+
+
+def _local_cache(config):
+    global _local
+    if _local is None:
+        with _local_lock:
+            if _local is None:
+                _local = TTLCache(maxsize=config["USER_CACHE_SIZE"], ttl=config["USER_CACHE_TTL"])
+    return _local
+
+
+def _shared(config):
+    try:
+        return caches[config["SHARED_ALIAS"]] if config["SHARED_ALIAS"] else None
+    except Exception:
+        return None
+
+
+def _cached(config, key: str, ttl: int, load):
+    """Look ``key`` up locally, then in the shared cache, else ``load()``; ``None`` stays local."""
+    local = _local_cache(config)
+    with _local_lock:
+        value = local.get(key, _MISSING)
+    if value is not _MISSING:
+        return value
+    shared = _shared(config)
+    if shared is not None:
+        try:
+            value = shared.get(key, _MISSING)
+        except Exception as e:
+            logging.warning(f"⚠️ Shared auth cache unavailable: {e}")
+    if value is _MISSING or value is None:
+        value = load()
+        if shared is not None and value is not None:
+            try:
+                shared.set(key, value, ttl)
+            except Exception as e:
+                logging.warning(f"⚠️ Could not write shared auth cache: {e}")
+    with _local_lock:
+        local[key] = value
+    return value
+
+
+def _identity_fields():
+    User = get_user_model()
+    return [User._meta.pk.attname, User.USERNAME_FIELD, "is_active"]
+
+
+def _load_identity(user_id):
+    """The fields a socket needs plus the revoke hash, or None; safe for the shared cache."""
+    from rest_framework_simplejwt.settings import api_settings
+    from rest_framework_simplejwt.utils import get_md5_hash_password
+
+    _user_lookups.inc()
+    fields = _identity_fields() + (["password"] if api_settings.CHECK_REVOKE_TOKEN else [])
+    row = get_user_model().objects.filter(**{api_settings.USER_ID_FIELD: user_id}).values_list(*fields).first()
+    if row is None:
+        return None
+    if not api_settings.CHECK_REVOKE_TOKEN:
+        return {"values": list(row), "revoke": None}
+    return {"values": list(row[:-1]), "revoke": get_md5_hash_password(row[-1])}
+
+
+def _user_from(identity):
+    # Fields left out are deferred: they load on access, and save() only writes the loaded ones.
+    User = get_user_model()
+    return User.from_db(User.objects.db, _identity_fields(), identity["values"])
+
+
+def authenticate_token(raw_token: str):
+    """Validate an access token and return its (cached) active user; raises ``WebSocketAuthError``."""
+    from rest_framework_simplejwt.exceptions import TokenError
+    from rest_framework_simplejwt.settings import api_settings
+    from rest_framework_simplejwt.tokens import AccessToken
+
+    try:
+        token = AccessToken(raw_token)
+    except TokenError as e:
+        raise WebSocketAuthError(str(e))
+    config = ws_auth_config()
+
+    user_id = token.get(api_settings.USER_ID_CLAIM)
+    if user_id is None:
+        raise WebSocketAuthError("Token contained no recognizable user identification")
+    identity = _cached(config, f"ws_auth:user:{user_id}", config["USER_CACHE_TTL"],
+                       lambda: _load_identity(user_id))
+    if identity is None:
+        raise WebSocketAuthError("User not found")
+    user = _user_from(identity)
+    if api_settings.CHECK_USER_IS_ACTIVE and not user.is_active:
+        raise WebSocketAuthError("User is inactive")
+    if api_settings.CHECK_REVOKE_TOKEN and token.get(api_settings.REVOKE_TOKEN_CLAIM) != identity["revoke"]:
+        raise WebSocketAuthError("The user's password has been changed")
+    return user
+
+
+def forget_user(user_id):
+    """Drop a user from both cache tiers (after a save or delete); other processes expire within the TTL."""
+    config = ws_auth_config()
+    key = f"ws_auth:user:{user_id}"
+    with _local_lock:
+        if _local is not None:
+            _local.pop(key, None)
+    shared = _shared(config)
+    if shared is not None:
+        try:
+            shared.delete(key)
+        except Exception as e:
+            logging.warning(f"⚠️ Could not clear shared auth cache: {e}")
+
+
+async def aauthenticate_token(raw_token: str):
+    """``authenticate_token`` on the DB pool; concurrent calls with the same token share one call.
+
+    A caller that is cancelled (its socket went away) only stops waiting; the
+    shared lookup keeps running for the others.
+    """
+    loop = asyncio.get_running_loop()
+    task = _inflight.get(raw_token)
+    if task is None or task.get_loop() is not loop:
+        task = loop.create_task(run_db(authenticate_token, raw_token))
+        _inflight[raw_token] = task
+        task.add_done_callback(lambda done: _landed(raw_token, done))
+    return await asyncio.shield(task)
+
+
+def _landed(raw_token: str, task):
+    if _inflight.get(raw_token) is task:
+        del _inflight[raw_token]
+    if not task.cancelled():
+        task.exception()  # retrieved, even if every waiter had left
+
+
+def token_from_scope(scope, config):
+    """``(token, subprotocol)`` from the query string or ``Sec-WebSocket-Protocol``."""
+    subprotocols = list(scope.get("subprotocols") or ())
+    marker = config["SUBPROTOCOL"]
+    if marker in subprotocols:
+        index = subprotocols.index(marker)
+        if index + 1 < len(subprotocols):
+            return subprotocols[index + 1], marker
+    values = parse_qs(scope.get("query_string", b"").decode("latin-1")).get(config["QUERY_PARAM"])
+    return (values[0], None) if values else (None, None)
+
+
+class JWTAuthMiddleware:
+    """Populate ``scope["user"]`` for WebSocket connections from a simplejwt access token."""
+
+    def __init__(self, inner):
+        self.inner = inner
+        self.session_inner = AuthMiddlewareStack(inner)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "websocket":
+            return await self.inner(scope, receive, send)
+
+        config = ws_auth_config()
+        raw_token, subprotocol = token_from_scope(scope, config)
+        if raw_token is None and config["SESSION_FALLBACK"]:
+            return await self.session_inner(scope, receive, send)
+
+        scope = dict(scope, user=AnonymousUser())
+        if raw_token is not None:
+            scope["auth_subprotocol"] = subprotocol
+            try:
+                scope["user"] = await aauthenticate_token(raw_token)
+            except WebSocketAuthError as e:
+                _rejected.inc()
+                scope["auth_error"] = str(e)
+                logging.info(f"🔒 Rejected WebSocket token: {e}")
+        return await self.inner(scope, receive, send)
@@ -3,7 +3,6 @@ import os
 import django
 from django.core.asgi import get_asgi_application
 from channels.routing import ProtocolTypeRouter, URLRouter
-from channels.auth import AuthMiddlewareStack
 
 # ✅ Set default settings module for Django
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'myproject.settings')
@@ -13,11 +12,22 @@ django.setup()
 
 # ✅ Import routing after Django setup to avoid ImproperlyConfigured errors
 import chatbot.routing
+from chatbot.ws_auth import JWTAuthMiddleware
+from chatbot.embedding_service import start_model_warmup
+from chatbot.vector_store import start_warmup
+from chatbot.lexical_index import start_lexical_warmup
+
+# ✅ Load the vector index, the BM25 index (in hybrid mode) and, if configured,
+# the embedding model in the background so first queries hit a warm index
+start_warmup()
+start_lexical_warmup()
+start_model_warmup()
 
 # ✅ Define ASGI application for HTTP + WebSocket
 application = ProtocolTypeRouter({
     "http": get_asgi_application(),
-    "websocket": AuthMiddlewareStack(
+    # ✅ WebSockets authenticate with the same simplejwt access tokens as the REST API
+    "websocket": JWTAuthMiddleware(
         URLRouter(
             chatbot.routing.websocket_urlpatterns
         )
@@ -167,7 +167,9 @@ def _redis_available():
         logging.warning(f"⚠️ Redis not available, using in-memory channel layer: {e}")
         return False
 
-if _redis_available():
+REDIS_AVAILABLE = _redis_available()
+
+if REDIS_AVAILABLE:
     CHANNEL_LAYERS = {
         "default": {
             "BACKEND": "channels_redis.core.RedisChannelLayer",
@@ -181,6 +183,286 @@ else:
         }
     }
 
+# WebSocket auth (chatbot/ws_auth.py): simplejwt access token from ?token= or the
+# "bearer, <token>" subprotocol pair. Resolved users (no password hashes) are
+# cached (in-process + "shared") for a short TTL so reconnect storms skip Postgres.
+# Access tokens aren't blacklisted by simplejwt, so ACCESS_TOKEN_LIFETIME bounds
+# how long a logged-out session's token still opens sockets.
+WS_AUTH = {
+    "USER_CACHE_TTL": int(os.getenv("WS_AUTH_USER_CACHE_TTL", "60")),
+    # Also accept session-cookie auth for sockets that carry no token
+    "SESSION_FALLBACK": os.getenv("WS_AUTH_SESSION_FALLBACK", "False") == "True",
+}
+
+# Chat socket wire protocol (chatbot/wire.py): clients opt into v2 with ?protocol=2
+# for coalesced partial frames, and ?compress=deflate for deflated binary JSON frames.
+CHAT_WIRE = {
+    "MAX_PROTOCOL": int(os.getenv("CHAT_WIRE_MAX_PROTOCOL", "2")),
+    "COALESCE_MS": float(os.getenv("CHAT_WIRE_COALESCE_MS", "30")),
+    "COALESCE_BYTES": int(os.getenv("CHAT_WIRE_COALESCE_BYTES", "512")),
+    "DEFLATE_MIN_BYTES": int(os.getenv("CHAT_WIRE_DEFLATE_MIN_BYTES", "256")),
+}
+
+# ----------------------------------------------------------------------
+# Caches
+# ----------------------------------------------------------------------
+# "shared" is visible to every worker process: Redis when available,
+# otherwise an on-disk cache so entries still survive restarts. The file cache
+# lists its whole directory on every write once culling starts, so keep it small.
+CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+    },
+    "shared": (
+        {
+            "BACKEND": "django.core.cache.backends.redis.RedisCache",
+            "LOCATION": os.getenv("REDIS_CACHE_URL", "redis://127.0.0.1:6379/1"),
+        }
+        if REDIS_AVAILABLE else
+        {
+            "BACKEND": "django.core.cache.backends.filebased.FileBasedCache",
+            "LOCATION": os.getenv("SHARED_CACHE_DIR", str(BASE_DIR / "cache")),
+            "OPTIONS": {"MAX_ENTRIES": int(os.getenv("SHARED_CACHE_MAX_ENTRIES", "2000"))},
+        }
+    ),
+}
+
+# ----------------------------------------------------------------------
+# Chat Pipeline Executors
+# ----------------------------------------------------------------------
+# Dedicated bounded thread pools for blocking chat work (see chatbot/executors.py).
+# max_queue is how many jobs may wait for a worker before new work is rejected.
+CHAT_EXECUTORS = {
+    "network": {
+        "max_workers": int(os.getenv("CHAT_NETWORK_WORKERS", "32")),
+        "max_queue": int(os.getenv("CHAT_NETWORK_QUEUE", "256")),
+    },
+    "cpu": {
+        "max_workers": int(os.getenv("CHAT_CPU_WORKERS", str(os.cpu_count() or 2))),
+        "max_queue": int(os.getenv("CHAT_CPU_QUEUE", "128")),
+    },
+    "db": {
+        "max_workers": int(os.getenv("CHAT_DB_WORKERS", "8")),
+        "max_queue": int(os.getenv("CHAT_DB_QUEUE", "256")),
+    },
+}
+
+# ----------------------------------------------------------------------
+# Vector Store
+# ----------------------------------------------------------------------
+# "per_student": one Chroma collection per student plus global_resources.
+# "shared": a single collection partitioned by scope/owner metadata
+#           (migrate existing data with `manage.py migrate_vector_layout`).
+VECTOR_STORE_LAYOUT = os.getenv("VECTOR_STORE_LAYOUT", "per_student")
+
+# BACKEND: "persistent" (on-disk, survives restarts), "ephemeral", "http"
+# (a separate Chroma server) or "compact" (per-student collections as
+# memory-mapped float16/int8 segments with exact search, see
+# chatbot/compact_store.py; collections larger than COMPACT["PROMOTE_AT"] move
+# to HNSW, and global/answer-cache/shared collections always use HNSW). HNSW parameters apply to newly created
+# collections; EF_SEARCH is also applied to existing ones at warm-up.
+VECTOR_STORE = {
+    "BACKEND": os.getenv("VECTOR_STORE_BACKEND", "persistent"),
+    "PATH": os.getenv("CHROMA_DIR", str(BASE_DIR / "chatbot" / "chroma_db")),
+    "HOST": os.getenv("CHROMA_HOST", "127.0.0.1"),
+    "PORT": int(os.getenv("CHROMA_PORT", "8001")),
+    "HNSW": {
+        "M": int(os.getenv("HNSW_M", "16")),
+        "EF_CONSTRUCTION": int(os.getenv("HNSW_EF_CONSTRUCTION", "100")),
+        "EF_SEARCH": int(os.getenv("HNSW_EF_SEARCH", "64")),
+    },
+    "WARMUP": os.getenv("VECTOR_STORE_WARMUP", "True") == "True",
+    "COMPACT": {
+        "DTYPE": os.getenv("VECTOR_STORE_COMPACT_DTYPE", "float16"),
+        "PROMOTE_AT": int(os.getenv("VECTOR_STORE_COMPACT_PROMOTE_AT", "5000")),
+        "MAX_SEGMENTS": int(os.getenv("VECTOR_STORE_COMPACT_MAX_SEGMENTS", "8")),
+        "HOT_COLLECTIONS": int(os.getenv("VECTOR_STORE_COMPACT_HOT_COLLECTIONS", "64")),
+    },
+}
+
+# ----------------------------------------------------------------------
+# Prompt Budget
+# ----------------------------------------------------------------------
+# Estimated-token budget for each prompt (chatbot/prompting.py). Older turns
+# beyond RECENT_TURNS are folded into a per-user summary once SUMMARIZE_AFTER
+# of them have accumulated.
+PROMPT_BUDGET = {
+    "MAX_TOKENS": int(os.getenv("PROMPT_MAX_TOKENS", "3000")),
+    "CONTEXT_SHARE": float(os.getenv("PROMPT_CONTEXT_SHARE", "0.6")),
+    "RECENT_TURNS": int(os.getenv("PROMPT_RECENT_TURNS", "3")),
+    "SUMMARIZE_AFTER": int(os.getenv("PROMPT_SUMMARIZE_AFTER", "4")),
+    "SUMMARY_MAX_TOKENS": int(os.getenv("PROMPT_SUMMARY_MAX_TOKENS", "300")),
+}
+
+# ----------------------------------------------------------------------
+# Chat Write-Behind Persistence
+# ----------------------------------------------------------------------
+# Finished turns are queued and written in batches (chatbot/persistence.py).
+CHAT_WRITE_BEHIND = {
+    "FLUSH_INTERVAL": float(os.getenv("CHAT_WRITE_BEHIND_FLUSH_INTERVAL", "1.0")),
+    "MAX_BATCH": int(os.getenv("CHAT_WRITE_BEHIND_MAX_BATCH", "200")),
+    "MAX_PENDING": int(os.getenv("CHAT_WRITE_BEHIND_MAX_PENDING", "10000")),
+}
+
+# ----------------------------------------------------------------------
+# Embedding Service
+# ----------------------------------------------------------------------
+# Concurrent embedding requests are micro-batched (chatbot/embedding_service.py).
+# Set EMBEDDING_SERVICE_SOCKET to share one model across workers through the
+# `manage.py run_embedding_service` sidecar; leave empty to batch in-process.
+EMBEDDING_SERVICE = {
+    "SOCKET": os.getenv("EMBEDDING_SERVICE_SOCKET", ""),
+    "MAX_BATCH_SIZE": int(os.getenv("EMBEDDING_MAX_BATCH_SIZE", "32")),
+    "MAX_WAIT_MS": float(os.getenv("EMBEDDING_MAX_WAIT_MS", "5")),
+    "TIMEOUT": float(os.getenv("EMBEDDING_SERVICE_TIMEOUT", "30")),
+}
+
+# Embedding model runtime (chatbot/embedding_service.py): "torch" (fp32),
+# "onnx" (ONNX Runtime fp32) or "onnx-int8" (quantized). ONNX files are paths or
+# files in REPO on the Hugging Face Hub. WARMUP loads the model at server start;
+# `manage.py check_embedding_consistency` compares a backend against fp32.
+EMBEDDING_BACKEND = {
+    "BACKEND": os.getenv("EMBEDDING_BACKEND", "torch"),
+    "ONNX_FILE": os.getenv("EMBEDDING_ONNX_FILE", "onnx/model.onnx"),
+    "ONNX_INT8_FILE": os.getenv("EMBEDDING_ONNX_INT8_FILE", "onnx/model_qint8_avx512.onnx"),
+    "THREADS": int(os.getenv("EMBEDDING_THREADS", "0")),
+    "WARMUP": os.getenv("EMBEDDING_WARMUP", "False") == "True",
+    "MIN_COSINE": float(os.getenv("EMBEDDING_MIN_COSINE", "0.98")),
+}
+
+# Two-tier embedding cache: in-process LRU/TTL in front of the "shared" cache
+EMBEDDING_CACHE = {
+    "ENABLED": os.getenv("EMBEDDING_CACHE_ENABLED", "True") == "True",
+    "LOCAL_MAXSIZE": int(os.getenv("EMBEDDING_CACHE_LOCAL_MAXSIZE", "10000")),
+    "LOCAL_TTL": int(os.getenv("EMBEDDING_CACHE_LOCAL_TTL", "3600")),
+    "SHARED_ALIAS": "shared",
+    "SHARED_TTL": int(os.getenv("EMBEDDING_CACHE_SHARED_TTL", str(7 * 24 * 3600))),
+}
+
+# Semantic answer cache in front of Gemini (chatbot/answer_cache.py)
+ANSWER_CACHE = {
+    "ENABLED": os.getenv("ANSWER_CACHE_ENABLED", "True") == "True",
+    "SIMILARITY": float(os.getenv("ANSWER_CACHE_SIMILARITY", "0.95")),
+    "TTL": int(os.getenv("ANSWER_CACHE_TTL", str(24 * 3600))),
+}
+
+# Identical global-context questions in flight share one Gemini stream (chatbot/inflight.py);
+# finished answers stay joinable for LINGER_SECONDS, until the answer cache has them.
+CHAT_COALESCING = {
+    "ENABLED": os.getenv("CHAT_COALESCING_ENABLED", "True") == "True",
+    "LINGER_SECONDS": float(os.getenv("CHAT_COALESCING_LINGER_SECONDS", "5")),
+}
+
+# On-disk, LRU-evicted cache of synthesized audio (chatbot/audio_cache.py)
+TTS_AUDIO_CACHE = {
+    "ENABLED": os.getenv("TTS_AUDIO_CACHE_ENABLED", "True") == "True",
+    "DIR": os.getenv("TTS_AUDIO_CACHE_DIR", str(BASE_DIR / "chatbot" / "tts_cache")),
+    "MAX_BYTES": int(os.getenv("TTS_AUDIO_CACHE_MAX_BYTES", str(512 * 1024 * 1024))),
+}
+
+# Phrases synthesized ahead of time by `manage.py precompute_tts`
+TTS_CANNED_PHRASES = [
+    "Connected to AI Chatbot!",
+    "Server is busy, please try again shortly.",
+    "Sorry, something went wrong. Please try again.",
+]
+
+# Admission control for chat turns (chatbot/admission.py): per-user token bucket
+# (RATE messages/s, BURST), per-user and global concurrency slots, and a bounded
+# wait queue. With Redis the limits are shared by every worker process.
+ADMISSION = {
+    "ENABLED": os.getenv("ADMISSION_ENABLED", "True") == "True",
+    "BACKEND": "redis" if REDIS_AVAILABLE else "local",
+    "REDIS_URL": os.getenv("ADMISSION_REDIS_URL", "redis://127.0.0.1:6379/0"),
+    "GLOBAL_CONCURRENCY": int(os.getenv("ADMISSION_GLOBAL_CONCURRENCY", "32")),
+    "USER_CONCURRENCY": int(os.getenv("ADMISSION_USER_CONCURRENCY", "2")),
+    "RATE": float(os.getenv("ADMISSION_RATE", "0.5")),
+    "BURST": int(os.getenv("ADMISSION_BURST", "5")),
+    "QUEUE_SIZE": int(os.getenv("ADMISSION_QUEUE_SIZE", "200")),
+    "USER_QUEUE_SIZE": int(os.getenv("ADMISSION_USER_QUEUE_SIZE", "2")),
+    "QUEUE_TIMEOUT": float(os.getenv("ADMISSION_QUEUE_TIMEOUT", "20")),
+    # Guests are limited per client IP; list the reverse proxies (comma separated)
+    # whose X-Forwarded-For header should be used instead of the peer address.
+    "TRUSTED_PROXIES": [p.strip() for p in os.getenv("ADMISSION_TRUSTED_PROXIES", "").split(",") if p.strip()],
+}
+
+# Local stand-ins for Gemini, TTS and the embedding model with simulated latency
+# (chatbot/fake_providers.py), for offline benchmarks only: `manage.py loadtest`.
+FAKE_PROVIDERS = {
+    "ENABLED": os.getenv("FAKE_PROVIDERS", "False") == "True",
+    "FIRST_TOKEN_MS": float(os.getenv("FAKE_FIRST_TOKEN_MS", "400")),
+    "TOKENS_PER_SECOND": float(os.getenv("FAKE_TOKENS_PER_SECOND", "80")),
+    "ANSWER_TOKENS": int(os.getenv("FAKE_ANSWER_TOKENS", "120")),
+    "TTS_LATENCY_MS": float(os.getenv("FAKE_TTS_LATENCY_MS", "150")),
+    "EMBEDDING_MS_PER_TEXT": float(os.getenv("FAKE_EMBEDDING_MS_PER_TEXT", "2")),
+}
+
+# Per-stage latency (chatbot/tracing.py). Stage histograms are always collected
+# and served at /api/chatbot/metrics/ to requests with "Authorization: Bearer
+# <METRICS_TOKEN>"; the endpoint answers 403 while METRICS_TOKEN is unset, so
+# set it wherever Prometheus scrapes. Spans go to OTLP_ENDPOINT for
+# SAMPLE_RATIO of chat turns when an endpoint is configured.
+TRACING = {
+    "ENABLED": os.getenv("TRACING_ENABLED", "True") == "True",
+    "OTLP_ENDPOINT": os.getenv("OTEL_EXPORTER_OTLP_ENDPOINT", ""),
+    "SAMPLE_RATIO": float(os.getenv("TRACING_SAMPLE_RATIO", "0.05")),
+    "SERVICE_NAME": os.getenv("OTEL_SERVICE_NAME", "chatbot-backend"),
+}
+METRICS_TOKEN = os.getenv("METRICS_TOKEN", "")
+
+# ----------------------------------------------------------------------
+# Celery (background resource ingestion)
+# ----------------------------------------------------------------------
+CELERY_BROKER_URL = os.getenv("CELERY_BROKER_URL", "redis://127.0.0.1:6379/0")
+CELERY_RESULT_BACKEND = os.getenv("CELERY_RESULT_BACKEND", CELERY_BROKER_URL)
+CELERY_TASK_ALWAYS_EAGER = os.getenv("CELERY_TASK_ALWAYS_EAGER", "False") == "True"
+CELERY_TASK_ACKS_LATE = True
+CELERY_WORKER_PREFETCH_MULTIPLIER = 1
+CELERY_BEAT_SCHEDULE = {
+    "archive-chat-history": {
+        "task": "chatbot.tasks.archive_chat_history",
+        "schedule": timedelta(days=1),
+    },
+    "purge-answer-cache": {
+        "task": "chatbot.tasks.purge_answer_cache",
+        "schedule": timedelta(hours=1),
+    },
+}
+
+# Chunks embedded and upserted per batch, and resources accepted per bulk request
+INGEST_EMBED_BATCH_SIZE = int(os.getenv("INGEST_EMBED_BATCH_SIZE", "64"))
+INGEST_BULK_MAX_RESOURCES = int(os.getenv("INGEST_BULK_MAX_RESOURCES", "500"))
+
+# How resources are split before embedding (chatbot/chunking.py): "structured" or "fixed"
+CHUNKING = {
+    "STRATEGY": os.getenv("CHUNKING_STRATEGY", "structured"),
+    "TARGET_TOKENS": int(os.getenv("CHUNKING_TARGET_TOKENS", "200")),
+    "OVERLAP_TOKENS": int(os.getenv("CHUNKING_OVERLAP_TOKENS", "30")),
+}
+
+# Retrieval (chatbot/retrieval.py): "hybrid" fuses vector and BM25 rankings with
+# reciprocal-rank fusion; "dense" is vector search only.
+RETRIEVAL = {
+    "MODE": os.getenv("RETRIEVAL_MODE", "hybrid"),
+    "CANDIDATES": int(os.getenv("RETRIEVAL_CANDIDATES", "10")),
+    "RRF_K": int(os.getenv("RETRIEVAL_RRF_K", "60")),
+    "LEXICAL_BUDGET_MS": float(os.getenv("RETRIEVAL_LEXICAL_BUDGET_MS", "50")),
+    # Global-collection results cached per normalized query and resource index version
+    "GLOBAL_CACHE": os.getenv("RETRIEVAL_GLOBAL_CACHE", "True") == "True",
+    "GLOBAL_CACHE_TTL": int(os.getenv("RETRIEVAL_GLOBAL_CACHE_TTL", "3600")),
+}
+
+# Chat history: page size of the cursor-paginated history API, and retention.
+# Rows older than RETENTION_DAYS are moved in batches into gzip JSON-lines
+# files under DIR by the daily archive_chat_history task (chatbot/archival.py).
+CHAT_HISTORY_PAGE_SIZE = int(os.getenv("CHAT_HISTORY_PAGE_SIZE", "20"))
+CHAT_HISTORY_MAX_PAGE_SIZE = int(os.getenv("CHAT_HISTORY_MAX_PAGE_SIZE", "100"))
+CHAT_ARCHIVE = {
+    "DIR": os.getenv("CHAT_ARCHIVE_DIR", str(BASE_DIR / "archive")),
+    "RETENTION_DAYS": int(os.getenv("CHAT_ARCHIVE_RETENTION_DAYS", "365")),
+    "BATCH_SIZE": int(os.getenv("CHAT_ARCHIVE_BATCH_SIZE", "5000")),
+}
+
 # ----------------------------------------------------------------------
 # CORS Configuration
 # ----------------------------------------------------------------------